@@ -1,3 +1,5 @@
+import jwt
+
 from datetime import timedelta
 
 from fastapi.security import OAuth2PasswordRequestForm
@@ -10,15 +12,9 @@ from fastapi import (
     status,
 )
 from starlette.responses import JSONResponse
-from sqlalchemy.orm import Session
-from ergo_python_appkit.appkit import ErgoAppKit
-
-from db.crud.users import (
-    blacklist_token,
-    get_user_by_wallet_address,
-    get_user_by_wallet_addresses,
-    get_primary_wallet_address_by_user_id,
-)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.crud import aio
 from db.schemas.ergoauth import (
     LoginRequestWebResponse,
     LoginRequest,
@@ -26,14 +22,17 @@ from db.schemas.ergoauth import (
     ErgoAuthRequest,
     ErgoAuthResponse,
 )
-from db.session import get_db
+from db.session import get_async_db, run_sync
 
 from core import security
 from core.security import generate_signing_message, generate_verification_id
 from core.auth import authenticate_user, get_current_active_user, sign_up_new_user
+from core.revocation import revocations
 
+from cache.auth_cache import invalidate_principal
 from cache.cache import cache
-from websocket.connection_manager import connection_manager
+from verifier.client import verifier
+from websocket.connection_manager import connection_manager, ergoauth_topic
 
 from config import Config, Network
 
@@ -50,13 +49,15 @@ BASE_ERGOAUTH = "ergoauth://api.paideia.im"
 BASE_URL = "https://api.paideia.im"
 
 @r.post("/login", response_model=LoginRequestWebResponse, name="ergoauth:login-web")
-async def ergoauth_login_web(addresses: LoginRequest, db=Depends(get_db)):
+async def ergoauth_login_web(addresses: LoginRequest, db=Depends(get_async_db)):
     try:
         # get primary address by default
         default_address = addresses.addresses[0]
-        user = get_user_by_wallet_addresses(db, addresses.addresses)
+        user = await aio.get_user_by_wallet_addresses(db, addresses.addresses)
         if user:
-            default_address = get_primary_wallet_address_by_user_id(db, user.id)
+            default_address = await aio.get_primary_wallet_address_by_user_id(
+                db, user.id
+            )
 
         verificationId = generate_verification_id()
         tokenUrl = f"{BASE_URL}/auth/token/{verificationId}"
@@ -65,7 +66,7 @@ async def ergoauth_login_web(addresses: LoginRequest, db=Depends(get_db)):
             signingMessage=generate_signing_message(),
             tokenUrl=tokenUrl,
         )
-        cache.set(f"ergoauth_signing_request_{verificationId}", ret.dict())
+        await cache.aset(f"ergoauth_signing_request_{verificationId}", ret.dict())
         return ret
     except Exception as e:
         return JSONResponse(status_code=400, content=f"ERR::login::{str(e)}")
@@ -74,17 +75,17 @@ async def ergoauth_login_web(addresses: LoginRequest, db=Depends(get_db)):
 # should we add a response type here
 @r.post("/token/{request_id}", name="ergoauth:login")
 async def ergoauth_token(
-    request_id: str, authResponse: ErgoAuthResponse, db=Depends(get_db)
+    request_id: str, authResponse: ErgoAuthResponse, db=Depends(get_async_db)
 ):
     try:
-        signingRequest = cache.get(f"ergoauth_signing_request_{request_id}")
-        verified = ErgoAppKit.verifyErgoAuthSignedMessage(
+        signingRequest = await cache.aget(f"ergoauth_signing_request_{request_id}")
+        verified = await verifier.verify_signed_message(
             signingRequest["address"],
             signingRequest["signingMessage"],
             authResponse.signedMessage,
             authResponse.proof,
         )
-        user = create_and_get_user_by_primary_wallet_address(
+        user = await create_and_get_user_by_primary_wallet_address(
             db, signingRequest["address"]
         )
         if verified and user:
@@ -96,7 +97,7 @@ async def ergoauth_token(
                 data={"sub": user.alias, "permissions": permissions},
                 expires_delta=access_token_expires,
             )
-            cache.invalidate(f"ergoauth_signing_request_{request_id}")
+            await cache.ainvalidate(f"ergoauth_signing_request_{request_id}")
             return {
                 "access_token": access_token,
                 "token_type": "bearer",
@@ -127,14 +128,14 @@ async def ergoauth_login_mobile(addresses: LoginRequest):
         # update url on deployment
         signingRequestUrl = f"{BASE_ERGOAUTH}/auth/signing_request/{verificationId}"
         replyTo = f"{BASE_URL}/auth/verify/{verificationId}"
-        sigmaBoolean = ErgoAppKit.getSigmaBooleanFromAddress(addresses.addresses[0])
+        sigmaBoolean = await verifier.sigma_boolean(addresses.addresses[0])
         ergoAuthRequest = ErgoAuthRequest(
             address=addresses.addresses[0],
             signingMessage=generate_signing_message(),
             sigmaBoolean=sigmaBoolean,
             replyTo=replyTo,
         )
-        cache.set(f"ergoauth_signing_request_{verificationId}", ergoAuthRequest.dict())
+        await cache.aset(f"ergoauth_signing_request_{verificationId}", ergoAuthRequest.dict())
         return LoginRequestMobileResponse(
             address=addresses.addresses[0],
             verificationId=verificationId,
@@ -151,7 +152,7 @@ async def ergoauth_login_mobile(addresses: LoginRequest):
 )
 async def ergoauth_login_mobile(request_id: str):
     try:
-        ret = cache.get(f"ergoauth_signing_request_{request_id}")
+        ret = await cache.aget(f"ergoauth_signing_request_{request_id}")
         if not ret:
             return JSONResponse(
                 status_code=400, content=f"ERR::login::invalid request id"
@@ -163,17 +164,17 @@ async def ergoauth_login_mobile(request_id: str):
 
 @r.post("/verify/{request_id}", name="ergoauth:verify")
 async def ergoauth_verify(
-    request_id: str, authResponse: ErgoAuthResponse, db=Depends(get_db)
+    request_id: str, authResponse: ErgoAuthResponse, db=Depends(get_async_db)
 ):
     try:
-        signingRequest = cache.get(f"ergoauth_signing_request_{request_id}")
-        verified = ErgoAppKit.verifyErgoAuthSignedMessage(
+        signingRequest = await cache.aget(f"ergoauth_signing_request_{request_id}")
+        verified = await verifier.verify_signed_message(
             signingRequest["address"],
             signingRequest["signingMessage"],
             authResponse.signedMessage,
             authResponse.proof,
         )
-        user = create_and_get_user_by_primary_wallet_address(
+        user = await create_and_get_user_by_primary_wallet_address(
             db, signingRequest["address"]
         )
         if verified and user:
@@ -194,17 +195,15 @@ async def ergoauth_verify(
                 "alias": user.alias,
             }
             # use websockets to notify the frontend
-            await connection_manager.send_personal_message(
-                "ergoauth_" + request_id, token
-            )
+            await connection_manager.publish(ergoauth_topic(request_id), token)
             # invalidate the the request_id
-            cache.invalidate(f"ergoauth_signing_request_{request_id}")
+            await cache.ainvalidate(f"ergoauth_signing_request_{request_id}")
             return {"status": "ok"}
         else:
             # notify frontend on failure
             permissions = "login_error"
-            await connection_manager.send_personal_message(
-                "ergoauth_" + request_id, {"permissions": permissions}
+            await connection_manager.publish(
+                ergoauth_topic(request_id), {"permissions": permissions}
             )
             return {"status": "failed"}
     except Exception as e:
@@ -213,13 +212,13 @@ async def ergoauth_verify(
 
 @r.websocket("/ws/{request_id}")
 async def websocket_endpoint(websocket: WebSocket, request_id: str):
-    await connection_manager.connect("ergoauth_" + request_id, websocket)
+    await connection_manager.connect(ergoauth_topic(request_id), websocket)
     try:
         while True:
             # pause loop
             await websocket.receive_text()
     except WebSocketDisconnect:
-        connection_manager.disconnect("ergoauth_" + request_id)
+        connection_manager.disconnect(ergoauth_topic(request_id), websocket)
 
 
 # [DEPRECATED]
@@ -237,14 +236,18 @@ async def websocket_endpoint(websocket: WebSocket, request_id: str):
 #         return JSONResponse(status_code=400, content=f"ERR::signup::{str(e)}")
 
 
-def create_and_get_user_by_primary_wallet_address(
-    db: Session, primary_wallet_address: str
+async def create_and_get_user_by_primary_wallet_address(
+    db: AsyncSession, primary_wallet_address: str
 ):
-    user = get_user_by_wallet_address(db, primary_wallet_address)
+    user = await aio.get_user_by_wallet_address(db, primary_wallet_address)
     if user:
         return user
-    user = sign_up_new_user(
-        db, primary_wallet_address, "__ergoauth_default", primary_wallet_address
+    user = await run_sync(
+        db,
+        sign_up_new_user,
+        primary_wallet_address,
+        security.ERGOAUTH_DEFAULT_PASSWORD,
+        primary_wallet_address,
     )
     return user
 
@@ -254,10 +257,10 @@ def create_and_get_user_by_primary_wallet_address(
 
 @r.post("/admin/token", name="auth:admin-login")
 async def admin_login(
-    db=Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
+    db=Depends(get_async_db), form_data: OAuth2PasswordRequestForm = Depends()
 ):
     try:
-        user = authenticate_user(db, form_data.username, form_data.password)
+        user = await authenticate_user(db, form_data.username, form_data.password)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -291,10 +294,17 @@ async def admin_login(
 
 @r.post("/admin/signup", name="auth:admin-signup")
 async def admin_signup(
-    db=Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
+    db=Depends(get_async_db), form_data: OAuth2PasswordRequestForm = Depends()
 ):
     try:
-        user = sign_up_new_user(db, form_data.username, form_data.password)
+        hashed_password = await security.aget_password_hash(form_data.password)
+        user = await run_sync(
+            db,
+            sign_up_new_user,
+            form_data.username,
+            form_data.password,
+            hashed_password=hashed_password,
+        )
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
@@ -325,11 +335,16 @@ async def admin_signup(
 
 @r.post("/logout", name="auth:logout")
 async def logout(
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     token: str = Depends(security.oauth2_scheme),
     current_user=Depends(get_current_active_user),
 ):
     try:
-        return blacklist_token(db, token)
+        payload = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+        ret = await revocations.revoke(
+            db, security.token_id(payload, token), payload["exp"]
+        )
+        await invalidate_principal(token)
+        return ret
     except Exception as e:
         JSONResponse(status_code=400, content=f"ERR::logout::{str(e)}")
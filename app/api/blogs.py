@@ -3,6 +3,7 @@ import typing as t
 from fastapi import APIRouter, Depends, status
 from starlette.responses import JSONResponse
 
+from cache.response_cache import cached_response
 from core.auth import get_current_active_superuser
 from db.crud.blogs import get_blogs, get_blog, create_blog, edit_blog, delete_blog
 from db.schemas.blog import CreateOrUpdateBlog, Blog
@@ -17,6 +18,7 @@ blogs_router = r = APIRouter()
     response_model_exclude_none=True,
     name="blogs:blogs"
 )
+@cached_response("blogs", t.List[Blog], ["blogs"])
 def blogs_get_all(
     search_string: str = "",
     highlights_only: bool = False,
@@ -35,6 +37,7 @@ def blogs_get_all(
     response_model_exclude_none=True,
     name="blogs:get-blog"
 )
+@cached_response("blog", Blog, ["blogs"])
 def blogs_get(
     link,
     db=Depends(get_db)
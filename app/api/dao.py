@@ -2,6 +2,7 @@ import typing as t
 
 from fastapi import APIRouter, Depends, status
 from starlette.responses import JSONResponse
+from cache.response_cache import cached_response
 from core.auth import get_current_active_user, get_current_active_superuser
 from db.crud.dao import (
     create_dao,
@@ -26,6 +27,7 @@ dao_router = r = APIRouter()
     response_model_exclude_none=True,
     name="dao:all-dao",
 )
+@cached_response("dao_list", t.List[VwDao], ["daos"])
 def dao_list(
     db=Depends(get_db),
 ):
@@ -46,6 +48,7 @@ def dao_list(
     response_model_exclude_none=True,
     name="dao:highlights-dao",
 )
+@cached_response("dao_highlights", t.List[VwDao], ["daos"])
 def dao_list_highlights(
     db=Depends(get_db),
 ):
@@ -63,6 +66,7 @@ def dao_list_highlights(
 @r.get(
     "/{query}", response_model=Dao, response_model_exclude_none=True, name="dao:get-dao"
 )
+@cached_response("dao", Dao, lambda params, dao: ["daos", f"dao_{dao['id']}"])
 def dao_get(
     query: str,
     db=Depends(get_db),
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, status
 import typing as t
 from starlette.responses import JSONResponse
 
+from cache.response_cache import cached_response
 from db.session import get_db
 from db.crud.faqs import (
     get_faqs,
@@ -21,6 +22,7 @@ faq_router = r = APIRouter()
     response_model_exclude_none=True,
     name="faq:all-faqs"
 )
+@cached_response("faqs", t.List[Faq], ["faqs"])
 def faqs_list(
     db=Depends(get_db),
 ):
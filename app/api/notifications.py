@@ -1,25 +1,49 @@
 from fastapi import APIRouter, Depends, status, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 import typing as t
 from starlette.responses import JSONResponse
 
+from cache.notification_counters import aadjust_unread_counter
 from core.auth import get_current_active_superuser, get_current_active_user
 
-from db.session import get_db
+from db.session import get_db, get_async_db
+from db.crud import aio
 from db.crud.notifications import (
     cleanup_notifications,
-    create_notification,
+    count_unread_notifications,
+    mark_notifications_read,
     edit_notification,
     delete_notification,
     get_notifications,
     get_notification,
 )
 from db.crud.users import get_user_details_by_id
-from db.schemas.notifications import CreateAndUpdateNotification, Notification
-from websocket.connection_manager import connection_manager
+from db.schemas.notifications import (
+    CreateAndUpdateNotification,
+    MarkNotificationsRead,
+    Notification,
+    UnreadNotifications,
+)
+from websocket.connection_manager import connection_manager, notifications_topic
+from websocket.notification_stream import notification_stream
 
 notification_router = r = APIRouter()
 
 
+async def notify(
+    db, user_details_id: int, notification: CreateAndUpdateNotification
+):
+    # stores the notification and pushes it to the user's sockets
+    ret = await aio.create_notification(db, user_details_id, notification)
+    if not ret.is_read:
+        await aadjust_unread_counter(user_details_id, 1)
+    # only the new notification, clients merge it into their list
+    await notification_stream.push(
+        user_details_id, jsonable_encoder(Notification.from_orm(ret))
+    )
+    return ret
+
+
 @r.get(
     "/{user_details_id}",
     response_model=t.List[Notification],
@@ -49,6 +73,37 @@ def notifications_list(
         )
 
 
+@r.get(
+    "/unread/{user_details_id}",
+    response_model=UnreadNotifications,
+    name="notifications:unread-count",
+)
+def notifications_unread(
+    user_details_id: int,
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Number of unread notifications for a user
+    """
+    try:
+        user_details = get_user_details_by_id(db, user_details_id)
+        if type(user_details) == JSONResponse:
+            return user_details
+        if user_details.user_id != current_user.id:
+            return JSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
+            )
+        return {
+            "user_details_id": user_details_id,
+            "unread": count_unread_notifications(db, user_details_id),
+        }
+    except Exception as e:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST, content=f"{str(e)}"
+        )
+
+
 @r.post(
     "/{user_details_id}",
     response_model=Notification,
@@ -58,19 +113,38 @@ def notifications_list(
 async def notification_create(
     user_details_id: int,
     notification: CreateAndUpdateNotification,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_active_superuser),
 ):
     """
     Create a new notification
     """
     try:
-        ret = create_notification(db, user_details_id, notification)
-        await connection_manager.send_personal_message(
-            "notification_user_details_id_" + str(user_details_id),
-            {"notifications": get_notifications(db, user_details_id)},
+        return await notify(db, user_details_id, notification)
+    except Exception as e:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST, content=f"{str(e)}"
         )
-        return ret
+
+
+@r.put("/mark_as_read", name="notifications:read-many")
+def notifications_mark_read(
+    req: MarkNotificationsRead,
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Mark the given notifications, or all of them, as read in one update
+    """
+    try:
+        user_details = get_user_details_by_id(db, req.user_details_id)
+        if type(user_details) == JSONResponse:
+            return user_details
+        if user_details.user_id != current_user.id:
+            return JSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
+            )
+        return mark_notifications_read(db, req.user_details_id, req.ids)
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST, content=f"{str(e)}"
@@ -155,12 +229,24 @@ def notification_delete(
 
 
 @r.websocket("/ws/{user_details_id}")
-async def websocket_endpoint(websocket: WebSocket, user_details_id: str):
-    key = "notification_user_details_id_" + user_details_id
-    await connection_manager.connect(key, websocket)
+async def websocket_endpoint(
+    websocket: WebSocket, user_details_id: str, last_seq: t.Optional[int] = None
+):
+    topic = notifications_topic(user_details_id)
+    # subscribed first so nothing falls between replay and live pushes, the
+    # live ones are held until the replay is queued so sequences go out in
+    # order (a live push the replay already covered still comes after it)
+    await connection_manager.connect(topic, websocket, hold=last_seq is not None)
     try:
+        if last_seq is not None:
+            try:
+                replay = await notification_stream.resume(user_details_id, last_seq)
+                for message in replay:
+                    connection_manager.send(websocket, message)
+            finally:
+                connection_manager.release(websocket)
         while True:
             # pause loop
             await websocket.receive_text()
     except WebSocketDisconnect:
-        connection_manager.disconnect(key)
+        connection_manager.disconnect(topic, websocket)
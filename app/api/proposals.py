@@ -1,15 +1,19 @@
 import typing as t
-import random
 
 from fastapi import APIRouter, Depends, status, WebSocket, WebSocketDisconnect
 from starlette.responses import JSONResponse
 
-from api.notifications import notification_create
-from db.session import get_db
+from db.session import get_db, get_async_db
+from db.crud import aio
 from db.schemas.activity import CreateOrUpdateActivity, ActivityConstants
-from db.schemas.notifications import CreateAndUpdateNotification, NotificationConstants
+from db.schemas.notifications import (
+    CreateAndUpdateNotification,
+    NotificationActor,
+    NotificationConstants,
+)
 from db.schemas.proposal import (
     Proposal,
+    ProposalSummaryPage,
     CreateProposal,
     LikeProposalRequest,
     FollowProposalRequest,
@@ -19,10 +23,12 @@ from db.schemas.proposal import (
     AddReferenceRequest,
 )
 from db.crud.proposals import (
+    get_basic_proposal_by_id,
     get_proposal_by_id,
     get_proposal_by_slug,
     get_proposals_by_dao_id,
-    get_proposals_by_user_id,
+    get_proposal_summaries_by_dao_id,
+    get_proposals_by_user_details_id,
     get_comment_by_id,
     create_new_proposal,
     delete_proposal_by_id,
@@ -30,17 +36,16 @@ from db.crud.proposals import (
     set_likes_by_comment_id,
     set_followers_by_proposal_id,
     edit_proposal_basic_by_id,
-    add_commment_by_proposal_id,
-    delete_comment_by_comment_id,
     add_addendum_by_proposal_id,
     add_reference_by_proposal_id,
 )
-from db.crud.activity_log import create_user_activity
 from db.crud.notifications import generate_action
+from db.crud.outbox import activity_event, notification_event
 from db.crud.users import get_user_details_by_id
-from core.async_handler import run_coroutine_in_sync
 from core.auth import get_current_active_user, get_current_active_superuser
-from websocket.connection_manager import connection_manager
+from websocket.connection_manager import connection_manager, proposal_comments_topic
+from cache.response_cache import ainvalidate_response_cache, cached_response
+from outbox.relay import outbox_relay
 
 proposal_router = r = APIRouter()
 
@@ -58,6 +63,35 @@ def get_proposals(dao_id: int, db=Depends(get_db)):
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
 
 
+@r.get(
+    "/by_dao_id/{dao_id}/summary",
+    response_model=ProposalSummaryPage,
+    response_model_exclude_none=True,
+    name="proposals:all-proposals-summary",
+)
+@cached_response(
+    "proposal_summaries",
+    ProposalSummaryPage,
+    lambda params, page: [f"dao_proposals_{params['dao_id']}"]
+    + list(map(lambda x: f"proposal_{x['id']}", page["proposals"])),
+)
+def get_proposals_summary(
+    dao_id: int, cursor: t.Optional[str] = None, limit: int = 20, db=Depends(get_db)
+):
+    """
+    Paginated proposal listing, pass next_cursor back to fetch the next page
+    """
+    try:
+        if limit < 1 or limit > 100:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content="limit must be between 1 and 100",
+            )
+        return get_proposal_summaries_by_dao_id(db, dao_id, cursor, limit)
+    except Exception as e:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
+
+
 @r.get(
     "/by_user_details_id/{user_details_id}",
     response_model_exclude_none=True,
@@ -65,18 +99,31 @@ def get_proposals(dao_id: int, db=Depends(get_db)):
 )
 def get_user_proposals(user_details_id: int, db=Depends(get_db)):
     try:
-        basic_proposals = get_proposals_by_user_id(db, user_details_id)
-        return list(map(lambda x: get_proposal_by_id(db, x.id), basic_proposals))
+        return get_proposals_by_user_details_id(db, user_details_id)
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
 
 
+def proposal_tags(proposal: dict):
+    # referenced proposals and the author and commenter profiles are part of
+    # the body too
+    user_details_ids = {proposal["user_details_id"]} | {
+        comment["user_details_id"] for comment in proposal["comments"]
+    }
+    return (
+        [f"proposal_{proposal['id']}"]
+        + [f"proposal_{reference['id']}" for reference in proposal["references_meta"]]
+        + [f"user_details_{id}" for id in sorted(user_details_ids)]
+    )
+
+
 @r.get(
     "/{proposal_slug}",
     response_model=Proposal,
     response_model_exclude_none=True,
     name="proposals:proposal",
 )
+@cached_response("proposal", Proposal, lambda params, proposal: proposal_tags(proposal))
 def get_proposal(proposal_slug: str, db=Depends(get_db)):
     try:
         if proposal_slug.isdecimal():
@@ -105,16 +152,17 @@ def create_proposal(
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
-        proposal = create_new_proposal(db, proposal)
-        # add to activities
-        if type(proposal) != JSONResponse:
-            activity = CreateOrUpdateActivity(
-                user_details_id=user_details_id,
-                action=ActivityConstants.CREATED_DISCUSSION,
-                value=proposal.name,
-                category=ActivityConstants.PROPOSAL_CATEGORY,
-            )
-            create_user_activity(db, user_details_id, activity)
+        # the activity commits with the proposal
+        activity = CreateOrUpdateActivity(
+            user_details_id=user_details_id,
+            action=ActivityConstants.CREATED_DISCUSSION,
+            value=proposal.name,
+            category=ActivityConstants.PROPOSAL_CATEGORY,
+        )
+        proposal = create_new_proposal(
+            db, proposal, [activity_event(user_details_id, activity)]
+        )
+        outbox_relay.wake()
         return proposal
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
@@ -143,18 +191,21 @@ def edit_proposal(
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
+        # the activity commits with the edit
+        activity = CreateOrUpdateActivity(
+            user_details_id=_proposal.user_details_id,
+            action=ActivityConstants.EDITED_DISCUSSION,
+            value=proposal.name,
+            category=ActivityConstants.PROPOSAL_CATEGORY,
+        )
         proposal = edit_proposal_basic_by_id(
-            db, _proposal.user_details_id, proposal_id, proposal
+            db,
+            _proposal.user_details_id,
+            proposal_id,
+            proposal,
+            [activity_event(_proposal.user_details_id, activity)],
         )
-        # add to activities
-        if type(proposal) != JSONResponse:
-            activity = CreateOrUpdateActivity(
-                user_details_id=_proposal.user_details_id,
-                action=ActivityConstants.EDITED_DISCUSSION,
-                value=proposal.name,
-                category=ActivityConstants.PROPOSAL_CATEGORY,
-            )
-            create_user_activity(db, _proposal.user_details_id, activity)
+        outbox_relay.wake()
         return proposal
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
@@ -176,38 +227,45 @@ def like_proposal(
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
-        likes = set_likes_by_proposal_id(db, proposal_id, user_details_id, req.type)
-        # add to activities and notifier
-        if type(likes) != JSONResponse:
-            proposal = get_proposal_by_id(db, proposal_id)
-            # activity logging
-            action = {
-                "like": ActivityConstants.LIKED_DISCUSSION,
-                "dislike": ActivityConstants.DISLIKED_DISCUSSION,
-                "remove": ActivityConstants.REMOVED_LIKE_DISCUSSION,
-            }
+        proposal = get_basic_proposal_by_id(db, proposal_id)
+        if proposal is None:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND, content="proposal not found"
+            )
+        # activities and notifications commit with the like
+        outbox = []
+        action = {
+            "like": ActivityConstants.LIKED_DISCUSSION,
+            "dislike": ActivityConstants.DISLIKED_DISCUSSION,
+            "remove": ActivityConstants.REMOVED_LIKE_DISCUSSION,
+        }
+        if req.type in action:
             activity = CreateOrUpdateActivity(
                 user_details_id=user_details_id,
                 action=action[req.type],
                 value=proposal.name,
                 category=ActivityConstants.PROPOSAL_CATEGORY,
             )
-            create_user_activity(db, user_details_id, activity)
-            # notifications
-            if req.type == "like" and proposal.user_details_id != user_details_id:
-                notification = CreateAndUpdateNotification(
-                    user_details_id=proposal.user_details_id,
-                    action=generate_action(
-                        user_details.name, NotificationConstants.LIKED_DISCUSSION
-                    ),
-                    proposal_id=proposal.id,
-                )
-                # handle async web sockets stuff
-                run_coroutine_in_sync(
-                    notification_create(
-                        proposal.user_details_id, notification, db, current_user=None
+            outbox.append(activity_event(user_details_id, activity))
+        if req.type == "like" and proposal.user_details_id != user_details_id:
+            notification = CreateAndUpdateNotification(
+                user_details_id=proposal.user_details_id,
+                action=generate_action(
+                    user_details.name, NotificationConstants.LIKED_DISCUSSION
+                ),
+                proposal_id=proposal.id,
+                group_key=NotificationConstants.LIKED_DISCUSSION,
+                actors=[
+                    NotificationActor(
+                        user_details_id=user_details_id, name=user_details.name
                     )
-                )
+                ],
+            )
+            outbox.append(notification_event(proposal.user_details_id, notification))
+        likes = set_likes_by_proposal_id(
+            db, proposal_id, user_details_id, req.type, outbox
+        )
+        outbox_relay.wake()
         return likes
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
@@ -229,39 +287,44 @@ def follow_proposal(
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
-        followers = set_followers_by_proposal_id(
-            db, proposal_id, req.user_details_id, req.type
-        )
-        # add to activities and notifier
-        if type(followers) != JSONResponse:
-            proposal = get_proposal_by_id(db, proposal_id)
-            # activity logging
-            action = {
-                "follow": ActivityConstants.FOLLOWED_DISCUSSION,
-                "unfollow": ActivityConstants.UNFOLLOWED_DISCUSSION,
-            }
+        proposal = get_basic_proposal_by_id(db, proposal_id)
+        if proposal is None:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND, content="proposal not found"
+            )
+        # activities and notifications commit with the follow
+        outbox = []
+        action = {
+            "follow": ActivityConstants.FOLLOWED_DISCUSSION,
+            "unfollow": ActivityConstants.UNFOLLOWED_DISCUSSION,
+        }
+        if req.type in action:
             activity = CreateOrUpdateActivity(
                 user_details_id=user_details_id,
                 action=action[req.type],
                 value=proposal.name,
                 category=ActivityConstants.PROPOSAL_CATEGORY,
             )
-            create_user_activity(db, user_details_id, activity)
-            # notifications
-            if req.type == "follow" and proposal.user_details_id != user_details_id:
-                notification = CreateAndUpdateNotification(
-                    user_details_id=proposal.user_details_id,
-                    action=generate_action(
-                        user_details.name, NotificationConstants.FOLLOW_DISCUSSION
-                    ),
-                    proposal_id=proposal.id,
-                )
-                # handle async web sockets stuff
-                run_coroutine_in_sync(
-                    notification_create(
-                        proposal.user_details_id, notification, db, current_user=None
+            outbox.append(activity_event(user_details_id, activity))
+        if req.type == "follow" and proposal.user_details_id != user_details_id:
+            notification = CreateAndUpdateNotification(
+                user_details_id=proposal.user_details_id,
+                action=generate_action(
+                    user_details.name, NotificationConstants.FOLLOW_DISCUSSION
+                ),
+                proposal_id=proposal.id,
+                group_key=NotificationConstants.FOLLOW_DISCUSSION,
+                actors=[
+                    NotificationActor(
+                        user_details_id=user_details_id, name=user_details.name
                     )
-                )
+                ],
+            )
+            outbox.append(notification_event(proposal.user_details_id, notification))
+        followers = set_followers_by_proposal_id(
+            db, proposal_id, user_details_id, req.type, outbox
+        )
+        outbox_relay.wake()
         return followers
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
@@ -271,43 +334,31 @@ def follow_proposal(
 async def comment_proposal(
     proposal_id: int,
     comment: CreateOrUpdateComment,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     user=Depends(get_current_active_user),
 ):
     try:
         user_details_id = comment.user_details_id
-        user_details = get_user_details_by_id(db, user_details_id)
+        user_details = await aio.get_user_details_by_id(db, user_details_id)
         if type(user_details) == JSONResponse:
             return user_details
         if user_details.user_id != user.id:
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
-
-        ret = add_commment_by_proposal_id(db, proposal_id, comment)
-        comment_dict = get_comment_by_id(db, ret.id).dict()
-        comment_dict["date"] = str(comment_dict["date"])
-        if type(comment_dict) == JSONResponse:
-            return comment_dict
-        # web sockets
-        await connection_manager.send_personal_message_by_substring_matcher(
-            "proposal_comments_" + str(proposal_id),
-            {
-                "proposal_id": proposal_id,
-                "comment": comment_dict,
-            },
-        )
-        # add to activities and notifier
-        proposal = get_proposal_by_id(db, proposal_id)
-        # activity logging
+        proposal = await aio.get_basic_proposal_by_id(db, proposal_id)
+        if proposal is None:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND, content="proposal not found"
+            )
+        # activities and notifications commit with the comment
         activity = CreateOrUpdateActivity(
             user_details_id=user_details_id,
             action=ActivityConstants.COMMENT,
             value=proposal.name,
             category=ActivityConstants.COMMENT_CATEGORY,
         )
-        create_user_activity(db, user_details_id, activity)
-        # notifications
+        outbox = [activity_event(user_details_id, activity)]
         if proposal.user_details_id != user_details_id:
             notification = CreateAndUpdateNotification(
                 user_details_id=proposal.user_details_id,
@@ -316,14 +367,12 @@ async def comment_proposal(
                 ),
                 proposal_id=proposal.id,
             )
-            await notification_create(
-                proposal.user_details_id, notification, db, current_user=None
-            )
-        if "parent" in comment_dict and comment_dict["parent"] != None:
-            parent_comment_id = comment_dict["parent"]
-            parent_user_details_id = get_comment_by_id(
-                db, parent_comment_id
-            ).user_details_id
+            outbox.append(notification_event(proposal.user_details_id, notification))
+        if comment.parent != None:
+            parent_comment = await aio.get_comment_by_id(db, comment.parent)
+            if type(parent_comment) == JSONResponse:
+                return parent_comment
+            parent_user_details_id = parent_comment.user_details_id
             if parent_user_details_id != user_details_id:
                 notification = CreateAndUpdateNotification(
                     user_details_id=parent_user_details_id,
@@ -332,9 +381,24 @@ async def comment_proposal(
                     ),
                     proposal_id=proposal.id,
                 )
-                await notification_create(
-                    parent_user_details_id, notification, db, current_user=None
-                )
+                outbox.append(notification_event(parent_user_details_id, notification))
+
+        ret = await aio.add_commment_by_proposal_id(db, proposal_id, comment, outbox)
+        outbox_relay.wake()
+        await ainvalidate_response_cache(f"proposal_{proposal_id}")
+        comment_dict = await aio.get_comment_by_id(db, ret.id)
+        if type(comment_dict) == JSONResponse:
+            return comment_dict
+        comment_dict = comment_dict.dict()
+        comment_dict["date"] = str(comment_dict["date"])
+        # web sockets
+        await connection_manager.publish(
+            proposal_comments_topic(proposal_id),
+            {
+                "proposal_id": proposal_id,
+                "comment": comment_dict,
+            },
+        )
         return comment_dict
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
@@ -343,22 +407,25 @@ async def comment_proposal(
 @r.delete("/comment/{comment_id}", name="proposals:delete-comment-proposal")
 async def delete_comment_proposal(
     comment_id: int,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     user=Depends(get_current_active_user),
 ):
     try:
-        comment = get_comment_by_id(db, comment_id)
+        comment = await aio.get_comment_by_id(db, comment_id)
         if type(comment) == JSONResponse:
             return comment
         user_details_id = comment.user_details_id
-        user_details = get_user_details_by_id(db, user_details_id)
+        user_details = await aio.get_user_details_by_id(db, user_details_id)
         if type(user_details) == JSONResponse:
             return user_details
         if user_details.user_id != user.id:
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
-        return delete_comment_by_comment_id(db, comment_id)
+        ret = await aio.delete_comment_by_comment_id(db, comment_id)
+        if type(ret) != JSONResponse:
+            await ainvalidate_response_cache(f"proposal_{comment.proposal_id}")
+        return ret
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
 
@@ -379,41 +446,40 @@ def like_comment(
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
-        likes = set_likes_by_comment_id(db, comment_id, user_details_id, req.type)
-        # add to activities and notifier
-        if type(likes) != JSONResponse:
-            comment = get_comment_by_id(db, comment_id)
-            proposal = get_proposal_by_id(db, comment.proposal_id)
-            # activity logging
-            action = {
-                "like": ActivityConstants.LIKED_COMMENT,
-                "dislike": ActivityConstants.DISLIKE_COMMENT,
-                "remove": ActivityConstants.REMOVED_LIKE_COMMENT,
-            }
-            if req.type == "like":
-                activity = CreateOrUpdateActivity(
-                    user_details_id=user_details_id,
-                    action=action[req.type],
-                    value=proposal.name,
-                    category=ActivityConstants.COMMENT_CATEGORY,
-                )
-                create_user_activity(db, user_details_id, activity)
-            # notifications
-            if req.type == "like" and proposal.user_details_id != user_details_id:
-                notification = CreateAndUpdateNotification(
-                    user_details_id=proposal.user_details_id,
-                    action=generate_action(
-                        user_details.name, NotificationConstants.COMMENT_LIKE
-                    ),
-                    proposal_id=proposal.id,
-                )
-                # handle async web sockets stuff
-                run_coroutine_in_sync(
-                    notification_create(
-                        proposal.user_details_id, notification, db, current_user=None
+        comment = get_comment_by_id(db, comment_id)
+        if type(comment) == JSONResponse:
+            return comment
+        proposal = get_basic_proposal_by_id(db, comment.proposal_id)
+        # activities and notifications commit with the like
+        outbox = []
+        if req.type == "like":
+            activity = CreateOrUpdateActivity(
+                user_details_id=user_details_id,
+                action=ActivityConstants.LIKED_COMMENT,
+                value=proposal.name,
+                category=ActivityConstants.COMMENT_CATEGORY,
+            )
+            outbox.append(activity_event(user_details_id, activity))
+        if req.type == "like" and proposal.user_details_id != user_details_id:
+            notification = CreateAndUpdateNotification(
+                user_details_id=proposal.user_details_id,
+                action=generate_action(
+                    user_details.name, NotificationConstants.COMMENT_LIKE
+                ),
+                proposal_id=proposal.id,
+                group_key=NotificationConstants.COMMENT_LIKE,
+                actors=[
+                    NotificationActor(
+                        user_details_id=user_details_id, name=user_details.name
                     )
-                )
-            return likes
+                ],
+            )
+            outbox.append(notification_event(proposal.user_details_id, notification))
+        likes = set_likes_by_comment_id(
+            db, comment_id, user_details_id, req.type, outbox
+        )
+        outbox_relay.wake()
+        return likes
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
 
@@ -436,9 +502,23 @@ def create_addendum_proposal(
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
+        # the activity commits with the addendum
+        activity = CreateOrUpdateActivity(
+            user_details_id=proposal.user_details_id,
+            action=ActivityConstants.ADDED_ADDENDUM,
+            value=addendum.name,
+            secondary_action=ActivityConstants.ADDENDUM_PR,
+            secondary_value=proposal.name,
+            category=ActivityConstants.PROPOSAL_CATEGORY,
+        )
         addendum = add_addendum_by_proposal_id(
-            db, proposal.user_details_id, proposal_id, addendum
+            db,
+            proposal.user_details_id,
+            proposal_id,
+            addendum,
+            [activity_event(proposal.user_details_id, activity)],
         )
+        outbox_relay.wake()
         if type(addendum) == JSONResponse:
             return addendum
         addendum_dict = {
@@ -448,16 +528,6 @@ def create_addendum_proposal(
             "content": addendum.content,
             "date": str(addendum.date),
         }
-        # add to activitites
-        activity = CreateOrUpdateActivity(
-            user_details_id=proposal.user_details_id,
-            action=ActivityConstants.ADDED_ADDENDUM,
-            value=addendum.name,
-            secondary_action=ActivityConstants.ADDENDUM_PR,
-            secondary_value=proposal.name,
-            category=ActivityConstants.PROPOSAL_CATEGORY,
-        )
-        create_user_activity(db, proposal.user_details_id, activity)
         return addendum_dict
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
@@ -514,11 +584,11 @@ def delete_proposal(
 
 @r.websocket("/ws/{proposal_id}")
 async def websocket_endpoint(websocket: WebSocket, proposal_id: str):
-    random_key = "proposal_comments_" + proposal_id + "_" + str(random.random())
-    await connection_manager.connect(random_key, websocket)
+    topic = proposal_comments_topic(proposal_id)
+    await connection_manager.connect(topic, websocket)
     try:
         while True:
             # pause loop
             await websocket.receive_text()
     except WebSocketDisconnect:
-        connection_manager.disconnect(random_key)
+        connection_manager.disconnect(topic, websocket)
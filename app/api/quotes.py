@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, status
 import typing as t
 from starlette.responses import JSONResponse
 
+from cache.response_cache import cached_response
 from db.session import get_db
 from db.crud.quotes import (
     get_quotes,
@@ -21,6 +22,7 @@ quotes_router = r = APIRouter()
     response_model_exclude_none=True,
     name="quote:all-quotes"
 )
+@cached_response("quotes", t.List[Quote], ["quotes"])
 def quotes_list(
     show_hidden: bool = False,
     db=Depends(get_db),
@@ -2,16 +2,11 @@ from datetime import timedelta
 import typing as t
 from fastapi import APIRouter, Depends, Response, status
 from starlette.responses import JSONResponse
-from ergo_python_appkit.appkit import ErgoAppKit
 
-from db.session import get_db
+from db.session import get_db, get_async_db
+from db.crud import aio
 from db.crud.users import (
-    get_users,
-    get_user,
     search_users,
-    create_user,
-    delete_user,
-    edit_user,
     get_user_address_config,
     get_user_profile,
     get_user_profile_settings,
@@ -40,7 +35,13 @@ from db.schemas.ergoauth import LoginRequestWebResponse, ErgoAuthResponse
 
 from core.auth import get_current_active_user, get_current_active_superuser
 from core.security import generate_signing_message, generate_verification_id
+from cache.auth_cache import (
+    ainvalidate_user_principals,
+    invalidate_user_principals,
+)
 from cache.cache import cache
+from cache.response_cache import invalidate_response_cache
+from verifier.client import verifier
 from core import security
 
 
@@ -58,14 +59,14 @@ BASE_URL = "https://api.paideia.im"
 )
 async def users_list(
     response: Response,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_active_superuser),
 ):
     """
     Get all users
     """
     try:
-        users = get_users(db)
+        users = await aio.get_users(db)
         # This is necessary for react-admin to work
         response.headers["Content-Range"] = f"0-9/{len(users)}"
         return users
@@ -91,14 +92,14 @@ async def user_me(current_user=Depends(get_current_active_user)):
 )
 async def user_details(
     user_id: int,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_active_superuser),
 ):
     """
     Get any user details
     """
     try:
-        return get_user(db, user_id)
+        return await aio.get_user(db, user_id)
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST, content=f"{str(e)}"
@@ -108,14 +109,15 @@ async def user_details(
 @r.post("/", response_model=User, response_model_exclude_none=True, name="users:create")
 async def user_create(
     user: UserCreate,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_active_superuser),
 ):
     """
     Create a new user
     """
     try:
-        return create_user(db, user)
+        hashed_password = await security.aget_password_hash(user.password)
+        return await aio.create_user(db, user, hashed_password)
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST, content=f"{str(e)}"
@@ -131,14 +133,20 @@ async def user_create(
 async def user_edit(
     user_id: int,
     user: UserEdit,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_active_superuser),
 ):
     """
     Update existing user
     """
     try:
-        return edit_user(db, user_id, user)
+        hashed_password = None
+        if user.password:
+            hashed_password = await security.aget_password_hash(user.password)
+        ret = await aio.edit_user(db, user_id, user, hashed_password)
+        if type(ret) != JSONResponse:
+            await ainvalidate_user_principals(user_id)
+        return ret
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST, content=f"{str(e)}"
@@ -153,14 +161,17 @@ async def user_edit(
 )
 async def user_delete(
     user_id: int,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_active_superuser),
 ):
     """
     Delete existing user
     """
     try:
-        return delete_user(db, user_id)
+        ret = await aio.delete_user(db, user_id)
+        if type(ret) != JSONResponse:
+            await ainvalidate_user_principals(user_id)
+        return ret
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST, content=f"{str(e)}"
@@ -251,7 +262,7 @@ def verify_user_address_change(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
 
-        verified = ErgoAppKit.verifyErgoAuthSignedMessage(
+        verified = verifier.verify_signed_message_sync(
             signingRequest["address"],
             signingRequest["signingMessage"],
             authResponse.signedMessage,
@@ -270,6 +281,7 @@ def verify_user_address_change(
             ret = update_primary_address_for_user(
                 db, current_user.id, signingRequest["address"]
             )
+            invalidate_user_principals(current_user.id)
             return UserAddressConfig(
                 id=ret.id,
                 alias=ret.alias,
@@ -456,7 +468,11 @@ def edit_user_details(
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED, content="user not authorized"
             )
-        return edit_user_profile(db, user_details_id, user_details)
+        ret = edit_user_profile(db, user_details_id, user_details)
+        if type(ret) != JSONResponse:
+            # cached proposals show the profile's name and image
+            invalidate_response_cache(f"user_details_{user_details_id}")
+        return ret
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST, content=f"{str(e)}"
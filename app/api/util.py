@@ -8,9 +8,18 @@ from pydantic import BaseModel
 from starlette.responses import JSONResponse
 from config import Config, Network  # api specific config
 from core.auth import get_current_active_user, get_current_active_superuser
+from core.lazy import clients, startup_timings
 from cache.cache import cache
+from cache.response_cache import response_cache_stats
+from db.crud.counters import reconcile_counters
+from db.crud.outbox import count_outbox_events
+from db.pool import pools_status
+from db.session import get_db, engine, async_engine
 from aws.s3 import S3
 from util.image_optimizer import pillow_image_optimizer
+from outbox.relay import outbox_relay
+from verifier.client import verifier
+from websocket.connection_manager import connection_manager
 
 CFG = Config[Network]
 
@@ -106,3 +115,86 @@ def forceInvalidateCache(
         return {"status": "success", "detail": cache.invalidate(req.key)}
     except Exception as e:
         return JSONResponse(status_code=400, content=f"ERR::invalidate_cache::{str(e)}")
+
+
+@r.post("/reconcile_counters", name="util:reconcile-counters")
+def reconcileCounters(
+    db=Depends(get_db), current_user=Depends(get_current_active_superuser)
+):
+    """
+    Rebuild like, follower, comment and proposal counters from source tables
+    """
+    try:
+        return {"status": "success", "detail": reconcile_counters(db)}
+    except Exception as e:
+        return JSONResponse(status_code=400, content=f"ERR::reconcile_counters::{str(e)}")
+
+
+@r.get("/db_pool", name="util:db-pool-status")
+def dbPoolStatus(current_user=Depends(get_current_active_superuser)):
+    """
+    Connection pool gauges for the worker serving this request
+    """
+    try:
+        return pools_status({"sync": engine, "async": async_engine})
+    except Exception as e:
+        return JSONResponse(status_code=400, content=f"ERR::db_pool::{str(e)}")
+
+
+@r.get("/cache_stats", name="util:cache-stats")
+def cacheStats(current_user=Depends(get_current_active_superuser)):
+    """
+    Cache hit/miss ratios for the worker serving this request
+    """
+    try:
+        return dict(response_cache_stats.snapshot(), tiers=cache.stats.snapshot())
+    except Exception as e:
+        return JSONResponse(status_code=400, content=f"ERR::cache_stats::{str(e)}")
+
+
+@r.get("/verifier", name="util:verifier-stats")
+async def verifierStats(current_user=Depends(get_current_active_superuser)):
+    """
+    Queue depth and latency of the shared signature verification service
+    """
+    try:
+        return await verifier.stats()
+    except Exception as e:
+        return JSONResponse(status_code=400, content=f"ERR::verifier::{str(e)}")
+
+
+@r.get("/websockets", name="util:websocket-stats")
+def websocketStats(current_user=Depends(get_current_active_superuser)):
+    """
+    Send queue depths, drops and broker counts for the worker serving this request
+    """
+    try:
+        return connection_manager.snapshot()
+    except Exception as e:
+        return JSONResponse(status_code=400, content=f"ERR::websockets::{str(e)}")
+
+
+@r.get("/outbox", name="util:outbox-stats")
+def outboxStats(db=Depends(get_db), current_user=Depends(get_current_active_superuser)):
+    """
+    Outbox backlog and the relay counts of the worker serving this request
+    """
+    try:
+        return dict(
+            outbox_relay.snapshot(),
+            backlog=count_outbox_events(db),
+            dead=count_outbox_events(db, dead=True),
+        )
+    except Exception as e:
+        return JSONResponse(status_code=400, content=f"ERR::outbox::{str(e)}")
+
+
+@r.get("/startup", name="util:startup-timings")
+def startupTimings(current_user=Depends(get_current_active_superuser)):
+    """
+    Startup phase timings and loaded clients for the worker serving this request
+    """
+    try:
+        return dict(startup_timings.report(), clients=clients.loaded())
+    except Exception as e:
+        return JSONResponse(status_code=400, content=f"ERR::startup::{str(e)}")
@@ -1,13 +1,20 @@
-import os
-import boto3
-from botocore.client import Config as botoConfig
 from config import Config, Network
+from core.lazy import clients
 
 CFG = Config[Network]
 
-S3 = boto3.resource(
-    "s3",
-    aws_access_key_id=CFG.aws_access_key_id,
-    aws_secret_access_key=CFG.aws_secret_access_key,
-    config=botoConfig(signature_version="s3v4"),
-)
+
+def create_s3_resource():
+    # boto3 is slow to import and build, only workers that upload pay for it
+    import boto3
+    from botocore.client import Config as botoConfig
+
+    return boto3.resource(
+        "s3",
+        aws_access_key_id=CFG.aws_access_key_id,
+        aws_secret_access_key=CFG.aws_secret_access_key,
+        config=botoConfig(signature_version="s3v4"),
+    )
+
+
+S3 = clients.register("s3", create_s3_resource)
@@ -0,0 +1,59 @@
+"""
+latency of an authenticated endpoint vs an unauthenticated one
+
+the difference between the two is the cost of resolving the bearer token,
+run once against a build before the principal cache and once after (needs
+httpx):
+    python benchmarks/auth_overhead.py --url http://localhost:8001 \
+        --token <jwt> --requests 2000 --concurrency 16
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def worker(client, path, headers, samples, remaining):
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        start = time.perf_counter()
+        res = await client.get(path, headers=headers)
+        res.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+
+
+async def measure(client, path, headers, args):
+    samples = []
+    remaining = [args.requests]
+    await asyncio.gather(
+        *[
+            worker(client, path, headers, samples, remaining)
+            for _ in range(args.concurrency)
+        ]
+    )
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        auth = {"Authorization": f"Bearer {args.token}"}
+        # warm up so the first token resolution is not measured
+        await client.get("/api/users/me", headers=auth)
+        base = await measure(client, "/api/ping", {}, args)
+        authed = await measure(client, "/api/users/me", auth, args)
+    print(f"/api/ping     p50 {base[0]:.2f}ms p99 {base[1]:.2f}ms")
+    print(f"/api/users/me p50 {authed[0]:.2f}ms p99 {authed[1]:.2f}ms")
+    print(f"auth overhead p50 {authed[0] - base[0]:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,150 @@
+"""
+encode/decode time and stored bytes per cache codec
+
+usage (no services needed):
+    PYTHONPATH=. python benchmarks/cache_codecs.py --iterations 2000
+"""
+import argparse
+import datetime
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from cache.codec import CODECS, COMPRESSORS, CacheCodec
+from db.schemas.dao import Dao as DaoSchema
+from db.schemas.proposal import Proposal as ProposalSchema
+
+
+def dao_payload():
+    return DaoSchema(
+        id=1,
+        dao_name="Paideia",
+        dao_short_description="a dao for daos " * 8,
+        dao_url="paideia",
+        governance={
+            "id": 1,
+            "is_optimistic": False,
+            "is_quadratic_voting": True,
+            "time_to_challenge__sec": 86400,
+            "quorum": 10,
+            "vote_duration__sec": 604800,
+            "amount": 1.5,
+            "support_needed": 50,
+            "governance_whitelist": list(range(50)),
+        },
+        tokenomics={
+            "id": 1,
+            "token_id": "1fd6e032e8476c4aa54c18c1a308dce83940e8f4a28f576440513ed7326ad489",
+            "token_name": "Paideia",
+            "token_ticker": "PAI",
+            "token_amount": 200000000,
+            "is_activated": True,
+            "token_holders": [
+                {"id": i, "ergo_address_id": i, "percentage": 0.5, "balance": 1000}
+                for i in range(100)
+            ],
+            "distributions": [
+                {
+                    "id": i,
+                    "distribution_type": "vesting",
+                    "balance": 10,
+                    "percentage": 1,
+                    "additionalDetails": {"vesting": {"frequency": "monthly"}},
+                }
+                for i in range(10)
+            ],
+        },
+        design={
+            "id": 1,
+            "theme_id": 1,
+            "theme_name": "default",
+            "primary_color": "#ffffff",
+            "secondary_color": "#000000",
+            "dark_primary_color": "#000000",
+            "dark_secondary_color": "#ffffff",
+            "logo_url": "https://paideia.im/logo.png",
+            "footer_social_links": [
+                {"id": i, "social_network": "twitter", "link_url": "https://x.com"}
+                for i in range(5)
+            ],
+        },
+        created_dtz=datetime.datetime.now(),
+    )
+
+
+def proposal_payload(comments: int = 200):
+    now = datetime.datetime.now()
+    return ProposalSchema(
+        id=1,
+        dao_id=1,
+        user_details_id=1,
+        name="Fund the treasury",
+        content="proposal content " * 200,
+        attachments=[],
+        references=[],
+        references_meta=[],
+        date=now,
+        comments=[
+            {
+                "id": i,
+                "proposal_id": 1,
+                "user_details_id": i % 20,
+                "comment": f"comment {i} " * 20,
+                "date": now,
+                "alias": f"user_{i % 20}",
+                "likes": list(range(i % 7)),
+                "dislikes": [],
+            }
+            for i in range(comments)
+        ],
+        likes=list(range(40)),
+        dislikes=list(range(5)),
+        followers=list(range(30)),
+        user_followers=list(range(30)),
+        addendums=[],
+        created=3,
+        alias="author",
+    )
+
+
+def measure(codec, value, iterations):
+    encoded = codec.encode(value)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(value)
+    encode = (time.perf_counter() - start) / iterations * 1_000_000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.decode(encoded)
+    decode = (time.perf_counter() - start) / iterations * 1_000_000
+    return encode, decode, len(encoded)
+
+
+def main(args):
+    payloads = {
+        "dao": jsonable_encoder(dao_payload()),
+        "proposal_200_comments": jsonable_encoder(proposal_payload()),
+    }
+    compressions = [None] + [name for name, _, _ in COMPRESSORS.values()]
+    for name, value in payloads.items():
+        print(f"{name} (stdlib json {len(json.dumps(value))} bytes)")
+        for codec in CODECS.values():
+            for compression in compressions:
+                encode, decode, size = measure(
+                    CacheCodec(codec.name, compression, args.compress_min_bytes),
+                    value,
+                    args.iterations,
+                )
+                label = f"{codec.name}+{compression or 'none'}"
+                print(
+                    f"  {label:>12}: encode {encode:8.1f}us decode {decode:8.1f}us"
+                    f" {size:7d} bytes"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--compress-min-bytes", type=int, default=4096)
+    main(parser.parse_args())
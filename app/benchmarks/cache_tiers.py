@@ -0,0 +1,48 @@
+"""
+get latency of the in-process tier vs a plain redis round trip
+
+usage (against a running redis, uses REDIS_HOST/REDIS_PORT):
+    PYTHONPATH=. python benchmarks/cache_tiers.py --iterations 10000
+"""
+import argparse
+import statistics
+import time
+
+from cache.cache import LocalCache, RedisCache
+from cache.redis_client import redisClient
+
+
+def measure(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    samples.sort()
+    return {
+        "p50_us": round(statistics.median(samples), 2),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1], 2),
+    }
+
+
+def main(args):
+    value = {"faqs": [{"question": "q" * 64, "answer": "a" * 512}] * args.items}
+    redis_only = RedisCache(client=redisClient)
+    two_tier = RedisCache(local=LocalCache(), client=redisClient)
+    redis_only.set("benchmark_cache_tiers", value)
+
+    results = {
+        "redis": measure(lambda: redis_only.get("benchmark_cache_tiers"), args.iterations),
+        "local": measure(lambda: two_tier.get("benchmark_cache_tiers"), args.iterations),
+    }
+    redis_only.invalidate("benchmark_cache_tiers")
+    for tier, result in results.items():
+        print(f"{tier:>6}: p50 {result['p50_us']}us p99 {result['p99_us']}us")
+    print(two_tier.stats.snapshot())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=20)
+    main(parser.parse_args())
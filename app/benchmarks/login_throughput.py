@@ -0,0 +1,54 @@
+"""
+throughput of /api/auth/login under concurrent load
+
+run once against a build before the async redis client and once after,
+with the same worker count (needs httpx):
+    python benchmarks/login_throughput.py --url http://localhost:8001 \
+        --address <wallet address> --concurrency 64 --duration 30
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def login(client, args, samples, errors, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        res = await client.post("/api/auth/login", json={"addresses": [args.address]})
+        if res.status_code == 200:
+            samples.append((time.perf_counter() - start) * 1000)
+        else:
+            errors.append(res.status_code)
+
+
+async def main(args):
+    samples = []
+    errors = []
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        runner = asyncio.gather(
+            *[login(client, args, samples, errors, stop) for _ in range(args.concurrency)]
+        )
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await runner
+
+    samples.sort()
+    print(f"requests: {len(samples)}, errors: {len(errors)}")
+    print(f"throughput: {len(samples) / args.duration:.1f} req/s")
+    if samples:
+        print(f"p50: {statistics.median(samples):.2f}ms")
+        print(f"p99: {samples[int(len(samples) * 0.99) - 1]:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--address", required=True)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=int, default=30)
+    asyncio.run(main(parser.parse_args()))
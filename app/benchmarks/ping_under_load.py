@@ -0,0 +1,59 @@
+"""
+p99 latency of /api/ping while comments are being posted
+
+usage (against a running api, needs httpx):
+    python benchmarks/ping_under_load.py --url http://localhost:8001 \
+        --token <jwt> --user-details-id 1 --proposal-id 1
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def post_comments(client, args, stop):
+    while not stop.is_set():
+        await client.put(
+            f"/api/proposals/comment/{args.proposal_id}",
+            json={"user_details_id": args.user_details_id, "comment": "load test"},
+            headers={"Authorization": f"Bearer {args.token}"},
+        )
+
+
+async def ping(client, samples, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/ping")
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def main(args):
+    samples = []
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.writers + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        tasks = [ping(client, samples, stop)]
+        tasks += [post_comments(client, args, stop) for _ in range(args.writers)]
+        runner = asyncio.gather(*tasks)
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await runner
+    samples.sort()
+    print(f"writers={args.writers} ping samples={len(samples)}")
+    print(f"p50={statistics.median(samples):.1f}ms")
+    print(f"p99={samples[int(len(samples) * 0.99) - 1]:.1f}ms")
+    print(f"max={samples[-1]:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--user-details-id", type=int, required=True)
+    parser.add_argument("--proposal-id", type=int, required=True)
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,56 @@
+"""
+first login signup throughput, wallet only accounts with and without bcrypt
+
+runs against an in-memory sqlite database, no services needed:
+    PYTHONPATH=. python benchmarks/signup_storm.py --users 200
+"""
+import argparse
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core import security
+from core.auth import sign_up_new_user
+from db.models.users import ErgoAddress, User
+from db.session import Base
+
+
+def make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[User.__table__, ErgoAddress.__table__])
+    return sessionmaker(bind=engine)()
+
+
+def storm(users: int, legacy: bool):
+    db = make_db()
+    start = time.perf_counter()
+    for i in range(users):
+        address = f"9f{i:050d}"
+        # the old path bcrypt hashed the default password on every first login
+        hashed_password = (
+            security.pwd_context.hash(security.ERGOAUTH_DEFAULT_PASSWORD)
+            if legacy
+            else None
+        )
+        sign_up_new_user(
+            db,
+            address,
+            security.ERGOAUTH_DEFAULT_PASSWORD,
+            address,
+            hashed_password=hashed_password,
+        )
+    return users / (time.perf_counter() - start)
+
+
+def main(args):
+    before = storm(args.users, legacy=True)
+    after = storm(args.users, legacy=False)
+    print(f"bcrypt default password: {before:8.1f} signups/s")
+    print(f"wallet only credential:  {after:8.1f} signups/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,85 @@
+"""
+time to first /api/ping and resident memory per worker
+
+starts uvicorn from the app directory and stops it once measured, run it on
+every change that touches imports (needs httpx, linux only for rss):
+    python benchmarks/startup.py --workers 4 --port 8011
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def children(pid: int):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(x) for x in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def is_worker(pid: int):
+    # skip the multiprocessing resource tracker
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return b"resource_tracker" not in f.read()
+
+
+def rss_mb(pid: int):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def main(args):
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(args.port),
+            "--workers",
+            str(args.workers),
+        ],
+        cwd=os.path.join(os.path.dirname(__file__), ".."),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{args.port}/api/ping").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.perf_counter() - start > args.timeout:
+                raise TimeoutError("server did not answer /api/ping")
+            time.sleep(0.05)
+        print(f"time to first ping: {(time.perf_counter() - start) * 1000:.0f}ms")
+        # give the remaining workers time to finish booting
+        time.sleep(args.settle)
+        workers = [pid for pid in children(server.pid) if is_worker(pid)]
+        for pid in workers:
+            print(f"worker {pid}: {rss_mb(pid):.1f}MB rss")
+        if workers:
+            print(f"mean worker rss: {sum(map(rss_mb, workers)) / len(workers):.1f}MB")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--settle", type=float, default=2)
+    main(parser.parse_args())
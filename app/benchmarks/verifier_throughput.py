@@ -0,0 +1,44 @@
+"""
+verifications per second through the shared verifier service
+
+start the service with different --processes values and compare, the
+signed message can come from any successful ergoauth login:
+    python -m verifier.server --socket /tmp/verifier.sock --processes 4
+    PYTHONPATH=. python benchmarks/verifier_throughput.py --socket /tmp/verifier.sock \
+        --address <address> --message <message> --signed <signedMessage> --proof <proof>
+"""
+import argparse
+import asyncio
+import time
+
+from verifier.client import VerifierClient
+
+
+async def main(args):
+    client = VerifierClient(args.socket)
+    remaining = [args.requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            await client.verify_signed_message(
+                args.address, args.message, args.signed, args.proof
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    print(f"throughput: {args.requests / elapsed:.1f} verifications/s")
+    print(await client.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--address", required=True)
+    parser.add_argument("--message", required=True)
+    parser.add_argument("--signed", required=True)
+    parser.add_argument("--proof", required=True)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+cost of one comment broadcast with many idle sockets connected
+
+in-process with stand-in sockets, compares the topic index with the old scan
+over every connection id, then the time a publishing request waits when one
+subscriber is slow (no services needed):
+    PYTHONPATH=. python benchmarks/websocket_broadcast.py --sockets 10000 --slow-ms 50
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from websocket.connection_manager import ConnectionManager, proposal_comments_topic
+
+
+class SlowWebSocket:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        await asyncio.sleep(self.delay)
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data))
+
+
+class IdleWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        pass
+
+    async def send_json(self, data):
+        json.dumps(data)
+
+
+async def substring_broadcast(connections: dict, key: str, message):
+    # the previous implementation
+    for id in connections:
+        if key in id:
+            await connections[id].send_json(message)
+
+
+async def main(args):
+    manager = ConnectionManager()
+    connections = {}
+    for i in range(args.sockets):
+        proposal_id = i % args.proposals
+        websocket = IdleWebSocket()
+        await manager.connect(proposal_comments_topic(proposal_id), websocket)
+        connections[f"proposal_comments_{proposal_id}_{i}"] = websocket
+    message = {"proposal_id": 1, "comment": {"comment": "x" * 200}}
+
+    start = time.perf_counter()
+    for _ in range(args.broadcasts):
+        await substring_broadcast(connections, proposal_comments_topic(1), message)
+    scan = (time.perf_counter() - start) / args.broadcasts * 1_000_000
+
+    start = time.perf_counter()
+    for _ in range(args.broadcasts):
+        await manager.publish(proposal_comments_topic(1), message)
+        await manager.drain(proposal_comments_topic(1))
+    indexed = (time.perf_counter() - start) / args.broadcasts * 1_000_000
+
+    subscribers = manager.subscribers(proposal_comments_topic(1))
+    print(f"{args.sockets} sockets, {subscribers} subscribed to the topic")
+    print(f"substring scan: {scan:10.1f}us per broadcast")
+    print(f"topic index:    {indexed:10.1f}us per broadcast")
+
+    # one slow mobile client on the topic
+    slow = SlowWebSocket(args.slow_ms / 1000)
+    await manager.connect(proposal_comments_topic(1), slow)
+    connections["proposal_comments_1_slow"] = slow
+    start = time.perf_counter()
+    await substring_broadcast(connections, proposal_comments_topic(1), message)
+    awaited = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    await manager.publish(proposal_comments_topic(1), message)
+    queued = (time.perf_counter() - start) * 1000
+    await manager.drain()
+    print(f"with a {args.slow_ms}ms socket the publisher waits:")
+    print(f"awaited sends:  {awaited:10.2f}ms")
+    print(f"send queues:    {queued:10.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=10000)
+    parser.add_argument("--proposals", type=int, default=1000)
+    parser.add_argument("--broadcasts", type=int, default=200)
+    parser.add_argument("--slow-ms", type=float, default=50)
+    asyncio.run(main(parser.parse_args()))
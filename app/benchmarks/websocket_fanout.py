@@ -0,0 +1,96 @@
+"""
+per message overhead of relaying websocket pushes between workers
+
+two connection managers stand in for two workers, the remote one has a
+socket on every topic. reports the publisher's cost per message with and
+without the broker, batches sent and publish to remote delivery latency.
+against a real redis (fakeredis with --fake):
+    PYTHONPATH=. python benchmarks/websocket_fanout.py --host localhost --messages 20000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import fakeredis
+import redis.asyncio as aioredis
+
+from websocket.connection_manager import ConnectionManager
+
+
+class TimingWebSocket:
+    def __init__(self, received: list):
+        self.received = received
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.received.append(time.perf_counter())
+
+
+def client(args, server):
+    if args.fake:
+        return fakeredis.FakeAsyncRedis(server=server)
+    return aioredis.Redis(host=args.host, port=args.port)
+
+
+async def publish_all(manager, args, coalesce=False):
+    sent = []
+    start = time.perf_counter()
+    for i in range(args.messages):
+        sent.append(time.perf_counter())
+        await manager.publish(f"topic_{i % args.topics}", {"seq": i}, coalesce)
+        if i % args.burst == 0:
+            # let the flush and relay tasks run, like requests interleaving
+            await asyncio.sleep(0)
+    return sent, time.perf_counter() - start
+
+
+async def main(args):
+    server = fakeredis.FakeServer()
+    options = {"flush_interval": args.flush_ms / 1000, "max_batch": args.max_batch}
+
+    local_only = ConnectionManager()
+    _, elapsed = await publish_all(local_only, args)
+    print(f"local only:  {elapsed / args.messages * 1e6:8.2f} us/message")
+
+    publisher = ConnectionManager({"client": client(args, server), **options})
+    remote = ConnectionManager({"client": client(args, server), **options})
+    for manager in (publisher, remote):
+        await manager.broker.start()
+        await manager.broker.wait_subscribed()
+    received = []
+    for topic in range(args.topics):
+        await remote.connect(f"topic_{topic}", TimingWebSocket(received))
+
+    sent, elapsed = await publish_all(publisher, args)
+    deadline = time.perf_counter() + 10
+    while len(received) < args.messages and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    print(f"with broker: {elapsed / args.messages * 1e6:8.2f} us/message")
+    print(
+        f"delivered {len(received)}/{args.messages} in "
+        f"{publisher.broker.stats['batches']} batches"
+    )
+    if len(received) == args.messages:
+        latencies = sorted(r - s for r, s in zip(received, sent))
+        print(
+            f"latency p50 {statistics.median(latencies) * 1000:.2f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms"
+        )
+    for manager in (publisher, remote):
+        await manager.broker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--fake", action="store_true")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--burst", type=int, default=50)
+    parser.add_argument("--flush-ms", type=float, default=2)
+    parser.add_argument("--max-batch", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+import hashlib
+import logging
+import time
+import typing as t
+
+from redis.exceptions import RedisError
+
+from cache.cache import cache
+from config import Config, Network
+from db.schemas import users as schemas
+
+CFG = Config[Network]
+
+logger = logging.getLogger("paideia")
+
+
+# verified principals keyed by a digest of the bearer token, so a request with
+# a known token skips the user lookup. entries never outlive
+# the token and are dropped on logout and on any change to the user. redis
+# failures fall through to the database.
+
+
+def principal_cache_key(token: str):
+    return f"auth_principal_{hashlib.sha256(token.encode('utf-8')).hexdigest()}"
+
+
+async def get_cached_principal(token: str) -> t.Optional[schemas.User]:
+    try:
+        principal = await cache.aget(principal_cache_key(token))
+    except RedisError as e:
+        logger.warning(f"principal cache read failed: {str(e)}")
+        return None
+    if principal is None:
+        return None
+    return schemas.User(**principal)
+
+
+async def cache_principal(token: str, user: schemas.User, exp: int):
+    timeout = min(int(exp - time.time()), CFG.auth_cache_ttl)
+    if timeout <= 0:
+        return
+    try:
+        await cache.aset_tagged(
+            principal_cache_key(token),
+            user.dict(),
+            [f"auth_user_{user.id}"],
+            timeout,
+        )
+    except RedisError as e:
+        logger.warning(f"principal cache write failed: {str(e)}")
+
+
+async def invalidate_principal(token: str):
+    try:
+        await cache.ainvalidate(principal_cache_key(token))
+    except RedisError as e:
+        logger.warning(f"principal cache invalidation failed: {str(e)}")
+
+
+def invalidate_user_principals(user_id: int):
+    # called by routes after a user write commits
+    try:
+        return cache.invalidate_tags([f"auth_user_{user_id}"])
+    except RedisError as e:
+        logger.warning(f"principal cache invalidation failed: {str(e)}")
+        return 0
+
+
+async def ainvalidate_user_principals(user_id: int):
+    try:
+        return await cache.ainvalidate_tags([f"auth_user_{user_id}"])
+    except RedisError as e:
+        logger.warning(f"principal cache invalidation failed: {str(e)}")
+        return 0
@@ -1,27 +1,540 @@
-from cache.redis_client import redisClient
+from cache.codec import CacheCodec, UnknownCodec
+from cache.redis_client import asyncRedisClient, redisClient
+from config import Config, Network
 
 import json
+import logging
+import math
+import random
+import threading
+import time
+import typing as t
+import uuid
+from collections import OrderedDict
+
+from redis.exceptions import WatchError
+
+CFG = Config[Network]
+
+logger = logging.getLogger("paideia")
+
+INVALIDATION_CHANNEL = "cache_invalidation"
+
+_MISSING = object()
+
+
+def _local_ttl(pttl: int):
+    # a redis pttl in seconds for the local cache, rounded up so sub second
+    # entries are still kept, keys without an expiry get the default ttl
+    if pttl < 0:
+        return -1
+    return max(-(-pttl // 1000), 1)
+
+
+class LocalCache:
+    """Bounded in-process LRU cache with a ttl per entry"""
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024, ttl: int = 60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+        # bumped by every invalidation, see set. the generation each key was
+        # last invalidated at is kept for the most recent keys only, older
+        # ones are assumed to be invalidated at `_forgotten`
+        self.generation = 0
+        self._invalidated = OrderedDict()
+        self._forgotten = 0
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] < time.monotonic():
+                self._pop(key)
+                return default
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, value, size: int, ttl: int = -1, generation: int = None):
+        # a value read from redis passes the generation from before the read,
+        # it is dropped if an invalidation arrived in between
+        if ttl == -1 or ttl > self.ttl:
+            ttl = self.ttl
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if (
+                generation is not None
+                and self._invalidated.get(key, self._forgotten) > generation
+            ):
+                return
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, *keys: str):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._pop(key)
+                self._invalidated[key] = self.generation
+                self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_entries:
+                self._forgotten = self._invalidated.popitem(last=False)[1]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._invalidated.clear()
+            self._forgotten = self.generation
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+
+class CacheStats:
+    """Hits per cache tier for this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def record(self, tier: str):
+        with self._lock:
+            setattr(self, tier, getattr(self, tier) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            total = self.local_hits + self.redis_hits + self.misses
+            return {
+                "local_hits": self.local_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "local_hit_ratio": self.local_hits / total if total else 0.0,
+                "redis_hit_ratio": self.redis_hits / total if total else 0.0,
+            }
+
+
+class _Flight:
+    """A computation other threads in this worker are waiting on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _is_entry(value):
+    return isinstance(value, dict) and value.keys() == {"value", "expires", "delta"}
 
 
 class RedisCache:
-    def __init__(self, timeout: int = 900):
-        self.client = redisClient
+    """
+    Json values in redis with an optional in-process first tier.
+
+    The `a*` methods are the asyncio variants for `async def` routes, the
+    plain methods are for sync handlers running in the threadpool.
+    """
+
+    def __init__(
+        self,
+        timeout: int = 900,
+        local: LocalCache = None,
+        client=None,
+        aclient=None,
+        codec: CacheCodec = None,
+    ):
+        self.client = client or redisClient
+        self.aclient = aclient or asyncRedisClient
+        self.codec = codec or CacheCodec()
         # default 15 mins
         self.timeout = timeout
+        # optional first tier, kept coherent across workers through pub/sub
+        self.local = local
+        self.stats = CacheStats()
+        self.origin = uuid.uuid4().hex
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        self._subscribed = threading.Event()
+        self._flights = {}
+        self._flights_lock = threading.Lock()
 
     def get(self, key: str):
-        val = self.client.get(key)
-        if val:
-            return json.loads(val)
+        return self.mget([key])[0]
 
     def set(self, key: str, value, timeout: int = -1):
+        self.mset({key: value}, timeout)
+
+    def invalidate(self, key):
+        ret = self.client.delete(key)
+        self._invalidate_local([key])
+        return ret
+
+    def mget(self, keys: t.List[str]):
+        values, missing, generation = self._get_local(keys)
+        if len(missing) > 0:
+            pipe = self.client.pipeline()
+            self._queue_get(pipe, missing)
+            self._store_fetched(values, missing, pipe.execute(), generation)
+        return [values[key] for key in keys]
+
+    def mset(self, values: dict, timeout: int = -1):
+        if len(values) == 0:
+            return
+        pipe = self.client.pipeline()
+        dumped = self._queue_set(pipe, values, timeout)
+        pipe.execute()
+        message = self._set_local(values, dumped, timeout)
+        if message:
+            self.client.publish(INVALIDATION_CHANNEL, message)
+
+    async def aget(self, key: str):
+        return (await self.amget([key]))[0]
+
+    async def aset(self, key: str, value, timeout: int = -1):
+        await self.amset({key: value}, timeout)
+
+    async def ainvalidate(self, key):
+        ret = await self.aclient.delete(key)
+        message = self._drop_local([key])
+        if message:
+            await self.aclient.publish(INVALIDATION_CHANNEL, message)
+        return ret
+
+    async def amget(self, keys: t.List[str]):
+        values, missing, generation = self._get_local(keys)
+        if len(missing) > 0:
+            pipe = self.aclient.pipeline()
+            self._queue_get(pipe, missing)
+            self._store_fetched(values, missing, await pipe.execute(), generation)
+        return [values[key] for key in keys]
+
+    async def amset(self, values: dict, timeout: int = -1):
+        if len(values) == 0:
+            return
+        pipe = self.aclient.pipeline()
+        dumped = self._queue_set(pipe, values, timeout)
+        await pipe.execute()
+        message = self._set_local(values, dumped, timeout)
+        if message:
+            await self.aclient.publish(INVALIDATION_CHANNEL, message)
+
+    def set_tagged(self, key: str, value, tags, timeout: int = -1):
+        pipe = self.client.pipeline()
+        dumped = self._queue_set_tagged(pipe, key, value, tags, timeout)
+        pipe.execute()
+        message = self._set_local({key: value}, dumped, timeout)
+        if message:
+            self.client.publish(INVALIDATION_CHANNEL, message)
+
+    def invalidate_tags(self, tags):
+        tag_keys = list(map(lambda x: f"cache_tag_{x}", tags))
+        if len(tag_keys) == 0:
+            return 0
+        pipe = self.client.pipeline()
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        keys = set().union(*pipe.execute())
+        ret = self.client.delete(*keys, *tag_keys)
+        self._invalidate_local(list(map(lambda x: x.decode("utf-8"), keys)))
+        return ret
+
+    async def aset_tagged(self, key: str, value, tags, timeout: int = -1):
+        pipe = self.aclient.pipeline()
+        dumped = self._queue_set_tagged(pipe, key, value, tags, timeout)
+        await pipe.execute()
+        message = self._set_local({key: value}, dumped, timeout)
+        if message:
+            await self.aclient.publish(INVALIDATION_CHANNEL, message)
+
+    async def ainvalidate_tags(self, tags):
+        tag_keys = list(map(lambda x: f"cache_tag_{x}", tags))
+        if len(tag_keys) == 0:
+            return 0
+        pipe = self.aclient.pipeline()
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        keys = set().union(*(await pipe.execute()))
+        ret = await self.aclient.delete(*keys, *tag_keys)
+        message = self._drop_local(list(map(lambda x: x.decode("utf-8"), keys)))
+        if message:
+            await self.aclient.publish(INVALIDATION_CHANNEL, message)
+        return ret
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: t.Callable[[], t.Any],
+        timeout: int = -1,
+        stale_ttl: int = 60,
+        tags: t.Callable[[t.Any], t.List[str]] = None,
+        lock_timeout: int = 30,
+        beta: float = 1.0,
+    ):
+        """
+        Cached value of `key`, running `compute` at most once per expiry
+        across all workers.
+
+        Entries record their logical expiry and how long `compute` took, they
+        are refreshed early with a probability that grows towards the expiry
+        and stay in redis `stale_ttl` seconds past it. The caller holding the
+        redis lock recomputes while everyone else is served the stale value,
+        recomputing in the background is not an option because `compute`
+        usually closes over the request's db session. A missing key is
+        computed once per worker, the other threads wait on that result.
+        """
         if timeout == -1:
             timeout = self.timeout
-        value = json.dumps(value)
-        self.client.setex(key, timeout, value)
+        entry = self.get(key)
+        if not _is_entry(entry):
+            return self._coalesce(
+                key,
+                lambda: self._compute_missing(
+                    key, compute, timeout, stale_ttl, tags, lock_timeout
+                ),
+            )
+        # -log(random) is an exponential sample, slow computes refresh earlier
+        early = -entry["delta"] * beta * math.log(random.random() or 1e-12)
+        if time.time() + early < entry["expires"]:
+            return entry["value"]
+        token = self._acquire_lock(key, lock_timeout)
+        if token is None:
+            # another caller is already revalidating
+            return entry["value"]
+        try:
+            return self._store_computed(key, compute, timeout, stale_ttl, tags)
+        finally:
+            self._release_lock(key, token)
 
-    def invalidate(self, key):
-        return self.client.delete(key)
+    def _coalesce(self, key: str, fn: t.Callable[[], t.Any]):
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fn()
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _compute_missing(self, key, compute, timeout, stale_ttl, tags, lock_timeout):
+        token = self._acquire_lock(key, lock_timeout)
+        if token is None:
+            # another worker is computing, wait for its value
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = self.get(key)
+                if _is_entry(entry):
+                    return entry["value"]
+                if not self.client.exists(f"cache_lock_{key}"):
+                    break
+            # the holder gave up or crashed
+            token = self._acquire_lock(key, lock_timeout)
+        try:
+            return self._store_computed(key, compute, timeout, stale_ttl, tags)
+        finally:
+            if token is not None:
+                self._release_lock(key, token)
+
+    def _store_computed(self, key, compute, timeout, stale_ttl, tags):
+        start = time.monotonic()
+        value = compute()
+        entry = {
+            "value": value,
+            "expires": time.time() + timeout,
+            "delta": time.monotonic() - start,
+        }
+        if tags is not None:
+            self.set_tagged(key, entry, tags(value), timeout + stale_ttl)
+        else:
+            self.set(key, entry, timeout + stale_ttl)
+        return value
+
+    def _acquire_lock(self, key: str, lock_timeout: int):
+        token = uuid.uuid4().hex
+        if self.client.set(f"cache_lock_{key}", token, nx=True, px=lock_timeout * 1000):
+            return token
+        return None
+
+    def _release_lock(self, key: str, token: str):
+        # only delete the lock if it is still ours, it may have timed out
+        lock_key = f"cache_lock_{key}"
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(lock_key)
+                if pipe.get(lock_key) == token.encode("utf-8"):
+                    pipe.multi()
+                    pipe.delete(lock_key)
+                    pipe.execute()
+                else:
+                    pipe.unwatch()
+            except WatchError:
+                pass
+
+    def _get_local(self, keys: t.List[str]):
+        # returns the values served by the local tier, the keys left over and
+        # the local generation to fill them in with. the local tier holds the
+        # encoded values so every hit decodes a copy the caller may mutate
+        values = {}
+        missing = []
+        generation = None
+        if self.local is not None:
+            self._ensure_listener()
+            generation = self.local.generation
+        for key in keys:
+            val = _MISSING
+            if self.local is not None:
+                val = self.local.get(key, _MISSING)
+            if val is _MISSING:
+                missing.append(key)
+            else:
+                self.stats.record("local_hits")
+                values[key] = self.codec.decode(val)
+        return values, missing, generation
+
+    def _queue_get(self, pipe, keys: t.List[str]):
+        for key in keys:
+            pipe.get(key)
+            # the remaining ttl comes back in the same round trip so the
+            # local copy never outlives the redis one
+            if self.local is not None:
+                pipe.pttl(key)
+
+    def _store_fetched(
+        self, values: dict, keys: t.List[str], results: list, generation: int = None
+    ):
+        step = 1 if self.local is None else 2
+        for key, i in zip(keys, range(0, len(results), step)):
+            val = results[i]
+            if not val:
+                self.stats.record("misses")
+                values[key] = None
+                continue
+            try:
+                value = self.codec.decode(val)
+            except UnknownCodec as e:
+                # written by a newer worker during a codec roll out
+                logger.warning(f"cache {key}: {str(e)}")
+                self.stats.record("misses")
+                values[key] = None
+                continue
+            if self.local is not None:
+                self.local.set(
+                    key, val, len(val), _local_ttl(results[i + 1]), generation
+                )
+            self.stats.record("redis_hits")
+            values[key] = value
+
+    def _queue_set(self, pipe, values: dict, timeout: int):
+        if timeout == -1:
+            timeout = self.timeout
+        dumped = {key: self.codec.encode(value) for key, value in values.items()}
+        for key, val in dumped.items():
+            pipe.setex(key, timeout, val)
+        return dumped
+
+    def _queue_set_tagged(self, pipe, key: str, value, tags, timeout: int):
+        # tags are redis sets of the keys stored under them, a tag lives as
+        # long as the newest key that was added to it
+        if timeout == -1:
+            timeout = self.timeout
+        dumped = self._queue_set(pipe, {key: value}, timeout)
+        for tag in tags:
+            pipe.sadd(f"cache_tag_{tag}", key)
+            pipe.expire(f"cache_tag_{tag}", timeout)
+        return dumped
+
+    def _set_local(self, values: dict, dumped: dict, timeout: int):
+        # returns the invalidation message to publish, other workers may hold
+        # the previous values
+        if self.local is None:
+            return None
+        if timeout == -1:
+            timeout = self.timeout
+        self._ensure_listener()
+        message = self._drop_local(list(values.keys()))
+        for key, val in dumped.items():
+            self.local.set(key, val, len(val), timeout)
+        return message
+
+    def _drop_local(self, keys: t.List[str]):
+        if self.local is None or len(keys) == 0:
+            return None
+        self.local.invalidate(*keys)
+        return json.dumps({"origin": self.origin, "keys": keys})
+
+    def _invalidate_local(self, keys: t.List[str]):
+        message = self._drop_local(keys)
+        if message:
+            self.client.publish(INVALIDATION_CHANNEL, message)
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(
+                target=self._listen, name="cache-invalidation", daemon=True
+            )
+            self._listener.start()
+        # fills that start before the subscription would be thrown away by it
+        self._subscribed.wait(1)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # anything published while we were not subscribed is lost
+                self.local.clear()
+                self._subscribed.set()
+                for message in pubsub.listen():
+                    data = json.loads(message["data"])
+                    if data["origin"] != self.origin:
+                        self.local.invalidate(*data["keys"])
+            except Exception as e:
+                logger.warning(f"cache invalidation listener: {str(e)}")
+                self.local.clear()
+                time.sleep(1)
 
 
-cache = RedisCache()
+cache = RedisCache(
+    local=LocalCache(
+        max_entries=CFG.cache_local_max_entries,
+        max_bytes=CFG.cache_local_max_bytes,
+        ttl=CFG.cache_local_ttl,
+    ),
+    codec=CacheCodec(
+        codec=CFG.cache_codec,
+        compression=CFG.cache_compression,
+        compress_min_bytes=CFG.cache_compress_min_bytes,
+    ),
+)
@@ -0,0 +1,127 @@
+import datetime
+import decimal
+import json
+import logging
+import uuid
+import zlib
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("paideia")
+
+
+# stored values are <codec version byte><compression byte><payload>. values
+# written before the codec layer are plain json and never start with a byte
+# below 0x20, so they are still readable. versions are never reused, a new
+# format gets a new byte and the old codec stays registered until its values
+# have expired.
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"cannot serialize {type(obj).__name__}")
+
+
+class JsonCodec:
+    name = "json"
+    version = 1
+
+    def dumps(self, value) -> bytes:
+        return json.dumps(value, default=_default, separators=(",", ":")).encode(
+            "utf-8"
+        )
+
+    def loads(self, data: bytes):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+    version = 2
+
+    def dumps(self, value) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: bytes):
+        return orjson.loads(data)
+
+
+CODECS = {JsonCodec.version: JsonCodec()}
+if orjson is not None:
+    CODECS[OrjsonCodec.version] = OrjsonCodec()
+
+# compression id -> (name, compress, decompress)
+COMPRESSORS = {1: ("zlib", lambda x: zlib.compress(x, 1), zlib.decompress)}
+if zstandard is not None:
+    COMPRESSORS[2] = (
+        "zstd",
+        zstandard.ZstdCompressor(level=3).compress,
+        zstandard.ZstdDecompressor().decompress,
+    )
+
+
+class UnknownCodec(Exception):
+    pass
+
+
+class CacheCodec:
+    """Encodes cache values with a version header, see the note above"""
+
+    def __init__(
+        self,
+        codec: str = "orjson",
+        compression: str = "zlib",
+        compress_min_bytes: int = 4096,
+    ):
+        codecs = {c.name: c for c in CODECS.values()}
+        if codec not in codecs:
+            logger.warning(f"cache codec {codec} is not available, using json")
+            codec = "json"
+        self.codec = codecs[codec]
+        self.compression = None
+        for compression_id, (name, _, _) in COMPRESSORS.items():
+            if name == compression:
+                self.compression = compression_id
+        if compression and self.compression is None:
+            logger.warning(f"cache compression {compression} is not available")
+        self.compress_min_bytes = compress_min_bytes
+
+    def encode(self, value) -> bytes:
+        payload = self.codec.dumps(value)
+        compression = 0
+        if self.compression is not None and len(payload) >= self.compress_min_bytes:
+            compressed = COMPRESSORS[self.compression][1](payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                compression = self.compression
+        return bytes((self.codec.version, compression)) + payload
+
+    def decode(self, data: bytes):
+        if data[0] >= 0x20:
+            # written before the codec layer
+            return json.loads(data)
+        if data[0] not in CODECS or (data[1] and data[1] not in COMPRESSORS):
+            raise UnknownCodec(f"unknown cache codec {data[0]}/{data[1]}")
+        payload = data[2:]
+        if data[1]:
+            payload = COMPRESSORS[data[1]][2](payload)
+        return CODECS[data[0]].loads(payload)
@@ -0,0 +1,141 @@
+import logging
+import typing as t
+
+from redis.exceptions import RedisError, WatchError
+
+from cache.cache import cache
+from config import Config, Network
+
+CFG = Config[Network]
+
+logger = logging.getLogger("paideia")
+
+
+# unread notification counts per user for the badge. writes adjust the
+# counter after they commit, a missing counter is rebuilt from the partial
+# index on unread rows (see db/crud/notifications.py) and the ttl bounds how
+# long a counter that drifted can stay wrong. redis failures fall through to
+# the database.
+
+
+def unread_counter_key(user_details_id: int):
+    return f"notification_unread_{user_details_id}"
+
+
+def unread_adjusted_key(user_details_id: int):
+    # touched by adjustments that find no counter, so a rebuild counting at
+    # the same time notices them without the counter itself being created
+    return f"notification_unread_adjusted_{user_details_id}"
+
+
+def get_unread_counter(user_details_id: int) -> t.Optional[int]:
+    try:
+        value = cache.client.get(unread_counter_key(user_details_id))
+    except RedisError as e:
+        logger.warning(f"unread counter read failed: {str(e)}")
+        return None
+    return None if value is None else int(value)
+
+
+def rebuild_unread_counter(user_details_id: int, count: t.Callable[[], int]) -> int:
+    # reads the counter, or counts with `count` and stores the result. the
+    # keys are watched from before the count, so an adjustment that lands
+    # while counting aborts the write instead of being lost until the ttl
+    key = unread_counter_key(user_details_id)
+    unread = None
+    try:
+        with cache.client.pipeline() as pipe:
+            pipe.watch(key, unread_adjusted_key(user_details_id))
+            value = pipe.get(key)
+            if value is not None:
+                return int(value)
+            unread = count()
+            pipe.multi()
+            pipe.set(key, unread, ex=CFG.unread_counter_ttl, nx=True)
+            pipe.execute()
+    except WatchError:
+        # counted anyway, the next read rebuilds the counter
+        pass
+    except RedisError as e:
+        logger.warning(f"unread counter rebuild failed: {str(e)}")
+    return count() if unread is None else unread
+
+
+# attempts at an adjustment that keeps losing its watch to other writers
+# before the counter is dropped for the next read to rebuild
+ADJUST_ATTEMPTS = 3
+# outlives any count a rebuild runs
+ADJUSTED_TTL = 60
+
+
+def adjust_unread_counter(user_details_id: int, delta: int):
+    # increments an existing counter only, a missing one is never created
+    # (it would have no ttl and start from the wrong count)
+    if delta == 0:
+        return
+    key = unread_counter_key(user_details_id)
+    adjusted = unread_adjusted_key(user_details_id)
+    try:
+        with cache.client.pipeline() as pipe:
+            for _ in range(ADJUST_ATTEMPTS):
+                try:
+                    pipe.watch(key)
+                    value = pipe.get(key)
+                    if value is None:
+                        pipe.multi()
+                        pipe.set(adjusted, 1, ex=ADJUSTED_TTL)
+                        pipe.execute()
+                        return
+                    if int(value) + delta < 0:
+                        # drifted, let the next read rebuild it
+                        break
+                    pipe.multi()
+                    pipe.incrby(key, delta)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+        cache.client.delete(key)
+    except RedisError as e:
+        logger.warning(f"unread counter update failed: {str(e)}")
+
+
+async def aadjust_unread_counter(user_details_id: int, delta: int):
+    # for the event loop, same as adjust_unread_counter
+    if delta == 0:
+        return
+    key = unread_counter_key(user_details_id)
+    adjusted = unread_adjusted_key(user_details_id)
+    try:
+        async with cache.aclient.pipeline() as pipe:
+            for _ in range(ADJUST_ATTEMPTS):
+                try:
+                    await pipe.watch(key)
+                    value = await pipe.get(key)
+                    if value is None:
+                        pipe.multi()
+                        pipe.set(adjusted, 1, ex=ADJUSTED_TTL)
+                        await pipe.execute()
+                        return
+                    if int(value) + delta < 0:
+                        break
+                    pipe.multi()
+                    pipe.incrby(key, delta)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+        await cache.aclient.delete(key)
+    except RedisError as e:
+        logger.warning(f"unread counter update failed: {str(e)}")
+
+
+async def acount_new_unread(notifications: t.List) -> None:
+    # adjusts the counters once per user for notifications created unread
+    unread = {}
+    for notification in notifications:
+        if not notification.is_read:
+            user_details_id = notification.user_details_id
+            unread[user_details_id] = unread.get(user_details_id, 0) + 1
+    for user_details_id, count in unread.items():
+        await aadjust_unread_counter(user_details_id, count)
@@ -1,9 +1,20 @@
 import redis
+import redis.asyncio as aioredis
 from config import Config, Network
 
 CFG = Config[Network]
 
-redisClient = redis.Redis(
-    host=CFG.redis_host,
-    port=CFG.redis_port,
-)
+POOL_OPTIONS = {
+    "host": CFG.redis_host,
+    "port": CFG.redis_port,
+    "max_connections": CFG.redis_max_connections,
+    "socket_timeout": CFG.redis_socket_timeout,
+    "socket_connect_timeout": CFG.redis_socket_timeout,
+}
+
+redisPool = redis.ConnectionPool(**POOL_OPTIONS)
+redisClient = redis.Redis(connection_pool=redisPool)
+
+# used by async def routes, never call the sync client from the event loop
+asyncRedisPool = aioredis.ConnectionPool(**POOL_OPTIONS)
+asyncRedisClient = aioredis.Redis(connection_pool=asyncRedisPool)
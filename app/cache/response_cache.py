@@ -0,0 +1,135 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import typing as t
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+from redis.exceptions import RedisError
+from starlette.responses import JSONResponse, Response
+
+from cache.cache import cache
+
+logger = logging.getLogger("paideia")
+
+
+class ResponseCacheStats:
+    """Per route hit and miss counts for this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, name: str, hit: bool):
+        with self._lock:
+            route = self.routes.setdefault(name, {"hits": 0, "misses": 0})
+            route["hits" if hit else "misses"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            routes = {
+                name: dict(
+                    route,
+                    hit_ratio=route["hits"] / (route["hits"] + route["misses"]),
+                )
+                for name, route in self.routes.items()
+            }
+        return {"pid": os.getpid(), "routes": routes}
+
+
+response_cache_stats = ResponseCacheStats()
+
+
+def response_cache_key(name: str, params: dict):
+    digest = hashlib.md5(
+        json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"response_cache_{name}_{digest}"
+
+
+class _Uncacheable(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def cached_response(
+    name: str,
+    model,
+    tags: t.Union[t.List[str], t.Callable[[dict, t.Any], t.List[str]]],
+    timeout: int = 300,
+    stale_ttl: int = 60,
+):
+    """
+    Read-through redis cache for a GET route returning `model`.
+
+    The route's path and query params form the key, `tags` is either a static
+    list or a callable of (params, serialized content) returning the tags to
+    store the response under. Expired responses are served for up to
+    `stale_ttl` seconds while one request recomputes them, see
+    `RedisCache.get_or_compute`. Error responses are never cached and redis
+    failures fall through to the route.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            params = {key: value for key, value in kwargs.items() if key != "db"}
+            key = response_cache_key(name, params)
+            computed = []
+
+            def compute():
+                ret = fn(*args, **kwargs)
+                if ret is None or isinstance(ret, Response):
+                    raise _Uncacheable(ret)
+                content = jsonable_encoder(parse_obj_as(model, ret), exclude_none=True)
+                computed.append(content)
+                return content
+
+            try:
+                content = cache.get_or_compute(
+                    key,
+                    compute,
+                    timeout,
+                    stale_ttl,
+                    lambda content: tags(params, content) if callable(tags) else tags,
+                )
+            except _Uncacheable as e:
+                response_cache_stats.record(name, False)
+                return e.response
+            except RedisError as e:
+                logger.warning(f"response cache failed: {str(e)}")
+                if len(computed) == 0:
+                    try:
+                        compute()
+                    except _Uncacheable as e:
+                        response_cache_stats.record(name, False)
+                        return e.response
+                content = computed[0]
+            response_cache_stats.record(name, len(computed) == 0)
+            return JSONResponse(content=content)
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_response_cache(*tags: str):
+    # called by crud writes after commit, a redis outage must not fail the
+    # write so stale entries are left to expire
+    try:
+        return cache.invalidate_tags(tags)
+    except RedisError as e:
+        logger.warning(f"response cache invalidation failed: {str(e)}")
+        return 0
+
+
+async def ainvalidate_response_cache(*tags: str):
+    # for async routes, a sync redis call would block the event loop
+    try:
+        return await cache.ainvalidate_tags(tags)
+    except RedisError as e:
+        logger.warning(f"response cache invalidation failed: {str(e)}")
+        return 0
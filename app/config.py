@@ -44,16 +44,104 @@ Config = {
             "DEBUG": True,
             "node": os.getenv("ERGONODE_HOST"),
             "connection_string": f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DBNM')}",
+            "async_connection_string": f"postgresql+asyncpg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DBNM')}",
+            # connection pool, sized per uvicorn worker and per engine
+            "db_pool_size": int(os.getenv("DB_POOL_SIZE", default=5)),
+            "db_max_overflow": int(os.getenv("DB_MAX_OVERFLOW", default=10)),
+            "db_pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", default=30)),
+            "db_pool_recycle": int(os.getenv("DB_POOL_RECYCLE", default=1800)),
+            "db_pool_pre_ping": os.getenv("DB_POOL_PRE_PING", default="true").lower()
+            == "true",
+            "db_statement_timeout": int(os.getenv("DB_STATEMENT_TIMEOUT", default=30000)),
             "redis_host": os.getenv("REDIS_HOST"),
             "redis_port": os.getenv("REDIS_PORT"),
+            # connection pools, one sync and one asyncio per uvicorn worker
+            "redis_max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", default=50)),
+            "redis_socket_timeout": float(os.getenv("REDIS_SOCKET_TIMEOUT", default=5)),
+            # websocket messages relayed between workers, see websocket/broker.py
+            "ws_broker_flush_ms": float(os.getenv("WS_BROKER_FLUSH_MS", default=2)),
+            "ws_broker_max_batch": int(os.getenv("WS_BROKER_MAX_BATCH", default=500)),
+            # per socket send queue, a full queue applies the slow consumer
+            # policy: drop_oldest or disconnect
+            "ws_send_queue_size": int(os.getenv("WS_SEND_QUEUE_SIZE", default=64)),
+            "ws_slow_consumer_policy": os.getenv(
+                "WS_SLOW_CONSUMER_POLICY", default="drop_oldest"
+            ),
+            "ws_send_timeout": float(os.getenv("WS_SEND_TIMEOUT", default=10)),
+            # unread notification badge counters, see cache/notification_counters.py
+            "unread_counter_ttl": int(os.getenv("UNREAD_COUNTER_TTL", default=600)),
+            # monthly partitions and retention, see db/partitions.py
+            "notification_retention_months": int(
+                os.getenv("NOTIFICATION_RETENTION_MONTHS", default=1)
+            ),
+            "activity_retention_months": int(
+                os.getenv("ACTIVITY_RETENTION_MONTHS", default=12)
+            ),
+            "partition_months_ahead": int(
+                os.getenv("PARTITION_MONTHS_AHEAD", default=3)
+            ),
+            "partition_maintenance_interval": int(
+                os.getenv("PARTITION_MAINTENANCE_INTERVAL", default=6 * 60 * 60)
+            ),
+            # outbox relay, see outbox/relay.py
+            "outbox_batch_size": int(os.getenv("OUTBOX_BATCH_SIZE", default=200)),
+            "outbox_max_attempts": int(os.getenv("OUTBOX_MAX_ATTEMPTS", default=5)),
+            "outbox_poll_interval": float(
+                os.getenv("OUTBOX_POLL_INTERVAL", default=0.5)
+            ),
+            "outbox_relay_in_process": os.getenv(
+                "OUTBOX_RELAY_IN_PROCESS", default="true"
+            ).lower()
+            == "true",
+            # relay transactions carrying the activity log, see outbox/relay.py
+            "activity_synchronous_commit": os.getenv(
+                "ACTIVITY_SYNCHRONOUS_COMMIT", default="true"
+            ).lower()
+            == "true",
+            # recent notification pushes kept for reconnecting sockets
+            "notification_replay_size": int(
+                os.getenv("NOTIFICATION_REPLAY_SIZE", default=50)
+            ),
+            "notification_replay_ttl": int(
+                os.getenv("NOTIFICATION_REPLAY_TTL", default=3600)
+            ),
+            # like/follow notifications per proposal merged into one row
+            "notification_coalesce_window": int(
+                os.getenv("NOTIFICATION_COALESCE_WINDOW", default=3600)
+            ),
+            "notification_sample_actors": int(
+                os.getenv("NOTIFICATION_SAMPLE_ACTORS", default=3)
+            ),
+            # per worker in-process cache in front of redis
+            "cache_local_max_entries": int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", default=2048)),
+            "cache_local_max_bytes": int(os.getenv("CACHE_LOCAL_MAX_BYTES", default=32 * 1024 * 1024)),
+            "cache_local_ttl": int(os.getenv("CACHE_LOCAL_TTL", default=60)),
+            # value encoding, see cache/codec.py
+            "cache_codec": os.getenv("CACHE_CODEC", default="orjson"),
+            "cache_compression": os.getenv("CACHE_COMPRESSION", default="zlib"),
+            "cache_compress_min_bytes": int(os.getenv("CACHE_COMPRESS_MIN_BYTES", default=4096)),
             "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
             "aws_secret_acces_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
             "aws_region": os.getenv("AWS_REGION"),
             "s3_bucket": os.getenv("S3_BUCKET"),
             "s3_key": os.getenv("S3_KEY"),
             "jwt_secret": os.getenv("JWT_SECRET_KEY"),
+            "password_hash_workers": int(os.getenv("PASSWORD_HASH_WORKERS", default=2)),
+            # upper bound on how long a verified token is cached, see cache/auth_cache.py
+            "auth_cache_ttl": int(os.getenv("AUTH_CACHE_TTL", default=900)),
+            # revoked token ids, see core/revocation.py
+            "jwt_revocation_capacity": int(os.getenv("JWT_REVOCATION_CAPACITY", default=100000)),
+            "jwt_revocation_error_rate": float(os.getenv("JWT_REVOCATION_ERROR_RATE", default=0.01)),
+            "jwt_revocation_prune_interval": int(os.getenv("JWT_REVOCATION_PRUNE_INTERVAL", default=300)),
             "ergoauth_seed": os.getenv("ERGOAUTH_SEED"),
+            # shared signature verification service, see verifier/server.py
+            "ergo_verifier_socket": os.getenv("ERGO_VERIFIER_SOCKET"),
+            "ergo_verifier_timeout": float(os.getenv("ERGO_VERIFIER_TIMEOUT", default=10)),
             "danaides_api": os.getenv("DANAIDES_API"),
+            # lazily created clients to build at startup instead, see core/lazy.py
+            "warm_up_clients": list(
+                filter(None, os.getenv("WARM_UP_CLIENTS", default="").split(","))
+            ),
         }
     ),
     "mainnet": dotdict(
@@ -61,16 +149,104 @@ Config = {
             "DEBUG": False,
             "node": os.getenv("ERGONODE_HOST"),
             "connection_string": f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DBNM')}",
+            "async_connection_string": f"postgresql+asyncpg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DBNM')}",
+            # connection pool, sized per uvicorn worker and per engine
+            "db_pool_size": int(os.getenv("DB_POOL_SIZE", default=5)),
+            "db_max_overflow": int(os.getenv("DB_MAX_OVERFLOW", default=10)),
+            "db_pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", default=30)),
+            "db_pool_recycle": int(os.getenv("DB_POOL_RECYCLE", default=1800)),
+            "db_pool_pre_ping": os.getenv("DB_POOL_PRE_PING", default="true").lower()
+            == "true",
+            "db_statement_timeout": int(os.getenv("DB_STATEMENT_TIMEOUT", default=30000)),
             "redis_host": os.getenv("REDIS_HOST"),
             "redis_port": os.getenv("REDIS_PORT"),
+            # connection pools, one sync and one asyncio per uvicorn worker
+            "redis_max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", default=50)),
+            "redis_socket_timeout": float(os.getenv("REDIS_SOCKET_TIMEOUT", default=5)),
+            # websocket messages relayed between workers, see websocket/broker.py
+            "ws_broker_flush_ms": float(os.getenv("WS_BROKER_FLUSH_MS", default=2)),
+            "ws_broker_max_batch": int(os.getenv("WS_BROKER_MAX_BATCH", default=500)),
+            # per socket send queue, a full queue applies the slow consumer
+            # policy: drop_oldest or disconnect
+            "ws_send_queue_size": int(os.getenv("WS_SEND_QUEUE_SIZE", default=64)),
+            "ws_slow_consumer_policy": os.getenv(
+                "WS_SLOW_CONSUMER_POLICY", default="drop_oldest"
+            ),
+            "ws_send_timeout": float(os.getenv("WS_SEND_TIMEOUT", default=10)),
+            # unread notification badge counters, see cache/notification_counters.py
+            "unread_counter_ttl": int(os.getenv("UNREAD_COUNTER_TTL", default=600)),
+            # monthly partitions and retention, see db/partitions.py
+            "notification_retention_months": int(
+                os.getenv("NOTIFICATION_RETENTION_MONTHS", default=1)
+            ),
+            "activity_retention_months": int(
+                os.getenv("ACTIVITY_RETENTION_MONTHS", default=12)
+            ),
+            "partition_months_ahead": int(
+                os.getenv("PARTITION_MONTHS_AHEAD", default=3)
+            ),
+            "partition_maintenance_interval": int(
+                os.getenv("PARTITION_MAINTENANCE_INTERVAL", default=6 * 60 * 60)
+            ),
+            # outbox relay, see outbox/relay.py
+            "outbox_batch_size": int(os.getenv("OUTBOX_BATCH_SIZE", default=200)),
+            "outbox_max_attempts": int(os.getenv("OUTBOX_MAX_ATTEMPTS", default=5)),
+            "outbox_poll_interval": float(
+                os.getenv("OUTBOX_POLL_INTERVAL", default=0.5)
+            ),
+            "outbox_relay_in_process": os.getenv(
+                "OUTBOX_RELAY_IN_PROCESS", default="true"
+            ).lower()
+            == "true",
+            # relay transactions carrying the activity log, see outbox/relay.py
+            "activity_synchronous_commit": os.getenv(
+                "ACTIVITY_SYNCHRONOUS_COMMIT", default="true"
+            ).lower()
+            == "true",
+            # recent notification pushes kept for reconnecting sockets
+            "notification_replay_size": int(
+                os.getenv("NOTIFICATION_REPLAY_SIZE", default=50)
+            ),
+            "notification_replay_ttl": int(
+                os.getenv("NOTIFICATION_REPLAY_TTL", default=3600)
+            ),
+            # like/follow notifications per proposal merged into one row
+            "notification_coalesce_window": int(
+                os.getenv("NOTIFICATION_COALESCE_WINDOW", default=3600)
+            ),
+            "notification_sample_actors": int(
+                os.getenv("NOTIFICATION_SAMPLE_ACTORS", default=3)
+            ),
+            # per worker in-process cache in front of redis
+            "cache_local_max_entries": int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", default=2048)),
+            "cache_local_max_bytes": int(os.getenv("CACHE_LOCAL_MAX_BYTES", default=32 * 1024 * 1024)),
+            "cache_local_ttl": int(os.getenv("CACHE_LOCAL_TTL", default=60)),
+            # value encoding, see cache/codec.py
+            "cache_codec": os.getenv("CACHE_CODEC", default="orjson"),
+            "cache_compression": os.getenv("CACHE_COMPRESSION", default="zlib"),
+            "cache_compress_min_bytes": int(os.getenv("CACHE_COMPRESS_MIN_BYTES", default=4096)),
             "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
             "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
             "aws_region": os.getenv("AWS_REGION"),
             "s3_bucket": os.getenv("S3_BUCKET"),
             "s3_key": os.getenv("S3_KEY"),
             "jwt_secret": os.getenv("JWT_SECRET_KEY"),
+            "password_hash_workers": int(os.getenv("PASSWORD_HASH_WORKERS", default=2)),
+            # upper bound on how long a verified token is cached, see cache/auth_cache.py
+            "auth_cache_ttl": int(os.getenv("AUTH_CACHE_TTL", default=900)),
+            # revoked token ids, see core/revocation.py
+            "jwt_revocation_capacity": int(os.getenv("JWT_REVOCATION_CAPACITY", default=100000)),
+            "jwt_revocation_error_rate": float(os.getenv("JWT_REVOCATION_ERROR_RATE", default=0.01)),
+            "jwt_revocation_prune_interval": int(os.getenv("JWT_REVOCATION_PRUNE_INTERVAL", default=300)),
             "ergoauth_seed": os.getenv("ERGOAUTH_SEED"),
+            # shared signature verification service, see verifier/server.py
+            "ergo_verifier_socket": os.getenv("ERGO_VERIFIER_SOCKET"),
+            "ergo_verifier_timeout": float(os.getenv("ERGO_VERIFIER_TIMEOUT", default=10)),
             "danaides_api": os.getenv("DANAIDES_API"),
+            # lazily created clients to build at startup instead, see core/lazy.py
+            "warm_up_clients": list(
+                filter(None, os.getenv("WARM_UP_CLIENTS", default="").split(","))
+            ),
         }
     ),
 }
@@ -2,12 +2,14 @@ import jwt
 from fastapi import Depends, HTTPException, status
 from jwt import PyJWTError
 
-from db.session import get_db
+from cache.auth_cache import cache_principal, get_cached_principal
+from core.revocation import revocations
+from db.session import get_async_db
+from db.crud import aio
 from db.models import users as models
 from db.schemas import users as schemas
 from db.schemas.token import TokenData
 from db.crud.users import (
-    get_blacklisted_token,
     get_user_by_alias,
     create_user,
     get_user_by_wallet_address,
@@ -16,7 +18,7 @@ from core import security
 
 
 async def get_current_user(
-    db=Depends(get_db), token: str = Depends(security.oauth2_scheme)
+    db=Depends(get_async_db), token: str = Depends(security.oauth2_scheme)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -34,12 +36,17 @@ async def get_current_user(
         token_data = TokenData(alias=alias, permissions=permissions)
     except PyJWTError:
         raise credentials_exception
-    blacklisted = get_blacklisted_token(db, token)
-    if blacklisted:
+    if await revocations.is_revoked(db, security.token_id(payload, token)):
         raise credentials_exception
-    user = get_user_by_alias(db, token_data.alias)
+    user = await get_cached_principal(token)
+    if user is not None:
+        return user
+    user = await aio.get_user_by_alias(db, token_data.alias)
     if user is None:
         raise credentials_exception
+    user = schemas.User.from_orm(user)
+    if "exp" in payload:
+        await cache_principal(token, user, payload["exp"])
     return user
 
 
@@ -61,16 +68,18 @@ async def get_current_active_superuser(
     return current_user
 
 
-def authenticate_user(db, alias: str, password: str):
-    user = get_user_by_alias(db, alias)
+async def authenticate_user(db, alias: str, password: str):
+    user = await aio.get_user_by_alias(db, alias)
     if not user:
         return False
-    if not security.verify_password(password, user.hashed_password):
+    if not await security.averify_password(password, user.hashed_password):
         return False
     return user
 
 
-def sign_up_new_user(db, alias: str, password: str, primary_wallet_address=None):
+def sign_up_new_user(
+    db, alias: str, password: str, primary_wallet_address=None, hashed_password=None
+):
     # these checks are redundant as db already enforces unique constraints
     user = get_user_by_alias(db, alias)
     if user:
@@ -89,6 +98,7 @@ def sign_up_new_user(db, alias: str, password: str, primary_wallet_address=None)
             is_active=True,
             is_superuser=False,
         ),
+        hashed_password,
     )
 
     return new_user
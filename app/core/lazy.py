@@ -0,0 +1,89 @@
+import logging
+import os
+import threading
+import time
+import typing as t
+
+logger = logging.getLogger("paideia")
+
+
+class StartupTimings:
+    """Seconds spent in each startup phase of this worker, in order"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._last = self.started
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase] = seconds
+
+    def report(self):
+        return {
+            "pid": os.getpid(),
+            "phases_ms": {
+                phase: round(seconds * 1000, 2) for phase, seconds in self.phases.items()
+            },
+            "total_ms": round((self._last - self.started) * 1000, 2),
+        }
+
+
+class LazyRegistry:
+    """
+    Heavy clients created on first use instead of at import time.
+
+    Factories do their own imports, so a worker that never uploads an image
+    never loads boto3 or PIL. Clients listed in WARM_UP_CLIENTS are created by
+    the startup hook instead.
+    """
+
+    def __init__(self, timings: StartupTimings):
+        self.timings = timings
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: t.Callable[[], t.Any]):
+        self._factories[name] = factory
+        return LazyProxy(self, name)
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                start = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.timings.record(f"init_{name}", time.perf_counter() - start)
+            return self._instances[name]
+
+    def warm_up(self, names: t.List[str]):
+        for name in names:
+            if name not in self._factories:
+                logger.warning(f"cannot warm up unknown client {name}")
+                continue
+            self.get(name)
+
+    def loaded(self):
+        return list(self._instances.keys())
+
+
+class LazyProxy:
+    """Stands in for a registered client, attribute access creates it"""
+
+    def __init__(self, registry: LazyRegistry, name: str):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+
+startup_timings = StartupTimings()
+clients = LazyRegistry(startup_timings)
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import contextlib
+import datetime
+import logging
+import threading
+import time
+
+import jwt
+from redis.exceptions import RedisError
+from sqlalchemy import inspect, text
+
+from cache.redis_client import asyncRedisClient, redisClient
+from config import Config, Network
+from core import security
+from db.crud import aio
+from db.crud.users import get_blacklisted_token_ids, prune_blacklisted_tokens
+from db.session import AsyncSessionLocal, SessionLocal, run_sync
+from util.bloom import BloomFilter
+
+CFG = Config[Network]
+
+logger = logging.getLogger("paideia")
+
+REVOCATION_CHANNEL = "jwt_revocations"
+
+# seconds between attempts to publish a revocation redis refused, adding up
+# to less than the prune interval
+PUBLISH_RETRY_DELAYS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class RevocationStore:
+    """
+    Revoked token ids (jti).
+
+    Postgres keeps the durable copy, redis the live set with every entry
+    expiring together with its token. Each worker holds a bloom filter of
+    the live set, fed by pub/sub and rebuilt on every prune, so a token that
+    was never revoked is accepted without any io.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 100000,
+        error_rate: float = 0.01,
+        client=None,
+        aclient=None,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.client = client or redisClient
+        self.aclient = aclient or asyncRedisClient
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.loaded = False
+        # guards swapping the filter against concurrent adds
+        self._lock = threading.Lock()
+        self._recorders = []
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        self._subscribed = threading.Event()
+        self._retries = set()
+
+    def add(self, jti: str):
+        with self._lock:
+            self.bloom.add(jti)
+            for added in self._recorders:
+                added.append(jti)
+
+    @contextlib.contextmanager
+    def _record_revocations(self):
+        # jtis revoked while a snapshot is read, added to the rebuilt filter
+        added = []
+        with self._lock:
+            self._recorders.append(added)
+        try:
+            yield added
+        finally:
+            with self._lock:
+                self._recorders.remove(added)
+
+    def rebuild(self, jtis, added=()):
+        bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            for jti in added:
+                bloom.add(jti)
+            self.bloom = bloom
+            self.loaded = True
+
+    async def is_revoked(self, db, jti: str):
+        if not self.loaded:
+            # subscribe first so nothing revoked while loading is missed
+            self._ensure_listener()
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._subscribed.wait, 5
+            )
+            with self._record_revocations() as added:
+                self.rebuild(await run_sync(db, get_blacklisted_token_ids), added)
+        if jti not in self.bloom:
+            return False
+        try:
+            if await self.aclient.exists(f"jwt_revoked_{jti}"):
+                return True
+        except RedisError as e:
+            logger.warning(f"revocation lookup failed: {str(e)}")
+        # a bloom false positive, or redis lost the entry
+        return await aio.get_blacklisted_token(db, jti) is not None
+
+    async def revoke(self, db, jti: str, exp: int):
+        ret = await aio.blacklist_token(
+            db, jti, datetime.datetime.fromtimestamp(exp, tz=datetime.timezone.utc)
+        )
+        self.add(jti)
+        try:
+            await self._publish(jti, exp)
+        except RedisError as e:
+            # other workers would only pick it up from postgres on their next
+            # prune, keep trying in the background
+            logger.warning(f"revocation publish failed: {str(e)}")
+            task = asyncio.create_task(self._retry_publish(jti, exp))
+            self._retries.add(task)
+            task.add_done_callback(self._retries.discard)
+        return ret
+
+    async def _publish(self, jti: str, exp: int):
+        await self.aclient.set(
+            f"jwt_revoked_{jti}", 1, ex=max(int(exp - time.time()), 1)
+        )
+        await self.aclient.publish(REVOCATION_CHANNEL, jti)
+
+    async def _retry_publish(self, jti: str, exp: int):
+        for delay in PUBLISH_RETRY_DELAYS:
+            await asyncio.sleep(delay)
+            if exp <= time.time():
+                return
+            try:
+                await self._publish(jti, exp)
+                return
+            except RedisError as e:
+                logger.warning(f"revocation publish retry failed: {str(e)}")
+
+    def prune(self, db):
+        pruned = prune_blacklisted_tokens(db)
+        with self._record_revocations() as added:
+            self.rebuild(get_blacklisted_token_ids(db), added)
+        return pruned
+
+    async def prune_periodically(self, interval: int):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await run_sync(db, self.prune)
+            except Exception as e:
+                logger.warning(f"revocation prune failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(
+                target=self._listen, name="jwt-revocations", daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REVOCATION_CHANNEL)
+                if self._subscribed.is_set():
+                    # anything published while we were not subscribed is in postgres
+                    self.loaded = False
+                self._subscribed.set()
+                for message in pubsub.listen():
+                    self.add(message["data"].decode("utf-8"))
+            except Exception as e:
+                logger.warning(f"revocation listener: {str(e)}")
+                self.loaded = False
+                time.sleep(1)
+
+
+def migrate_legacy_blacklist(db) -> dict:
+    """
+    Carries blacklist rows from before revocations were keyed by jti (the raw
+    token in a `token` column) over to jti/expires_dtz, so tokens revoked
+    before the upgrade stay revoked. Rows whose token already expired or
+    doesn't decode are dropped. Safe to run again:
+        python -m core.revocation migrate
+    """
+    columns = {c["name"] for c in inspect(db.bind).get_columns("jwt_blacklist")}
+    if "token" not in columns:
+        return {"migrated": 0, "dropped": 0}
+    postgres = db.bind.dialect.name == "postgresql"
+    if postgres:
+        db.execute(
+            text("ALTER TABLE jwt_blacklist ADD COLUMN IF NOT EXISTS jti VARCHAR")
+        )
+        db.execute(
+            text(
+                "ALTER TABLE jwt_blacklist "
+                "ADD COLUMN IF NOT EXISTS expires_dtz TIMESTAMP WITH TIME ZONE"
+            )
+        )
+        # new revocations don't write the raw token
+        db.execute(text("ALTER TABLE jwt_blacklist ALTER COLUMN token DROP NOT NULL"))
+    seen = {
+        row[0]
+        for row in db.execute(
+            text("SELECT jti FROM jwt_blacklist WHERE jti IS NOT NULL")
+        )
+    }
+    rows = db.execute(
+        text("SELECT id, token FROM jwt_blacklist WHERE jti IS NULL")
+    ).all()
+    now = time.time()
+    migrated = dropped = 0
+    for id, token in rows:
+        try:
+            payload = jwt.decode(
+                token,
+                security.SECRET_KEY,
+                algorithms=[security.ALGORITHM],
+                options={"verify_exp": False},
+            )
+        except jwt.PyJWTError:
+            payload = None
+        jti = None if payload is None else security.token_id(payload, token)
+        exp = None if payload is None else payload.get("exp")
+        if exp is None and payload is not None:
+            exp = now + security.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        if payload is None or exp <= now or jti in seen:
+            db.execute(text("DELETE FROM jwt_blacklist WHERE id = :id"), {"id": id})
+            dropped += 1
+            continue
+        seen.add(jti)
+        db.execute(
+            text(
+                "UPDATE jwt_blacklist SET jti = :jti, expires_dtz = :expires "
+                "WHERE id = :id"
+            ),
+            {
+                "id": id,
+                "jti": jti,
+                "expires": datetime.datetime.fromtimestamp(
+                    exp, tz=datetime.timezone.utc
+                ),
+            },
+        )
+        migrated += 1
+    if postgres:
+        db.execute(text("ALTER TABLE jwt_blacklist ALTER COLUMN jti SET NOT NULL"))
+        db.execute(
+            text("ALTER TABLE jwt_blacklist ALTER COLUMN expires_dtz SET NOT NULL")
+        )
+        db.execute(
+            text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_jwt_blacklist_jti "
+                "ON jwt_blacklist (jti)"
+            )
+        )
+        db.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_jwt_blacklist_expires_dtz "
+                "ON jwt_blacklist (expires_dtz)"
+            )
+        )
+    db.commit()
+    return {"migrated": migrated, "dropped": dropped}
+
+
+revocations = RevocationStore(
+    capacity=CFG.jwt_revocation_capacity,
+    error_rate=CFG.jwt_revocation_error_rate,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args()
+    db = SessionLocal()
+    try:
+        print(migrate_legacy_blacklist(db))
+    finally:
+        db.close()
@@ -1,3 +1,4 @@
+import asyncio
 import time
 import secrets
 import hashlib
@@ -5,6 +6,7 @@ import jwt
 
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from config import Config, Network
@@ -18,30 +20,66 @@ SECRET_KEY = CFG.jwt_secret
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 
+# wallet only accounts sign in with ergoauth and have no usable password, they
+# store this marker instead of a bcrypt hash of the default password
+ERGOAUTH_DEFAULT_PASSWORD = "__ergoauth_default"
+WALLET_ONLY_CREDENTIAL = "!ergoauth"
+
+# bcrypt is cpu bound and releases the gil, async routes hash on this pool so
+# the event loop is never blocked and at most this many hashes run at once
+password_executor = ThreadPoolExecutor(
+    max_workers=CFG.password_hash_workers, thread_name_prefix="bcrypt"
+)
+
 
 def get_md5_hash(string: str) -> str:
     return hashlib.md5(string.encode("utf-8")).hexdigest()
 
 
 def get_password_hash(password: str) -> str:
+    if password == ERGOAUTH_DEFAULT_PASSWORD:
+        return WALLET_ONLY_CREDENTIAL
     return pwd_context.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    if hashed_password == WALLET_ONLY_CREDENTIAL:
+        return False
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def aget_password_hash(password: str) -> str:
+    if password == ERGOAUTH_DEFAULT_PASSWORD:
+        return WALLET_ONLY_CREDENTIAL
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, pwd_context.hash, password
+    )
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    if hashed_password == WALLET_ONLY_CREDENTIAL:
+        return False
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, pwd_context.verify, plain_password, hashed_password
+    )
+
+
 def create_access_token(*, data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def token_id(payload: dict, token: str) -> str:
+    # tokens issued before jti was added are identified by their digest
+    return payload.get("jti") or hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
 # ergoauth stuff
 
 
@@ -1,9 +1,13 @@
+import datetime
+import typing as t
+
 from fastapi import status
 from starlette.responses import JSONResponse
 from sqlalchemy.orm import Session
 from db.models.users import UserDetails
 
 from db.models import activity_log
+from db.partitions import retention_cutoff
 from db.schemas import activity
 
 ########################################
@@ -12,9 +16,11 @@ from db.schemas import activity
 
 
 def get_user_activities(db: Session, user_details_id: int, limit: int = 100):
+    # bounded to the retention window so only recent partitions are read
     return (
         db.query(activity_log.vw_activity_log)
         .filter(activity_log.vw_activity_log.user_details_id == user_details_id)
+        .filter(activity_log.vw_activity_log.date >= retention_cutoff("activity_log"))
         .order_by(activity_log.vw_activity_log.date.desc())
         .limit(limit)
         .all()
@@ -26,6 +32,7 @@ def get_dao_activities(db: Session, dao_id: int, limit: int = 100):
         db.query(activity_log.vw_activity_log, UserDetails)
         .filter(UserDetails.id == activity_log.vw_activity_log.user_details_id)
         .filter(UserDetails.dao_id == dao_id)
+        .filter(activity_log.vw_activity_log.date >= retention_cutoff("activity_log"))
         .order_by(activity_log.vw_activity_log.date.desc())
         .limit(limit)
         .all()
@@ -50,6 +57,31 @@ def create_user_activity(
     return db_activity
 
 
+def activity_row(
+    user_details_id: int,
+    activity: activity.CreateOrUpdateActivity,
+    date: datetime.datetime = None,
+):
+    # column values for a bulk insert, dated when the action happened
+    return {
+        "user_details_id": user_details_id,
+        "action": activity.action,
+        "value": activity.value,
+        "secondary_action": activity.secondary_action,
+        "secondary_value": activity.secondary_value,
+        "category": activity.category,
+        "date": date or datetime.datetime.now(datetime.timezone.utc),
+    }
+
+
+def create_user_activities(db: Session, rows: t.List[dict]):
+    # one multi-row insert, the caller commits
+    if len(rows) == 0:
+        return 0
+    db.execute(activity_log.Activity.__table__.insert().values(rows))
+    return len(rows)
+
+
 def delete_activity(db: Session, id: int):
     activity = (
         db.query(activity_log.Activity).filter(activity_log.Activity.id == id).first()
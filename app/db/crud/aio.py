@@ -0,0 +1,52 @@
+import functools
+
+from db.session import run_sync
+from db.crud import activity_log, notifications, proposals, users
+
+
+#############################
+### ASYNC CRUD OPERATIONS ###
+#############################
+
+# each variant takes an AsyncSession (or a sync Session) in place of db and
+# must be awaited, use these from `async def` routes so the event loop is
+# never blocked on a database round trip
+
+
+def to_async(fn):
+    @functools.wraps(fn)
+    async def wrapper(db, *args, **kwargs):
+        return await run_sync(db, fn, *args, **kwargs)
+
+    return wrapper
+
+
+# users
+get_user = to_async(users.get_user)
+get_users = to_async(users.get_users)
+get_user_by_alias = to_async(users.get_user_by_alias)
+get_user_by_wallet_address = to_async(users.get_user_by_wallet_address)
+get_user_by_wallet_addresses = to_async(users.get_user_by_wallet_addresses)
+get_primary_wallet_address_by_user_id = to_async(
+    users.get_primary_wallet_address_by_user_id
+)
+get_user_details_by_id = to_async(users.get_user_details_by_id)
+create_user = to_async(users.create_user)
+edit_user = to_async(users.edit_user)
+delete_user = to_async(users.delete_user)
+blacklist_token = to_async(users.blacklist_token)
+get_blacklisted_token = to_async(users.get_blacklisted_token)
+
+# proposals
+get_basic_proposal_by_id = to_async(proposals.get_basic_proposal_by_id)
+get_proposal_by_id = to_async(proposals.get_proposal_by_id)
+get_comment_by_id = to_async(proposals.get_comment_by_id)
+add_commment_by_proposal_id = to_async(proposals.add_commment_by_proposal_id)
+delete_comment_by_comment_id = to_async(proposals.delete_comment_by_comment_id)
+
+# activities
+create_user_activity = to_async(activity_log.create_user_activity)
+
+# notifications
+create_notification = to_async(notifications.create_notification)
+get_notifications = to_async(notifications.get_notifications)
@@ -2,6 +2,7 @@ from fastapi import status
 from starlette.responses import JSONResponse
 from sqlalchemy.orm import Session
 
+from cache.response_cache import invalidate_response_cache
 from db.models.blogs import Blog
 from db.schemas.blog import CreateOrUpdateBlog
 
@@ -60,6 +61,7 @@ def create_blog(db: Session, blog: CreateOrUpdateBlog):
     )
     db.add(db_blog)
     db.commit()
+    invalidate_response_cache("blogs")
     db.refresh(db_blog)
     return db_blog
 
@@ -77,6 +79,7 @@ def edit_blog(db: Session, id: int, blog: CreateOrUpdateBlog):
 
     db.add(db_blog)
     db.commit()
+    invalidate_response_cache("blogs")
     db.refresh(db_blog)
     return db_blog
 
@@ -87,4 +90,5 @@ def delete_blog(db: Session, id: int):
         return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content="blog not found")
     db.delete(db_blog)
     db.commit()
+    invalidate_response_cache("blogs")
     return db_blog
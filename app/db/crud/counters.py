@@ -0,0 +1,214 @@
+import typing as t
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import case, func, text
+
+from db.models.proposals import (
+    Proposal,
+    ProposalLike,
+    ProposalFollower,
+    Comment,
+    ProposalCommentLike,
+    ProposalCounter,
+    ProposalCommentCounter,
+)
+from db.models.users import UserDetailsCounter
+
+
+####################################
+### CRUD OPERATIONS FOR COUNTERS ###
+####################################
+
+# counters are denormalized copies of aggregates over the like, follower,
+# comment and proposal tables. increments run in the caller's session so they
+# commit (or roll back) together with the row that changed them.
+
+
+def _upsert_increment(db: Session, model, key: str, key_value: int, deltas: dict):
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if len(deltas) == 0:
+        return
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(model.__table__).values(
+        **{key: key_value}, **{column: max(delta, 0) for column, delta in deltas.items()}
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[key],
+        set_={
+            column: getattr(model.__table__.c, column) + delta
+            for column, delta in deltas.items()
+        },
+    )
+    db.execute(statement)
+
+
+def increment_proposal_counters(
+    db: Session,
+    proposal_id: int,
+    likes: int = 0,
+    dislikes: int = 0,
+    followers: int = 0,
+    comments: int = 0,
+):
+    _upsert_increment(
+        db,
+        ProposalCounter,
+        "proposal_id",
+        proposal_id,
+        {
+            "likes": likes,
+            "dislikes": dislikes,
+            "followers": followers,
+            "comments": comments,
+        },
+    )
+
+
+def increment_comment_counters(
+    db: Session, comment_id: int, likes: int = 0, dislikes: int = 0
+):
+    _upsert_increment(
+        db,
+        ProposalCommentCounter,
+        "comment_id",
+        comment_id,
+        {"likes": likes, "dislikes": dislikes},
+    )
+
+
+def increment_user_details_counters(
+    db: Session, user_details_id: int, proposals_created: int = 0
+):
+    _upsert_increment(
+        db,
+        UserDetailsCounter,
+        "user_details_id",
+        user_details_id,
+        {"proposals_created": proposals_created},
+    )
+
+
+def delete_likes(db: Session, model, key: str, key_id: int, user_details_id: int):
+    # deletes the user's like rows and returns the `liked` of the rows that
+    # were actually deleted, so concurrent requests never count the same row
+    # twice. raw sql since sqlalchemy 1.4 can't compile RETURNING for sqlite
+    return [
+        row.liked
+        for row in db.execute(
+            text(
+                f"DELETE FROM {model.__tablename__} "
+                f"WHERE {key} = :key_id AND user_details_id = :user_details_id "
+                "RETURNING liked"
+            ),
+            {"key_id": key_id, "user_details_id": user_details_id},
+        )
+    ]
+
+
+def like_deltas(removed: t.List[t.Optional[bool]], type: str):
+    # counter deltas for replacing the `removed` like rows by `type`
+    likes = dislikes = 0
+    for liked in removed:
+        if liked == True:
+            likes -= 1
+        if liked == False:
+            dislikes -= 1
+    if type == "like":
+        likes += 1
+    if type == "dislike":
+        dislikes += 1
+    return {"likes": likes, "dislikes": dislikes}
+
+
+def get_proposals_created_by_user_details_ids(
+    db: Session, user_details_ids: t.List[int]
+):
+    return dict(
+        db.query(
+            UserDetailsCounter.user_details_id, UserDetailsCounter.proposals_created
+        )
+        .filter(UserDetailsCounter.user_details_id.in_(user_details_ids))
+        .all()
+    )
+
+
+def get_proposals_created_by_user_details_id(db: Session, user_details_id: int):
+    return get_proposals_created_by_user_details_ids(db, [user_details_id]).get(
+        user_details_id, 0
+    )
+
+
+def _like_aggregates(db: Session, model, key):
+    return (
+        db.query(
+            key.label("id"),
+            func.sum(case((model.liked == True, 1), else_=0)).label("likes"),
+            func.sum(case((model.liked == False, 1), else_=0)).label("dislikes"),
+        )
+        .group_by(key)
+        .subquery()
+    )
+
+
+def _count_aggregates(db: Session, key, column):
+    return db.query(key.label("id"), func.count(column).label("total")).group_by(
+        key
+    ).subquery()
+
+
+def reconcile_counters(db: Session):
+    # rebuilds every counter table from the source rows in one transaction
+    likes = _like_aggregates(db, ProposalLike, ProposalLike.proposal_id)
+    followers = _count_aggregates(
+        db, ProposalFollower.proposal_id, ProposalFollower.id
+    )
+    comments = _count_aggregates(db, Comment.proposal_id, Comment.id)
+    comment_likes = _like_aggregates(
+        db, ProposalCommentLike, ProposalCommentLike.comment_id
+    )
+    created = _count_aggregates(db, Proposal.user_details_id, Proposal.id)
+
+    db.query(ProposalCounter).delete()
+    db.query(ProposalCommentCounter).delete()
+    db.query(UserDetailsCounter).delete()
+    db.execute(
+        ProposalCounter.__table__.insert().from_select(
+            ["proposal_id", "likes", "dislikes", "followers", "comments"],
+            db.query(
+                Proposal.id,
+                func.coalesce(likes.c.likes, 0),
+                func.coalesce(likes.c.dislikes, 0),
+                func.coalesce(followers.c.total, 0),
+                func.coalesce(comments.c.total, 0),
+            )
+            .outerjoin(likes, likes.c.id == Proposal.id)
+            .outerjoin(followers, followers.c.id == Proposal.id)
+            .outerjoin(comments, comments.c.id == Proposal.id)
+            .statement,
+        )
+    )
+    db.execute(
+        ProposalCommentCounter.__table__.insert().from_select(
+            ["comment_id", "likes", "dislikes"],
+            db.query(
+                Comment.id,
+                func.coalesce(comment_likes.c.likes, 0),
+                func.coalesce(comment_likes.c.dislikes, 0),
+            )
+            .outerjoin(comment_likes, comment_likes.c.id == Comment.id)
+            .statement,
+        )
+    )
+    db.execute(
+        UserDetailsCounter.__table__.insert().from_select(
+            ["user_details_id", "proposals_created"],
+            db.query(created.c.id, created.c.total).statement,
+        )
+    )
+    db.commit()
+    return {
+        "proposal_counters": db.query(ProposalCounter).count(),
+        "comment_counters": db.query(ProposalCommentCounter).count(),
+        "user_details_counters": db.query(UserDetailsCounter).count(),
+    }
@@ -1,6 +1,10 @@
 import typing as t
 
+from redis.exceptions import RedisError
 from sqlalchemy.orm import Session
+from cache.cache import cache
+from cache.response_cache import invalidate_response_cache
+from config import dotdict
 from db.models.tokenomics import (
     Distribution,
     TokenHolder,
@@ -442,7 +446,33 @@ def set_dao_design_footer_links(
 
 
 def get_dao_theme(db: Session, theme_id: int):
-    return db.query(DaoTheme).filter(DaoTheme.id == theme_id).first()
+    # themes are seeded and read on every dao design lookup, so they are
+    # served from the two tier cache
+    cache_key = f"dao_theme_{theme_id}"
+    try:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return dotdict(cached)
+    except RedisError:
+        pass
+    theme = db.query(DaoTheme).filter(DaoTheme.id == theme_id).first()
+    if theme is None:
+        return None
+    try:
+        cache.set(
+            cache_key,
+            {
+                "id": theme.id,
+                "theme_name": theme.theme_name,
+                "primary_color": theme.primary_color,
+                "secondary_color": theme.secondary_color,
+                "dark_primary_color": theme.dark_primary_color,
+                "dark_secondary_color": theme.dark_secondary_color,
+            },
+        )
+    except RedisError:
+        pass
+    return theme
 
 
 def get_dao_design(db: Session, dao_id: int):
@@ -603,6 +633,7 @@ def create_dao(db: Session, dao: CreateOrUpdateDao):
     setattr(db_dao, "governance_id", dao_tokenomics.id)
     db.add(db_dao)
     db.commit()
+    invalidate_response_cache("daos")
 
     return DaoSchema(
         id=dao_id,
@@ -639,6 +670,7 @@ def edit_dao(db: Session, id: int, dao: CreateOrUpdateDao):
     dao_design = edit_dao_design(db, id, dao.design)
     dao_governance = edit_dao_governance(db, id, dao.governance)
     dao_tokenomics = edit_dao_tokenomics(db, id, dao.tokenomics)
+    invalidate_response_cache("daos", f"dao_{id}")
 
     return DaoSchema(
         id=db_dao.id,
@@ -668,6 +700,7 @@ def delete_dao(db: Session, id: int):
     delete_dao_tokenomics(db, id)
     db.query(Dao).filter(Dao.id == id).delete()
     db.commit()
+    invalidate_response_cache("daos", f"dao_{id}", f"dao_proposals_{id}")
 
     return db_dao
 
@@ -686,6 +719,7 @@ def add_to_highlighted_projects(db: Session, dao_id: int):
     db_highlighted_project = HighlightedDaos(dao_id=dao_id)
     db.add(db_highlighted_project)
     db.commit()
+    invalidate_response_cache("daos")
     db.refresh(db_highlighted_project)
     return db_highlighted_project
 
@@ -696,4 +730,5 @@ def remove_from_highlighted_projects(db: Session, dao_id: int):
         return db_highlighted_project
     db.delete(db_highlighted_project)
     db.commit()
+    invalidate_response_cache("daos")
     return db_highlighted_project
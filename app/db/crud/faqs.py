@@ -4,6 +4,7 @@ from fastapi import status
 from sqlalchemy.orm import Session
 from starlette.responses import JSONResponse
 
+from cache.response_cache import invalidate_response_cache
 from db.models import faqs as models
 from db.schemas import faq as schemas
 
@@ -30,6 +31,7 @@ def create_faq(db: Session, faq: schemas.CreateAndUpdateFaq):
     )
     db.add(db_faq)
     db.commit()
+    invalidate_response_cache("faqs")
     db.refresh(db_faq)
     return db_faq
 
@@ -41,6 +43,7 @@ def delete_faq(db: Session, id: int):
                             content="faq not found")
     db.delete(faq)
     db.commit()
+    invalidate_response_cache("faqs")
     return faq
 
 
@@ -58,5 +61,6 @@ def edit_faq(
 
     db.add(db_faq)
     db.commit()
+    invalidate_response_cache("faqs")
     db.refresh(db_faq)
     return db_faq
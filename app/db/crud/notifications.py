@@ -1,15 +1,26 @@
 import datetime
 from fastapi import status
 from starlette.responses import JSONResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 import typing as t
 
+from cache.notification_counters import (
+    adjust_unread_counter,
+    rebuild_unread_counter,
+)
+from config import Config, Network
 from db.models.notifications import Notification
+from db.partitions import partitions, retention_cutoff
 from db.schemas.notifications import (
     Notification as NotificationSchema,
     CreateAndUpdateNotification,
 )
 
+CFG = Config[Network]
+
+# advisory lock namespace for coalesce_notifications keys
+COALESCE_LOCK_ID = 72310416
 
 #########################################
 ### CRUD OPERATIONS FOR NOTIFICATIONS ###
@@ -23,9 +34,11 @@ def get_notification(db: Session, id: int):
 def get_notifications(
     db: Session, user_details_id: int, skip: int = 0, limit: int = 10
 ):
+    # bounded to the retention window so only recent partitions are read
     return (
         db.query(Notification)
         .filter(Notification.user_details_id == user_details_id)
+        .filter(Notification.date >= retention_cutoff("notifications"))
         .order_by(Notification.date.desc())
         .offset(skip)
         .limit(limit)
@@ -33,24 +46,166 @@ def get_notifications(
     )
 
 
-def create_notification(
-    db: Session, user_details_id: int, notification: CreateAndUpdateNotification
+def _db_notification(
+    notification: CreateAndUpdateNotification, date: datetime.datetime = None
 ):
-    db_notification = Notification(
-        user_details_id=user_details_id,
+    return Notification(
+        user_details_id=notification.user_details_id,
         img=notification.img,
         action=notification.action,
         proposal_id=notification.proposal_id,
         transaction_id=notification.transaction_id,
         href=notification.href,
         additional_text=notification.additional_text,
+        is_read=notification.is_read,
+        group_key=notification.group_key,
+        actor_count=notification.actor_count,
+        actors=_actors(notification),
+        date=date,
     )
+
+
+def _actors(notification: CreateAndUpdateNotification):
+    if notification.actors is None:
+        return None
+    return [actor.dict() for actor in notification.actors]
+
+
+def create_notification(
+    db: Session, user_details_id: int, notification: CreateAndUpdateNotification
+):
+    db_notification = _db_notification(notification)
+    db_notification.user_details_id = user_details_id
     db.add(db_notification)
+    # the caller adjusts the unread counter after this commits, see notify
     db.commit()
     db.refresh(db_notification)
     return db_notification
 
 
+def create_notifications(
+    db: Session,
+    notifications: t.List[t.Tuple[CreateAndUpdateNotification, datetime.datetime]],
+):
+    # one flush for the batch, the caller commits and then calls
+    # acount_new_unread for the counters
+    db_notifications = [
+        _db_notification(notification, date) for notification, date in notifications
+    ]
+    db.add_all(db_notifications)
+    db.flush()
+    return db_notifications
+
+
+def coalesce_notifications(
+    db: Session,
+    notifications: t.List[t.Tuple[CreateAndUpdateNotification, datetime.datetime]],
+    window: int = CFG.notification_coalesce_window,
+    sample_size: int = CFG.notification_sample_actors,
+):
+    """
+    Like create_notifications, but notifications with a group_key are merged
+    into the recipient's unread notification for the same proposal and
+    group_key from the last `window` seconds, which is updated in place and
+    moved to the newest date (a sliding window). Returns (created, updated),
+    the caller commits and then calls acount_new_unread on created.
+    """
+    singles = []
+    groups = {}
+    for notification, date in notifications:
+        if window <= 0 or not notification.group_key or not notification.proposal_id:
+            singles.append((notification, date))
+            continue
+        key = (
+            notification.user_details_id,
+            notification.proposal_id,
+            notification.group_key,
+        )
+        groups.setdefault(key, []).append((notification, date))
+    created = create_notifications(db, singles)
+    updated = []
+    # sorted so relays lock the keys in the same order and can't deadlock
+    for key in sorted(groups):
+        user_details_id, proposal_id, group_key = key
+        group = groups[key]
+        if db.bind.dialect.name == "postgresql":
+            # held until commit, so two relays can't both find no aggregate
+            # for the key and insert one each
+            db.execute(
+                text("SELECT pg_advisory_xact_lock(:lock_id, hashtext(:key))"),
+                {
+                    "lock_id": COALESCE_LOCK_ID,
+                    "key": f"{user_details_id}:{proposal_id}:{group_key}",
+                },
+            )
+        db_notification = (
+            db.query(Notification)
+            .filter(
+                Notification.user_details_id == user_details_id,
+                Notification.proposal_id == proposal_id,
+                Notification.group_key == group_key,
+                Notification.is_read == False,
+                Notification.date
+                >= group[0][1] - datetime.timedelta(seconds=window),
+            )
+            .order_by(Notification.date.desc())
+            .first()
+        )
+        if db_notification is None:
+            notification, date = group[0]
+            db_notification = _db_notification(notification, date)
+            db.add(db_notification)
+            created.append(db_notification)
+            _merge_notifications(db_notification, group[1:], sample_size)
+        elif _merge_notifications(db_notification, group, sample_size):
+            updated.append(db_notification)
+    db.flush()
+    return created, updated
+
+
+def _merge_notifications(
+    db_notification: Notification,
+    group: t.List[t.Tuple[CreateAndUpdateNotification, datetime.datetime]],
+    sample_size: int,
+):
+    # returns whether anything changed, repeat actors (a like, unlike and
+    # like again) aren't counted twice while they're in the sample
+    actors = list(db_notification.actors or [])
+    actor_count = db_notification.actor_count
+    changed = False
+    for notification, date in group:
+        new = [
+            actor for actor in _actors(notification) or [] if actor not in actors
+        ]
+        if notification.actors and len(new) == 0:
+            continue
+        actors = new + actors
+        actor_count += notification.actor_count
+        db_notification.date = date
+        db_notification.img = notification.img
+        db_notification.href = notification.href
+        changed = True
+    if changed:
+        # assigned, not mutated, so the JSON column is flagged as dirty
+        db_notification.actors = actors[:sample_size]
+        db_notification.actor_count = actor_count
+        if actors:
+            db_notification.action = coalesced_action(
+                actors, actor_count, db_notification.group_key
+            )
+    return changed
+
+
+def coalesced_action(actors: t.List[dict], actor_count: int, action: str):
+    # "alice liked ...", "alice and bob liked ...", "alice and 11 others liked ..."
+    name = actors[0]["name"]
+    if actor_count == 1:
+        return generate_action(name, action)
+    if actor_count == 2 and len(actors) > 1:
+        return generate_action(f"{name} and {actors[1]['name']}", action)
+    return generate_action(f"{name} and {actor_count - 1} others", action)
+
+
 def edit_notification(db: Session, id: int, notification: CreateAndUpdateNotification):
     db_notification = get_notification(db, id)
     if not db_notification:
@@ -58,16 +213,54 @@ def edit_notification(db: Session, id: int, notification: CreateAndUpdateNotific
             status_code=status.HTTP_404_NOT_FOUND, content="notification not found"
         )
 
+    was_read = db_notification.is_read
     update_data = notification.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_notification, key, value)
 
     db.add(db_notification)
     db.commit()
+    if was_read != db_notification.is_read:
+        adjust_unread_counter(
+            db_notification.user_details_id, -1 if db_notification.is_read else 1
+        )
     db.refresh(db_notification)
     return db_notification
 
 
+def mark_notifications_read(
+    db: Session, user_details_id: int, ids: t.Optional[t.List[int]] = None
+):
+    # one update for all of the user's unread notifications, or only `ids`
+    query = db.query(Notification).filter(
+        Notification.user_details_id == user_details_id,
+        Notification.is_read == False,
+    )
+    if ids is not None:
+        query = query.filter(Notification.id.in_(ids))
+    updated = query.update({Notification.is_read: True}, synchronize_session=False)
+    db.commit()
+    adjust_unread_counter(user_details_id, -updated)
+    unread = count_unread_notifications(db, user_details_id)
+    return {"updated": updated, "unread": unread}
+
+
+def count_unread_notifications(db: Session, user_details_id: int):
+    def count():
+        # served by the partial index on unread rows
+        return (
+            db.query(Notification)
+            .filter(
+                Notification.user_details_id == user_details_id,
+                Notification.is_read == False,
+                Notification.date >= retention_cutoff("notifications"),
+            )
+            .count()
+        )
+
+    return rebuild_unread_counter(user_details_id, count)
+
+
 def delete_notification(db: Session, id: int):
     notification = db.query(Notification).filter(Notification.id == id).first()
     if not notification:
@@ -76,16 +269,21 @@ def delete_notification(db: Session, id: int):
         )
     db.delete(notification)
     db.commit()
+    if not notification.is_read:
+        adjust_unread_counter(notification.user_details_id, -1)
     return notification
 
 
 def cleanup_notifications(db: Session):
-    # delete month old notifications
-    date = datetime.datetime.utcnow() - datetime.timedelta(30)
+    # drops expired monthly partitions, a row delete if not partitioned yet
+    if partitions.is_partitioned(db, "notifications"):
+        changes = partitions.maintain(db).get("notifications", {})
+        return {"deleted_rows": 0, "dropped_partitions": changes.get("dropped", [])}
     ret = {
         "deleted_rows": db.query(Notification)
-        .filter(Notification.date <= date)
-        .delete()
+        .filter(Notification.date < retention_cutoff("notifications"))
+        .delete(),
+        "dropped_partitions": [],
     }
     db.commit()
     return ret
@@ -0,0 +1,81 @@
+import datetime
+import typing as t
+
+from sqlalchemy.orm import Session
+
+from db.models.outbox import OutboxEvent
+from db.schemas.activity import CreateOrUpdateActivity
+from db.schemas.notifications import CreateAndUpdateNotification
+
+##################################
+### CRUD OPERATIONS FOR OUTBOX ###
+##################################
+
+# side effects of a mutation (activity rows, notifications) are added to the
+# outbox in the mutation's own transaction and carried out later by
+# outbox/relay.py, so they are never lost and never slow the request down
+
+
+def activity_event(user_details_id: int, activity: CreateOrUpdateActivity):
+    return {
+        "kind": "activity",
+        "payload": {
+            "user_details_id": user_details_id,
+            "activity": activity.dict(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+    }
+
+
+def notification_event(
+    user_details_id: int, notification: CreateAndUpdateNotification
+):
+    return {
+        "kind": "notification",
+        "payload": {
+            "user_details_id": user_details_id,
+            "notification": notification.dict(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+    }
+
+
+def add_outbox_events(db: Session, events: t.List[dict]):
+    # the caller commits, together with the change the events belong to
+    for event in events:
+        db.add(OutboxEvent(kind=event["kind"], payload=event["payload"]))
+
+
+def claim_outbox_events(db: Session, limit: int):
+    # rows locked by another relay are skipped, so relays can run side by side
+    query = (
+        db.query(OutboxEvent)
+        .filter(OutboxEvent.dead == False)
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+    )
+    if db.bind.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    return query.all()
+
+
+def delete_outbox_events(db: Session, ids: t.List[int]):
+    return (
+        db.query(OutboxEvent)
+        .filter(OutboxEvent.id.in_(ids))
+        .delete(synchronize_session=False)
+    )
+
+
+def record_outbox_failure(
+    db: Session, event: OutboxEvent, error: str, max_attempts: int
+):
+    # the event stays in the outbox, after max_attempts it's set aside as dead
+    # for someone to look at instead of being retried forever
+    event.attempts = (event.attempts or 0) + 1
+    event.last_error = error[:1000]
+    event.dead = event.attempts >= max_attempts
+
+
+def count_outbox_events(db: Session, dead: bool = False):
+    return db.query(OutboxEvent).filter(OutboxEvent.dead == dead).count()
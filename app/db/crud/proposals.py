@@ -1,18 +1,24 @@
 ## proposals.py (crud)
 
+import base64
+import datetime
 import typing as t
 
 from fastapi import status
 from starlette.responses import JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import or_
-from db.crud.users import (
-    get_followers_by_user_id,
-    get_proposals_by_user_id,
-    get_primary_wallet_address_by_user_id,
-    get_user_details_by_id,
+from sqlalchemy.sql import and_, func, or_
+from cache.response_cache import invalidate_response_cache
+from db.crud.counters import (
+    increment_comment_counters,
+    increment_proposal_counters,
+    increment_user_details_counters,
+    delete_likes,
+    get_proposals_created_by_user_details_ids,
+    like_deltas,
 )
-from db.models.users import UserDetails
+from db.crud.outbox import add_outbox_events
+from db.models.users import UserDetails, UserFollower
 from db.models.proposals import (
     Proposal,
     ProposalReference,
@@ -21,10 +27,13 @@ from db.models.proposals import (
     Comment,
     Addendum,
     ProposalCommentLike,
+    ProposalCounter,
+    ProposalCommentCounter,
 )
 from db.schemas.proposal import (
     ProposalReference as ProposalReferenceSchema,
     Proposal as ProposalSchema,
+    ProposalSummary as ProposalSummarySchema,
     CreateProposal as CreateProposalSchema,
     Comment as CommentSchema,
     UpdateProposalBasic as UpdateProposalBasicSchema,
@@ -66,15 +75,20 @@ def get_likes_by_comment_id(db: Session, comment_id: int):
 
 
 def set_likes_by_proposal_id(
-    db: Session, proposal_id: int, user_details_id: int, type: str
+    db: Session,
+    proposal_id: int,
+    user_details_id: int,
+    type: str,
+    outbox: t.List[dict] = None,
 ):
     if type not in ("like", "dislike", "remove"):
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST, content="invalid like request type"
         )
-    db.query(ProposalLike).filter(ProposalLike.proposal_id == proposal_id).filter(
-        ProposalLike.user_details_id == user_details_id
-    ).delete()
+    removed = delete_likes(
+        db, ProposalLike, "proposal_id", proposal_id, user_details_id
+    )
+    increment_proposal_counters(db, proposal_id, **like_deltas(removed, type))
     if type == "like":
         db_like = ProposalLike(
             proposal_id=proposal_id, user_details_id=user_details_id, liked=True
@@ -86,20 +100,27 @@ def set_likes_by_proposal_id(
         )
         db.add(db_like)
 
+    add_outbox_events(db, outbox or [])
     db.commit()
+    invalidate_response_cache(f"proposal_{proposal_id}")
     return get_likes_by_proposal_id(db, proposal_id)
 
 
 def set_likes_by_comment_id(
-    db: Session, comment_id: int, user_details_id: int, type: str
+    db: Session,
+    comment_id: int,
+    user_details_id: int,
+    type: str,
+    outbox: t.List[dict] = None,
 ):
     if type not in ("like", "dislike", "remove"):
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST, content="invalid like request type"
         )
-    db.query(ProposalCommentLike).filter(
-        ProposalCommentLike.comment_id == comment_id
-    ).filter(ProposalCommentLike.user_details_id == user_details_id).delete()
+    removed = delete_likes(
+        db, ProposalCommentLike, "comment_id", comment_id, user_details_id
+    )
+    increment_comment_counters(db, comment_id, **like_deltas(removed, type))
     if type == "like":
         db_like = ProposalCommentLike(
             comment_id=comment_id, user_details_id=user_details_id, liked=True
@@ -111,7 +132,11 @@ def set_likes_by_comment_id(
         )
         db.add(db_like)
 
+    add_outbox_events(db, outbox or [])
     db.commit()
+    db_comment = db.query(Comment.proposal_id).filter(Comment.id == comment_id).first()
+    if db_comment:
+        invalidate_response_cache(f"proposal_{db_comment.proposal_id}")
     return get_likes_by_comment_id(db, comment_id)
 
 
@@ -126,16 +151,26 @@ def get_followers_by_proposal_id(db: Session, proposal_id: int):
 
 
 def set_followers_by_proposal_id(
-    db: Session, proposal_id: int, user_details_id: int, type: str
+    db: Session,
+    proposal_id: int,
+    user_details_id: int,
+    type: str,
+    outbox: t.List[dict] = None,
 ):
     if type not in ("follow", "unfollow"):
         return JSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST,
             content="invalid follow request type",
         )
-    db.query(ProposalFollower).filter(
-        ProposalFollower.proposal_id == proposal_id
-    ).filter(ProposalFollower.user_details_id == user_details_id).delete()
+    deleted = (
+        db.query(ProposalFollower)
+        .filter(ProposalFollower.proposal_id == proposal_id)
+        .filter(ProposalFollower.user_details_id == user_details_id)
+        .delete()
+    )
+    increment_proposal_counters(
+        db, proposal_id, followers=int(type == "follow") - min(deleted, 1)
+    )
     if type == "follow":
         db_follow = ProposalFollower(
             proposal_id=proposal_id,
@@ -143,7 +178,9 @@ def set_followers_by_proposal_id(
         )
         db.add(db_follow)
 
+    add_outbox_events(db, outbox or [])
     db.commit()
+    invalidate_response_cache(f"proposal_{proposal_id}")
     return get_followers_by_proposal_id(db, proposal_id)
 
 
@@ -192,6 +229,7 @@ def add_reference_by_proposal_id(
     )
     db.add(db_reference)
     db.commit()
+    invalidate_response_cache(f"proposal_{proposal_id}")
     db.refresh(db_reference)
     return db_reference
 
@@ -252,7 +290,10 @@ def get_comment_by_id(db: Session, id: int):
 
 
 def add_commment_by_proposal_id(
-    db: Session, proposal_id: int, comment: CreateOrUpdateComment
+    db: Session,
+    proposal_id: int,
+    comment: CreateOrUpdateComment,
+    outbox: t.List[dict] = None,
 ):
     db_comment = Comment(
         proposal_id=proposal_id,
@@ -261,6 +302,9 @@ def add_commment_by_proposal_id(
         comment=comment.comment,
     )
     db.add(db_comment)
+    increment_proposal_counters(db, proposal_id, comments=1)
+    add_outbox_events(db, outbox or [])
+    # the async route invalidates the cached proposal after this commits
     db.commit()
     db.refresh(db_comment)
     return db_comment
@@ -276,6 +320,11 @@ def delete_comment_by_comment_id(
         )
     comment = get_comment_by_id(db, comment_id)
     db.delete(db_comment)
+    increment_proposal_counters(db, db_comment.proposal_id, comments=-1)
+    db.query(ProposalCommentCounter).filter(
+        ProposalCommentCounter.comment_id == comment_id
+    ).delete()
+    # the async route invalidates the cached proposal after this commits
     db.commit()
     return comment
 
@@ -290,6 +339,7 @@ def add_addendum_by_proposal_id(
     user_details_id: int,
     proposal_id: int,
     addendum: CreateOrUpdateAddendum,
+    outbox: t.List[dict] = None,
 ):
     db_proposal = get_basic_proposal_by_id(db, proposal_id)
     if not db_proposal or db_proposal.user_details_id != user_details_id:
@@ -300,62 +350,214 @@ def add_addendum_by_proposal_id(
         proposal_id=proposal_id, name=addendum.name, content=addendum.content
     )
     db.add(db_addendum)
+    add_outbox_events(db, outbox or [])
     db.commit()
+    invalidate_response_cache(f"proposal_{proposal_id}")
     db.refresh(db_addendum)
     return db_addendum
 
 
+def _group_likes(db_likes, key: str):
+    # builds {key_id: {"likes": [...], "dislikes": [...]}} from like rows
+    grouped = {}
+    for db_like in db_likes:
+        entry = grouped.setdefault(
+            getattr(db_like, key), {"likes": [], "dislikes": []}
+        )
+        if db_like.liked:
+            entry["likes"].append(db_like.user_details_id)
+        elif db_like.liked == False:
+            entry["dislikes"].append(db_like.user_details_id)
+    return grouped
+
+
+def get_proposals_by_ids(db: Session, ids: t.List[int]):
+    # hydrates all requested proposals with a fixed number of set based queries
+    # independent of the number of proposals, comments or references
+    ids = list(dict.fromkeys(ids))
+    if len(ids) == 0:
+        return []
+    db_proposals = {
+        db_proposal.id: db_proposal
+        for db_proposal in db.query(Proposal).filter(Proposal.id.in_(ids)).all()
+    }
+    if len(db_proposals) == 0:
+        return []
+    proposal_ids = list(db_proposals.keys())
+
+    # references
+    references = {}
+    for db_reference in (
+        db.query(ProposalReference)
+        .filter(ProposalReference.referring_proposal_id.in_(proposal_ids))
+        .all()
+    ):
+        references.setdefault(db_reference.referring_proposal_id, []).append(
+            db_reference.referred_proposal_id
+        )
+    referred_ids = set(
+        reference for reference_list in references.values() for reference in reference_list
+    ) - set(proposal_ids)
+    referred_proposals = dict(db_proposals)
+    if len(referred_ids):
+        for db_proposal in (
+            db.query(Proposal).filter(Proposal.id.in_(list(referred_ids))).all()
+        ):
+            referred_proposals[db_proposal.id] = db_proposal
+
+    # likes and followers
+    likes = _group_likes(
+        db.query(ProposalLike)
+        .filter(ProposalLike.proposal_id.in_(list(referred_proposals.keys())))
+        .all(),
+        "proposal_id",
+    )
+    followers = {}
+    for db_follower in (
+        db.query(ProposalFollower)
+        .filter(ProposalFollower.proposal_id.in_(proposal_ids))
+        .all()
+    ):
+        followers.setdefault(db_follower.proposal_id, []).append(
+            db_follower.user_details_id
+        )
+
+    # comments
+    db_comments = (
+        db.query(Comment, UserDetails.name, UserDetails.profile_img_url)
+        .filter(Comment.proposal_id.in_(proposal_ids))
+        .join(UserDetails, Comment.user_details_id == UserDetails.id)
+        .all()
+    )
+    comment_likes = {}
+    if len(db_comments):
+        comment_likes = _group_likes(
+            db.query(ProposalCommentLike)
+            .filter(
+                ProposalCommentLike.comment_id.in_(
+                    list(map(lambda x: x[0].id, db_comments))
+                )
+            )
+            .all(),
+            "comment_id",
+        )
+    comments = {}
+    for comment in db_comments:
+        comment_like = comment_likes.get(comment[0].id, {"likes": [], "dislikes": []})
+        comments.setdefault(comment[0].proposal_id, []).append(
+            CommentSchema(
+                id=comment[0].id,
+                proposal_id=comment[0].proposal_id,
+                date=comment[0].date,
+                user_details_id=comment[0].user_details_id,
+                parent=comment[0].parent,
+                comment=comment[0].comment,
+                profile_img_url=comment[2],
+                alias=comment[1],
+                likes=comment_like["likes"],
+                dislikes=comment_like["dislikes"],
+            )
+        )
+
+    # addendums
+    addendums = {}
+    for db_addendum in (
+        db.query(Addendum).filter(Addendum.proposal_id.in_(proposal_ids)).all()
+    ):
+        addendums.setdefault(db_addendum.proposal_id, []).append(db_addendum)
+
+    # authors
+    author_ids = list(set(map(lambda x: x.user_details_id, db_proposals.values())))
+    user_details = {
+        db_user_details.id: db_user_details
+        for db_user_details in db.query(UserDetails)
+        .filter(UserDetails.id.in_(author_ids))
+        .all()
+    }
+    user_followers = {}
+    for db_user_follower in (
+        db.query(UserFollower).filter(UserFollower.followee_id.in_(author_ids)).all()
+    ):
+        user_followers.setdefault(db_user_follower.followee_id, []).append(
+            db_user_follower.follower_id
+        )
+    created = get_proposals_created_by_user_details_ids(db, author_ids)
+
+    proposals = []
+    for id in ids:
+        if id not in db_proposals:
+            continue
+        db_proposal = db_proposals[id]
+        proposal_likes = likes.get(id, {"likes": [], "dislikes": []})
+        proposal_references = references.get(id, [])
+        references_meta = []
+        for reference in proposal_references:
+            db_reference = referred_proposals.get(reference)
+            if not db_reference:
+                continue
+            reference_likes = likes.get(reference, {"likes": [], "dislikes": []})
+            references_meta.append(
+                ProposalReferenceSchema(
+                    id=db_reference.id,
+                    name=db_reference.name,
+                    img=db_reference.image_url,
+                    likes=reference_likes["likes"],
+                    dislikes=reference_likes["dislikes"],
+                    status=db_reference.status,
+                    is_proposal=db_reference.is_proposal,
+                )
+            )
+        tags = db_proposal.tags["tags_list"] if "tags_list" in db_proposal.tags else []
+        attachments = (
+            db_proposal.attachments["attachments_list"]
+            if "attachments_list" in db_proposal.attachments
+            else []
+        )
+        actions = (
+            db_proposal.actions["actions_list"]
+            if "actions_list" in db_proposal.actions
+            else []
+        )
+        author = user_details[db_proposal.user_details_id]
+        proposals.append(
+            ProposalSchema(
+                id=db_proposal.id,
+                dao_id=db_proposal.dao_id,
+                user_details_id=db_proposal.user_details_id,
+                name=db_proposal.name,
+                image_url=db_proposal.image_url,
+                category=db_proposal.category,
+                content=db_proposal.content,
+                voting_system=db_proposal.voting_system,
+                references=proposal_references,
+                references_meta=references_meta,
+                actions=actions,
+                comments=comments.get(id, []),
+                likes=proposal_likes["likes"],
+                dislikes=proposal_likes["dislikes"],
+                followers=followers.get(id, []),
+                tags=tags,
+                attachments=attachments,
+                addendums=addendums.get(id, []),
+                date=db_proposal.date,
+                status=db_proposal.status,
+                is_proposal=db_proposal.is_proposal,
+                profile_img_url=author.profile_img_url,
+                alias=author.name,
+                user_followers=user_followers.get(author.id, []),
+                created=created.get(author.id, 0),
+            )
+        )
+    return proposals
+
+
 def get_proposal_by_id(db: Session, id: int):
-    db_proposal = db.query(Proposal).filter(Proposal.id == id).first()
-    if not db_proposal:
+    proposals = get_proposals_by_ids(db, [id])
+    if len(proposals) == 0:
         return JSONResponse(
             status_code=status.HTTP_404_NOT_FOUND, content="proposal not found"
         )
-    likes = get_likes_by_proposal_id(db, id)
-    followers = get_followers_by_proposal_id(db, id)
-    references = get_references_by_proposal_id(db, id)
-    comments = get_comments_by_proposal_id(db, id)
-    addendums = get_addendums_by_proposal_id(db, id)
-    tags = db_proposal.tags["tags_list"] if "tags_list" in db_proposal.tags else []
-    attachments = (
-        db_proposal.attachments["attachments_list"]
-        if "attachments_list" in db_proposal.attachments
-        else []
-    )
-    actions = (
-        db_proposal.actions["actions_list"]
-        if "actions_list" in db_proposal.actions
-        else []
-    )
-    user_details = get_user_details_by_id(db, db_proposal.user_details_id)
-    proposal = ProposalSchema(
-        id=db_proposal.id,
-        dao_id=db_proposal.dao_id,
-        user_details_id=db_proposal.user_details_id,
-        name=db_proposal.name,
-        image_url=db_proposal.image_url,
-        category=db_proposal.category,
-        content=db_proposal.content,
-        voting_system=db_proposal.voting_system,
-        references=references["references"],
-        references_meta=references["references_meta"],
-        actions=actions,
-        comments=comments,
-        likes=likes["likes"],
-        dislikes=likes["dislikes"],
-        followers=followers["followers"],
-        tags=tags,
-        attachments=attachments,
-        addendums=addendums,
-        date=db_proposal.date,
-        status=db_proposal.status,
-        is_proposal=db_proposal.is_proposal,
-        profile_img_url=user_details.profile_img_url,
-        alias=user_details.name,
-        user_followers=get_followers_by_user_id(db, user_details.id)["followers"],
-        created=len(get_proposals_by_user_id(db, user_details.id)),
-    )
-    return proposal
+    return proposals[0]
 
 
 def get_proposal_by_slug(db: Session, slug: str):
@@ -370,12 +572,92 @@ def get_proposal_by_slug(db: Session, slug: str):
 
 
 def get_proposals_by_dao_id(db: Session, dao_id: int):
-    db_proposals = db.query(Proposal).filter(Proposal.dao_id == dao_id).all()
-    proposals = list(map(lambda x: get_proposal_by_id(db, x.id), db_proposals))
-    return proposals
+    db_proposals = db.query(Proposal.id).filter(Proposal.dao_id == dao_id).all()
+    return get_proposals_by_ids(db, list(map(lambda x: x.id, db_proposals)))
+
+
+def get_proposals_by_user_details_id(db: Session, user_details_id: int):
+    db_proposals = (
+        db.query(Proposal.id).filter(Proposal.user_details_id == user_details_id).all()
+    )
+    return get_proposals_by_ids(db, list(map(lambda x: x.id, db_proposals)))
+
 
+def encode_proposal_cursor(date: datetime.datetime, id: int):
+    return base64.urlsafe_b64encode(f"{date.isoformat()},{id}".encode()).decode()
 
-def create_new_proposal(db: Session, proposal: CreateProposalSchema):
+
+def decode_proposal_cursor(cursor: str):
+    date, id = base64.urlsafe_b64decode(cursor.encode()).decode().split(",")
+    return datetime.datetime.fromisoformat(date), int(id)
+
+
+def get_proposal_summaries_by_dao_id(
+    db: Session, dao_id: int, cursor: t.Optional[str] = None, limit: int = 20
+):
+    # keyset pagination on (date, id) newest first, counts come from the
+    # maintained counter rows
+    query = (
+        db.query(
+            Proposal,
+            func.coalesce(ProposalCounter.likes, 0),
+            func.coalesce(ProposalCounter.dislikes, 0),
+            func.coalesce(ProposalCounter.comments, 0),
+            func.coalesce(ProposalCounter.followers, 0),
+            UserDetails.name,
+            UserDetails.profile_img_url,
+        )
+        .outerjoin(ProposalCounter, ProposalCounter.proposal_id == Proposal.id)
+        .outerjoin(UserDetails, UserDetails.id == Proposal.user_details_id)
+        .filter(Proposal.dao_id == dao_id)
+    )
+    if cursor:
+        try:
+            cursor_date, cursor_id = decode_proposal_cursor(cursor)
+        except Exception:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST, content="invalid cursor"
+            )
+        query = query.filter(
+            or_(
+                Proposal.date < cursor_date,
+                and_(Proposal.date == cursor_date, Proposal.id < cursor_id),
+            )
+        )
+    rows = (
+        query.order_by(Proposal.date.desc(), Proposal.id.desc()).limit(limit + 1).all()
+    )
+    proposals = list(
+        map(
+            lambda x: ProposalSummarySchema(
+                id=x[0].id,
+                dao_id=x[0].dao_id,
+                user_details_id=x[0].user_details_id,
+                name=x[0].name,
+                image_url=x[0].image_url,
+                category=x[0].category,
+                date=x[0].date,
+                status=x[0].status,
+                is_proposal=x[0].is_proposal,
+                likes=x[1],
+                dislikes=x[2],
+                comments=x[3],
+                followers=x[4],
+                alias=x[5],
+                profile_img_url=x[6],
+            ),
+            rows[:limit],
+        )
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_proposal_cursor(proposals[-1].date, proposals[-1].id)
+    return {"proposals": proposals, "next_cursor": next_cursor}
+
+
+def create_new_proposal(
+    db: Session, proposal: CreateProposalSchema, outbox: t.List[dict] = None
+):
     db_proposal = Proposal(
         dao_id=proposal.dao_id,
         user_details_id=proposal.user_details_id,
@@ -391,16 +673,27 @@ def create_new_proposal(db: Session, proposal: CreateProposalSchema):
         is_proposal=proposal.is_proposal,
     )
     db.add(db_proposal)
+    increment_user_details_counters(db, proposal.user_details_id, proposals_created=1)
+    add_outbox_events(db, outbox or [])
     db.commit()
     db.refresh(db_proposal)
     create_proposal_references(db, db_proposal.id, proposal.references)
+    # the author's proposal count shows on their other proposals
+    invalidate_response_cache(
+        f"dao_proposals_{proposal.dao_id}", f"user_details_{proposal.user_details_id}"
+    )
     return get_proposal_by_id(db, db_proposal.id)
 
 
 def create_proposal_references(db: Session, id: int, references: t.List[int]):
+    existing = set(
+        map(
+            lambda x: x.id,
+            db.query(Proposal.id).filter(Proposal.id.in_(references)).all(),
+        )
+    )
     for reference in references:
-        temp_proposal = get_proposal_by_id(db, reference)
-        if type(temp_proposal) != JSONResponse and id != reference:
+        if reference in existing and id != reference:
             proposal_reference = ProposalReference(
                 referred_proposal_id=reference, referring_proposal_id=id
             )
@@ -410,7 +703,11 @@ def create_proposal_references(db: Session, id: int, references: t.List[int]):
 
 
 def edit_proposal_basic_by_id(
-    db: Session, user_details_id: int, id: int, proposal: UpdateProposalBasicSchema
+    db: Session,
+    user_details_id: int,
+    id: int,
+    proposal: UpdateProposalBasicSchema,
+    outbox: t.List[dict] = None,
 ):
     db_proposal = db.query(Proposal).filter(Proposal.id == id).first()
     if not db_proposal:
@@ -442,16 +739,16 @@ def edit_proposal_basic_by_id(
         setattr(db_proposal, key, value)
 
     db.add(db_proposal)
+    add_outbox_events(db, outbox or [])
     db.commit()
+    invalidate_response_cache(f"proposal_{id}")
     return get_proposal_by_id(db, id)
 
 
 def delete_proposal_by_id(db: Session, id: int):
     proposal = get_proposal_by_id(db, id)
-    if not proposal:
-        return JSONResponse(
-            status_code=status.HTTP_404_NOT_FOUND, content="proposal not found"
-        )
+    if type(proposal) == JSONResponse:
+        return proposal
     # delete stuff
     db.query(ProposalReference).filter(
         or_(
@@ -462,7 +759,21 @@ def delete_proposal_by_id(db: Session, id: int):
     db.query(ProposalFollower).filter(ProposalFollower.proposal_id == id).delete()
     db.query(ProposalLike).filter(ProposalLike.proposal_id == id).delete()
     db.query(Addendum).filter(Addendum.proposal_id == id).delete()
+    comment_ids = db.query(Comment.id).filter(Comment.proposal_id == id)
+    db.query(ProposalCommentLike).filter(
+        ProposalCommentLike.comment_id.in_(comment_ids)
+    ).delete(synchronize_session=False)
+    db.query(ProposalCommentCounter).filter(
+        ProposalCommentCounter.comment_id.in_(comment_ids)
+    ).delete(synchronize_session=False)
     db.query(Comment).filter(Comment.proposal_id == id).delete()
     db.query(Proposal).filter(Proposal.id == id).delete()
+    db.query(ProposalCounter).filter(ProposalCounter.proposal_id == id).delete()
+    increment_user_details_counters(db, proposal.user_details_id, proposals_created=-1)
     db.commit()
+    invalidate_response_cache(
+        f"proposal_{id}",
+        f"dao_proposals_{proposal.dao_id}",
+        f"user_details_{proposal.user_details_id}",
+    )
     return proposal
@@ -4,6 +4,7 @@ from fastapi import status
 from sqlalchemy.orm import Session
 from starlette.responses import JSONResponse
 
+from cache.response_cache import invalidate_response_cache
 from db.models import quotes as models
 from db.schemas import quote as schemas
 
@@ -34,6 +35,7 @@ def create_quote(db: Session, quote: schemas.CreateAndUpdateQuote):
     )
     db.add(db_quote)
     db.commit()
+    invalidate_response_cache("quotes")
     db.refresh(db_quote)
     return db_quote
 
@@ -45,6 +47,7 @@ def delete_quote(db: Session, id: int):
                             content="quote not found")
     db.delete(quote)
     db.commit()
+    invalidate_response_cache("quotes")
     return quote
 
 
@@ -62,5 +65,6 @@ def edit_quote(
 
     db.add(db_quote)
     db.commit()
+    invalidate_response_cache("quotes")
     db.refresh(db_quote)
     return db_quote
@@ -1,3 +1,5 @@
+import datetime
+
 from fastapi import status
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import or_
@@ -9,6 +11,7 @@ from db.models.dao import Dao
 from db.models.proposals import Proposal
 from db.schemas import users as schemas
 from core.security import get_password_hash
+from db.crud.counters import get_proposals_created_by_user_details_id
 from util.util import generate_slug
 
 
@@ -171,14 +174,18 @@ def get_dao_users(db: Session, dao_id: int) -> t.List[schemas.UserDetails]:
                 following=follower_data["following"],
                 social_links=user.social_links,
                 address=address,
-                created=len(get_proposals_by_user_id(db, user.id)),
+                created=get_proposals_created_by_user_details_id(db, user.id),
             )
         )
     return all_dao_users
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(
+    db: Session, user: schemas.UserCreate, hashed_password: t.Optional[str] = None
+):
+    # async callers hash on the password executor and pass the result in
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(
         alias=user.alias,
         is_active=user.is_active,
@@ -199,7 +206,12 @@ def create_user(db: Session, user: schemas.UserCreate):
     return db_user
 
 
-def edit_user(db: Session, id: int, user: schemas.UserEdit) -> schemas.User:
+def edit_user(
+    db: Session,
+    id: int,
+    user: schemas.UserEdit,
+    hashed_password: t.Optional[str] = None,
+) -> schemas.User:
 
     db_user = get_user(db, id)
     if not db_user:
@@ -209,7 +221,9 @@ def edit_user(db: Session, id: int, user: schemas.UserEdit) -> schemas.User:
     update_data = user.dict(exclude_unset=True)
 
     if "password" in update_data:
-        update_data["hashed_password"] = get_password_hash(user.password)
+        update_data["hashed_password"] = hashed_password or get_password_hash(
+            user.password
+        )
         del update_data["password"]
 
     for key, value in update_data.items():
@@ -312,7 +326,7 @@ def get_user_profile(db: Session, user_id: int, dao_id: int):
         following=follower_data["following"],
         social_links=db_profile.social_links,
         address=get_primary_wallet_address_by_user_id(db, user_id),
-        created=len(get_proposals_by_user_id(db, db_profile.id)),
+        created=get_proposals_created_by_user_details_id(db, db_profile.id),
     )
 
 
@@ -460,15 +474,37 @@ def update_primary_address_for_user(db: Session, user_id: int, new_address: str)
     return get_user_address_config(db, user_id)
 
 
-def blacklist_token(db: Session, token: str):
-    db_token = models.JWTBlackList(token=token)
+def blacklist_token(db: Session, jti: str, expires: datetime.datetime):
+    db_token = models.JWTBlackList(jti=jti, expires_dtz=expires)
     db.add(db_token)
     db.commit()
     db.refresh(db_token)
     return db_token
 
 
-def get_blacklisted_token(db: Session, token: str):
+def get_blacklisted_token(db: Session, jti: str):
     return (
-        db.query(models.JWTBlackList).filter(models.JWTBlackList.token == token).first()
+        db.query(models.JWTBlackList).filter(models.JWTBlackList.jti == jti).first()
     )
+
+
+def get_blacklisted_token_ids(db: Session):
+    # tokens past their expiry are rejected by jwt.decode anyway
+    return list(
+        map(
+            lambda x: x[0],
+            db.query(models.JWTBlackList.jti)
+            .filter(models.JWTBlackList.expires_dtz > datetime.datetime.now(datetime.timezone.utc))
+            .all(),
+        )
+    )
+
+
+def prune_blacklisted_tokens(db: Session):
+    ret = (
+        db.query(models.JWTBlackList)
+        .filter(models.JWTBlackList.expires_dtz <= datetime.datetime.now(datetime.timezone.utc))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return ret
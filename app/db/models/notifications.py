@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, JSON
+from sqlalchemy.sql import false, func, text
 
 from db.session import Base
 
@@ -8,6 +8,22 @@ from db.session import Base
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # only unread rows, keeps the badge count cheap
+        Index(
+            "ix_notifications_unread",
+            "user_details_id",
+            postgresql_where=text("NOT is_read"),
+        ),
+        # open aggregates that new likes and follows are merged into
+        Index(
+            "ix_notifications_coalesce",
+            "user_details_id",
+            "proposal_id",
+            "group_key",
+            postgresql_where=text("group_key IS NOT NULL AND NOT is_read"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_details_id = Column(Integer)
@@ -21,4 +37,9 @@ class Notification(Base):
     additional_text = Column(String)
 
     date = Column(DateTime(timezone=True), server_default=func.now())
-    is_read: Column(Boolean)
+    is_read = Column(Boolean, nullable=False, default=False, server_default=false())
+
+    # set on notifications that coalesce, see coalesce_notifications
+    group_key = Column(String)
+    actor_count = Column(Integer, nullable=False, default=1, server_default="1")
+    actors = Column(JSON)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Boolean
+from sqlalchemy.sql import false, func
+
+from db.session import Base
+
+# OUTBOX
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_dtz = Column(DateTime(timezone=True), server_default=func.now())
+    # failed relay attempts, past the limit the event is dead and skipped
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(String)
+    dead = Column(Boolean, nullable=False, default=False, server_default=false())
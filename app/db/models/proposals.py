@@ -78,3 +78,21 @@ class ProposalReference(Base):
     id = Column(Integer, primary_key=True, index=True)
     referred_proposal_id = Column(Integer)
     referring_proposal_id = Column(Integer)
+
+
+class ProposalCounter(Base):
+    __tablename__ = "proposal_counters"
+
+    proposal_id = Column(Integer, primary_key=True)
+    likes = Column(Integer, nullable=False, default=0)
+    dislikes = Column(Integer, nullable=False, default=0)
+    followers = Column(Integer, nullable=False, default=0)
+    comments = Column(Integer, nullable=False, default=0)
+
+
+class ProposalCommentCounter(Base):
+    __tablename__ = "proposal_comments_counters"
+
+    comment_id = Column(Integer, primary_key=True)
+    likes = Column(Integer, nullable=False, default=0)
+    dislikes = Column(Integer, nullable=False, default=0)
@@ -60,5 +60,13 @@ class JWTBlackList(Base):
     __tablename__ = "jwt_blacklist"
 
     id = Column(Integer, primary_key=True, index=True)
-    token = Column(String, index=True, nullable=False)
+    jti = Column(String, unique=True, index=True, nullable=False)
+    expires_dtz = Column(DateTime(timezone=True), index=True, nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class UserDetailsCounter(Base):
+    __tablename__ = "user_details_counters"
+
+    user_details_id = Column(Integer, primary_key=True)
+    proposals_created = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,294 @@
+"""
+Monthly range partitions for the notifications and activity_log tables
+
+Both tables are partitioned on `date`, one partition per calendar month
+named <table>_YYYY_MM plus a <table>_default catching anything outside the
+created ranges. Retention drops whole partitions instead of deleting rows,
+and reads bounded to the retention window only touch recent partitions.
+
+convert an existing table once (postgres, takes an exclusive lock while the
+rows are copied), then keep future partitions created by running maintain
+periodically, which the api workers do on startup:
+    python -m db.partitions convert notifications activity_log
+    python -m db.partitions maintain
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import re
+import typing as t
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import Config, Network
+# registers the partitioned tables' models on Base.metadata
+from db.models import activity_log, notifications  # noqa: F401
+from db.session import AsyncSessionLocal, Base, SessionLocal, run_sync
+
+CFG = Config[Network]
+
+logger = logging.getLogger("paideia")
+
+# serializes maintenance between workers
+MAINTENANCE_LOCK_ID = 72310415
+
+# table -> months of data kept
+PARTITIONED_TABLES = {
+    "notifications": CFG.notification_retention_months,
+    "activity_log": CFG.activity_retention_months,
+}
+
+
+def month_start(date: datetime.datetime):
+    return datetime.datetime(date.year, date.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(month: datetime.datetime, months: int):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table: str, month: datetime.datetime):
+    return f"{table}_{month:%Y_%m}"
+
+
+def retention_cutoff(table: str, now: datetime.datetime = None):
+    # rows dated before this are expired, their partitions get dropped
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return add_months(month_start(now), -PARTITIONED_TABLES[table])
+
+
+def plan_partitions(
+    table: str,
+    existing: t.List[datetime.datetime],
+    months_ahead: int,
+    now: datetime.datetime = None,
+):
+    # (months to create, months to drop) given the existing partition months
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    current = month_start(now)
+    wanted = [add_months(current, months) for months in range(months_ahead + 1)]
+    create = [month for month in wanted if month not in existing]
+    # a partition is expired once its whole range is before the cutoff
+    cutoff = retention_cutoff(table, now)
+    drop = [month for month in existing if add_months(month, 1) <= cutoff]
+    return create, drop
+
+
+class PartitionManager:
+    """
+    Creates the partitions for the coming `months_ahead` months and drops
+    the ones past each table's retention. Tables that aren't partitioned
+    (yet, or on sqlite) are left alone.
+    """
+
+    def __init__(self, tables: dict = PARTITIONED_TABLES, months_ahead: int = 3):
+        self.tables = tables
+        self.months_ahead = months_ahead
+
+    def is_partitioned(self, db: Session, table: str):
+        if db.bind.dialect.name != "postgresql":
+            return False
+        kind = db.execute(
+            text("SELECT relkind FROM pg_class WHERE relname = :table"),
+            {"table": table},
+        ).scalar()
+        return kind == "p"
+
+    def partition_months(self, db: Session, table: str):
+        names = db.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = :table"
+            ),
+            {"table": table},
+        ).scalars()
+        months = []
+        for name in names:
+            match = re.fullmatch(rf"{table}_(\d{{4}})_(\d{{2}})", name)
+            if match:
+                months.append(
+                    datetime.datetime(
+                        int(match[1]), int(match[2]), 1, tzinfo=datetime.timezone.utc
+                    )
+                )
+        return months
+
+    def create_partition(self, db: Session, table: str, month: datetime.datetime):
+        name = partition_name(table, month)
+        bounds = {"lower": month, "upper": add_months(month, 1)}
+        create = text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES "
+            f"FROM ('{bounds['lower'].isoformat()}') "
+            f"TO ('{bounds['upper'].isoformat()}')"
+        )
+        default = f"{table}_default"
+        in_default = db.execute(
+            text(
+                f"SELECT to_regclass(:default) IS NOT NULL AND EXISTS ("
+                f"SELECT 1 FROM {table} WHERE tableoid = to_regclass(:default) "
+                "AND date >= :lower AND date < :upper)"
+            ),
+            dict(bounds, default=default),
+        ).scalar()
+        if not in_default:
+            db.execute(create)
+            return
+        # the new range can't be created while the default partition holds
+        # rows for it (future dated ones), move them over while it's detached
+        db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+        db.execute(create)
+        db.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {default} "
+                "WHERE date >= :lower AND date < :upper RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ),
+            bounds,
+        )
+        db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+    def maintain(self, db: Session, now: datetime.datetime = None):
+        ret = {}
+        if db.bind.dialect.name != "postgresql":
+            return ret
+        db.execute(text(f"SELECT pg_advisory_xact_lock({MAINTENANCE_LOCK_ID})"))
+        for table in self.tables:
+            if not self.is_partitioned(db, table):
+                continue
+            create, drop = plan_partitions(
+                table, self.partition_months(db, table), self.months_ahead, now
+            )
+            # a table that fails is rolled back alone, the others still run
+            savepoint = db.begin_nested()
+            try:
+                for month in create:
+                    self.create_partition(db, table, month)
+                for month in drop:
+                    # retention in O(1), no row by row delete and no vacuum debt
+                    db.execute(text(f"DROP TABLE {partition_name(table, month)}"))
+                savepoint.commit()
+            except Exception as e:
+                savepoint.rollback()
+                logger.error(f"partition maintenance for {table} failed: {str(e)}")
+                ret[table] = {"created": [], "dropped": [], "error": str(e)}
+                continue
+            ret[table] = {
+                "created": [partition_name(table, month) for month in create],
+                "dropped": [partition_name(table, month) for month in drop],
+            }
+        db.commit()
+        return ret
+
+    def convert(self, db: Session, table: str, now: datetime.datetime = None):
+        # one time migration of a plain table to a partitioned one
+        if self.is_partitioned(db, table):
+            return False
+        old = f"{table}_unpartitioned"
+        # views bind to the renamed table, recreate them on the new one
+        views = db.execute(
+            text(
+                "SELECT DISTINCT dependent.relname, pg_get_viewdef(dependent.oid) "
+                "FROM pg_depend "
+                "JOIN pg_rewrite ON pg_rewrite.oid = pg_depend.objid "
+                "JOIN pg_class dependent ON dependent.oid = pg_rewrite.ev_class "
+                "WHERE pg_depend.refobjid = CAST(:table AS regclass) "
+                "AND dependent.relname <> :table"
+            ),
+            {"table": table},
+        ).all()
+        for name, _ in views:
+            db.execute(text(f"DROP VIEW {name}"))
+        sequence = db.execute(
+            text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}
+        ).scalar()
+        first = db.execute(text(f"SELECT min(date) FROM {table}")).scalar()
+        # recreated on the new table once the old one is gone. unique ones
+        # can't be, they would have to include date like the primary key
+        indexes = db.execute(
+            text(
+                "SELECT index.relname, pg_get_indexdef(pg_index.indexrelid) "
+                "FROM pg_index "
+                "JOIN pg_class index ON index.oid = pg_index.indexrelid "
+                "WHERE pg_index.indrelid = CAST(:table AS regclass) "
+                "AND NOT pg_index.indisunique"
+            ),
+            {"table": table},
+        ).all()
+        foreign_keys = db.execute(
+            text(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'"
+            ),
+            {"table": table},
+        ).all()
+
+        db.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+        db.execute(
+            text(
+                f"CREATE TABLE {table} (LIKE {old} INCLUDING ALL EXCLUDING INDEXES) "
+                "PARTITION BY RANGE (date)"
+            )
+        )
+        # the partition key has to be part of the primary key
+        db.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, date)"))
+        # newest rows per user for the notification and activity feeds
+        db.execute(text(f"CREATE INDEX ON {table} (user_details_id, date DESC)"))
+        db.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+        current = month_start(now or datetime.datetime.now(datetime.timezone.utc))
+        month = month_start(first) if first else current
+        while month <= add_months(current, self.months_ahead):
+            self.create_partition(db, table, month)
+            month = add_months(month, 1)
+        db.execute(text(f"INSERT INTO {table} SELECT * FROM {old}"))
+        if sequence:
+            db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+        db.execute(text(f"DROP TABLE {old}"))
+        for _, definition in indexes:
+            db.execute(text(definition))
+        for name, definition in foreign_keys:
+            db.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"))
+        # and the model's indexes that weren't applied to the old table yet
+        copied = [name for name, _ in indexes]
+        for index in Base.metadata.tables[table].indexes:
+            if index.name not in copied and not index.unique:
+                index.create(db.connection())
+        for name, definition in views:
+            db.execute(text(f"CREATE VIEW {name} AS {definition}"))
+        db.commit()
+        return True
+
+    async def maintain_periodically(self, interval: int):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    ret = await run_sync(db, self.maintain)
+                if any(c["created"] or c["dropped"] for c in ret.values()):
+                    logger.info(f"partition maintenance: {ret}")
+            except Exception as e:
+                logger.warning(f"partition maintenance failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+
+partitions = PartitionManager(PARTITIONED_TABLES, CFG.partition_months_ahead)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["convert", "maintain"])
+    parser.add_argument("tables", nargs="*", default=list(PARTITIONED_TABLES))
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        if args.command == "convert":
+            for table in args.tables:
+                converted = partitions.convert(db, table)
+                print(f"{table}: {'converted' if converted else 'already partitioned'}")
+        else:
+            print(partitions.maintain(db))
+    finally:
+        db.close()
@@ -12,6 +12,11 @@ class NotificationConstants:
     COMMENTED_ON_DISCUSSION = "commented on the discussion"
 
 
+class NotificationActor(BaseModel):
+    user_details_id: int
+    name: t.Optional[str]
+
+
 class CreateAndUpdateNotification(BaseModel):
     user_details_id: int
     img: t.Optional[str]
@@ -21,6 +26,11 @@ class CreateAndUpdateNotification(BaseModel):
     href: t.Optional[str]
     additional_text: t.Optional[str]
     is_read: bool = False
+    # notifications with the same recipient, proposal and group_key are
+    # merged into one, actors holds a sample of who did it
+    group_key: t.Optional[str]
+    actor_count: int = 1
+    actors: t.Optional[t.List[NotificationActor]]
 
 
 class Notification(CreateAndUpdateNotification):
@@ -29,3 +39,14 @@ class Notification(CreateAndUpdateNotification):
 
     class Config:
         orm_mode = True
+
+
+class MarkNotificationsRead(BaseModel):
+    user_details_id: int
+    # all of the user's notifications when left out
+    ids: t.Optional[t.List[int]]
+
+
+class UnreadNotifications(BaseModel):
+    user_details_id: int
+    unread: int
@@ -78,6 +78,32 @@ class Proposal(CreateOrUpdateProposal):
         orm_mode = True
 
 
+class ProposalSummary(BaseModel):
+    id: int
+    dao_id: int
+    user_details_id: int
+    name: str
+    image_url: t.Optional[str]
+    category: t.Optional[str]
+    date: datetime.datetime
+    status: t.Optional[str]
+    is_proposal: bool
+    likes: int
+    dislikes: int
+    comments: int
+    followers: int
+    alias: t.Optional[str]
+    profile_img_url: t.Optional[str]
+
+    class Config:
+        orm_mode = True
+
+
+class ProposalSummaryPage(BaseModel):
+    proposals: t.List[ProposalSummary]
+    next_cursor: t.Optional[str]  # pass back as cursor to fetch the next page
+
+
 class LikeProposalRequest(BaseModel):
     user_details_id: int
     type: str
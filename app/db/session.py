@@ -1,14 +1,47 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from config import Config, Network  # api specific config
+from db.pool import TimedAsyncAdaptedQueuePool, TimedQueuePool
 
 CFG = Config[Network]
 
-engine = create_engine(CFG.connection_string)
+POOL_OPTIONS = {
+    "pool_size": CFG.db_pool_size,
+    "max_overflow": CFG.db_max_overflow,
+    "pool_timeout": CFG.db_pool_timeout,
+    "pool_recycle": CFG.db_pool_recycle,
+    "pool_pre_ping": CFG.db_pool_pre_ping,
+}
+
+engine = create_engine(
+    CFG.connection_string,
+    poolclass=TimedQueuePool,
+    connect_args={"options": f"-c statement_timeout={CFG.db_statement_timeout}"},
+    **POOL_OPTIONS,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# asyncpg backed engine for async routes, objects stay readable after commit
+# since lazy loads can't run outside of the session's greenlet
+async_engine = create_async_engine(
+    CFG.async_connection_string,
+    poolclass=TimedAsyncAdaptedQueuePool,
+    connect_args={
+        "server_settings": {"statement_timeout": str(CFG.db_statement_timeout)}
+    },
+    **POOL_OPTIONS,
+)
+AsyncSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine,
+    class_=AsyncSession,
+)
+
 Base = declarative_base()
 
 
@@ -21,3 +54,22 @@ def get_db():
         db.rollback()
     finally:
         db.close()
+
+
+# Dependency for async routes
+async def get_async_db():
+    db = AsyncSessionLocal()
+    try:
+        yield db
+    except:
+        await db.rollback()
+    finally:
+        await db.close()
+
+
+async def run_sync(db, fn, *args, **kwargs):
+    # runs sync orm code against either session type, on an AsyncSession the
+    # database io is awaited on the asyncpg driver instead of blocking the loop
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return fn(db, *args, **kwargs)
@@ -1,9 +1,13 @@
+import asyncio
+import logging
 import uvicorn
-import databases
+
+from core.lazy import clients, startup_timings
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
+
+startup_timings.mark("import_fastapi")
 
 from api.users import users_router
 from api.auth import auth_router
@@ -17,16 +21,20 @@ from api.blogs import blogs_router
 from api.faq import faq_router
 from api.quotes import quotes_router
 
+startup_timings.mark("import_routers")
 
-from config import Config, Network
 
+from cache.redis_client import asyncRedisClient
+from config import Config, Network
+from core.revocation import revocations
+from db.partitions import partitions
+from db.session import async_engine
+from outbox.relay import outbox_relay
+from websocket.connection_manager import connection_manager
 
 CFG = Config[Network]
-DATABASE_URL = CFG.connection_string
-
 
-database = databases.Database(DATABASE_URL)
-Base: DeclarativeMeta = declarative_base()
+logger = logging.getLogger("paideia")
 
 
 app = FastAPI(title="paideia-api", docs_url="/api/docs", openapi_url="/api")
@@ -34,12 +42,32 @@ app = FastAPI(title="paideia-api", docs_url="/api/docs", openapi_url="/api")
 
 @app.on_event("startup")
 async def startup():
-    await database.connect()
+    startup_timings.mark("server_start")
+    # optional, trades startup time for first request latency
+    await asyncio.get_running_loop().run_in_executor(
+        None, clients.warm_up, CFG.warm_up_clients
+    )
+    startup_timings.mark("warm_up")
+    app.state.revocation_prune = asyncio.create_task(
+        revocations.prune_periodically(CFG.jwt_revocation_prune_interval)
+    )
+    app.state.partition_maintenance = asyncio.create_task(
+        partitions.maintain_periodically(CFG.partition_maintenance_interval)
+    )
+    await connection_manager.broker.start()
+    if CFG.outbox_relay_in_process:
+        await outbox_relay.start()
+    logger.info(f"startup timings: {startup_timings.report()}")
 
 
 @app.on_event("shutdown")
 async def shutdown():
-    await database.disconnect()
+    app.state.revocation_prune.cancel()
+    app.state.partition_maintenance.cancel()
+    await outbox_relay.stop()
+    await connection_manager.broker.stop()
+    await async_engine.dispose()
+    await asyncRedisClient.aclose()
 
 
 # origins = ["*"]
@@ -83,6 +111,8 @@ app.include_router(faq_router, prefix="/api/faq", tags=["faq"])
 app.include_router(quotes_router, prefix="/api/quotes", tags=["quotes"])
 app.include_router(util_router, prefix="/api/util", tags=["util"])
 
+startup_timings.mark("create_app")
+
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", reload=True, port=8000)
@@ -0,0 +1,259 @@
+"""
+Outbox relay
+
+Carries out the side effects the proposal mutations left in the outbox table
+(see db/crud/outbox.py): activity rows and notifications are inserted in
+bulk, likes and follows coalesced into existing notifications, and the
+outbox rows deleted in one transaction, then the new and updated
+notifications are pushed to their users' sockets. Runs inside each api
+worker by default, or on its own so side effects scale apart from the api:
+    python -m outbox.relay --batch-size 500
+
+relays lock the rows they claim with SKIP LOCKED, any number can run at once.
+
+this is also the side effect dispatcher for sync routes in the threadpool:
+they commit their events with the change and call the thread safe `wake`,
+and the relay task on the server loop runs them in batches after the
+response went out. the outbox table is the queue, so unlike an in-memory
+one nothing queued is lost with the worker.
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+from cache.notification_counters import acount_new_unread
+from config import Config, Network
+from db.crud.activity_log import activity_row, create_user_activities
+from db.crud.notifications import coalesce_notifications
+from db.crud.outbox import (
+    claim_outbox_events,
+    delete_outbox_events,
+    record_outbox_failure,
+)
+from db.schemas.activity import CreateOrUpdateActivity
+from db.schemas.notifications import CreateAndUpdateNotification, Notification
+from db.session import AsyncSessionLocal, run_sync
+from websocket.notification_stream import notification_stream
+
+CFG = Config[Network]
+
+logger = logging.getLogger("paideia")
+
+
+def _relay_events(db, events):
+    activities = []
+    notifications = []
+    for event in events:
+        payload = event.payload
+        date = datetime.datetime.fromisoformat(payload["date"])
+        if event.kind == "activity":
+            activities.append(
+                activity_row(
+                    payload["user_details_id"],
+                    CreateOrUpdateActivity(**payload["activity"]),
+                    date,
+                )
+            )
+        elif event.kind == "notification":
+            notifications.append(
+                (CreateAndUpdateNotification(**payload["notification"]), date)
+            )
+        else:
+            raise ValueError(f"unknown outbox event kind {event.kind}")
+    create_user_activities(db, activities)
+    # likes and follows on a proposal update one notification in place
+    created, updated = coalesce_notifications(db, notifications)
+    return {
+        "activities": len(activities),
+        "notifications": len(notifications),
+        "created": created,
+        "updated": updated,
+    }
+
+
+class OutboxRelay:
+    """
+    Drains the outbox in batches of `batch_size`, polling every
+    `poll_interval` seconds when idle. `wake` is thread safe and lets a
+    worker's own commits be relayed without waiting for the next poll. An
+    event that fails is retried on the next batches and set aside as dead
+    after `max_attempts`, the rest of its batch still goes through.
+
+    Durability: `synchronous_commit=False` skips waiting on the WAL flush for
+    relay transactions (postgres only). A crash can then lose the last
+    commits, but the outbox rows come back with them and are relayed again.
+    `stop` relays what's left before the worker exits.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        batch_size: int = 200,
+        poll_interval: float = 0.5,
+        max_attempts: int = 5,
+        synchronous_commit: bool = True,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.synchronous_commit = synchronous_commit
+        self.loop = None
+        self.stats = {
+            "events": 0,
+            "activities": 0,
+            "notifications": 0,
+            "coalesced": 0,
+            "batches": 0,
+            "errors": 0,
+            "failed": 0,
+        }
+        self._wakeup = None
+        self._task = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self.loop.create_task(self.run())
+
+    async def stop(self, drain_timeout: float = 10.0):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # so nothing committed by this worker waits for the next relay
+            try:
+                await asyncio.wait_for(self._drain(), drain_timeout)
+            except Exception as e:
+                logger.warning(f"outbox drain on shutdown failed: {str(e)}")
+        self.loop = None
+
+    async def _drain(self):
+        while await self.drain_once() >= self.batch_size:
+            pass
+
+    def wake(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        while True:
+            try:
+                relayed = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"outbox relay: {str(e)}")
+                relayed = 0
+            if relayed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def drain_once(self):
+        # returns the number of outbox events carried out
+        db = self.session_factory()
+        try:
+            events = await run_sync(db, claim_outbox_events, self.batch_size)
+            if len(events) == 0:
+                await db.rollback()
+                return 0
+            relayed, failed = await run_sync(db, self._apply, events)
+            done = [event.id for event in events if event not in failed]
+            await run_sync(db, delete_outbox_events, done)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        finally:
+            await db.close()
+        await acount_new_unread(relayed["created"])
+        self.stats["events"] += len(done)
+        self.stats["activities"] += relayed["activities"]
+        self.stats["notifications"] += len(relayed["created"])
+        self.stats["coalesced"] += relayed["notifications"] - len(relayed["created"])
+        self.stats["failed"] += len(failed)
+        self.stats["batches"] += 1
+        # pushed after commit, a lost push is recovered by the client's resync.
+        # updated aggregates keep their id, clients replace them in place
+        for notification in relayed["created"] + relayed["updated"]:
+            await notification_stream.push(
+                notification.user_details_id,
+                jsonable_encoder(Notification.from_orm(notification)),
+            )
+        return len(done)
+
+    def _apply(self, db, events):
+        # the batch in one savepoint, event by event when that fails so a bad
+        # event (a payload that no longer validates, a failing insert) is
+        # recorded and skipped instead of blocking the whole outbox
+        if not self.synchronous_commit and db.bind.dialect.name == "postgresql":
+            db.execute(text("SET LOCAL synchronous_commit TO OFF"))
+        try:
+            with db.begin_nested():
+                return _relay_events(db, events), []
+        except Exception as e:
+            logger.warning(f"outbox batch failed, relaying one by one: {str(e)}")
+        relayed = {"activities": 0, "notifications": 0, "created": [], "updated": []}
+        failed = []
+        for event in events:
+            try:
+                with db.begin_nested():
+                    ret = _relay_events(db, [event])
+            except Exception as e:
+                logger.error(f"outbox event {event.id} failed: {str(e)}")
+                record_outbox_failure(db, event, str(e), self.max_attempts)
+                failed.append(event)
+                continue
+            for key, value in ret.items():
+                relayed[key] += value
+        return relayed, failed
+
+    def snapshot(self):
+        return dict(self.stats, pid=os.getpid(), running=self._task is not None)
+
+
+outbox_relay = OutboxRelay(
+    AsyncSessionLocal,
+    CFG.outbox_batch_size,
+    CFG.outbox_poll_interval,
+    CFG.outbox_max_attempts,
+    CFG.activity_synchronous_commit,
+)
+
+
+async def serve(args):
+    relay = OutboxRelay(
+        AsyncSessionLocal,
+        args.batch_size,
+        args.poll_interval,
+        CFG.outbox_max_attempts,
+        CFG.activity_synchronous_commit,
+    )
+    try:
+        await relay.run()
+    finally:
+        # pushes are batched by the websocket broker, send what's left
+        await notification_stream.manager.broker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=CFG.outbox_batch_size)
+    parser.add_argument(
+        "--poll-interval", type=float, default=CFG.outbox_poll_interval
+    )
+    asyncio.run(serve(parser.parse_args()))
@@ -1,3 +1,34 @@
 from dotenv import load_dotenv
 
 load_dotenv("test/.env.test")
+
+import fakeredis
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "postgres: needs a postgres database at TEST_POSTGRES_URL"
+    )
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    # in memory stand-in for the redis server
+    from cache.cache import cache
+    from core.revocation import revocations
+    from websocket.connection_manager import connection_manager
+    from websocket.notification_stream import notification_stream
+
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    aclient = fakeredis.FakeAsyncRedis(server=server)
+    monkeypatch.setattr(cache, "client", client)
+    monkeypatch.setattr(cache, "aclient", aclient)
+    monkeypatch.setattr(revocations, "client", client)
+    monkeypatch.setattr(revocations, "aclient", aclient)
+    monkeypatch.setattr(connection_manager.broker, "client", aclient)
+    monkeypatch.setattr(notification_stream, "client", aclient)
+    cache.local.clear()
+    revocations.rebuild([])
+    return client
@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import jwt
+import pytest
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from core import security
+from core.auth import authenticate_user, get_current_user, sign_up_new_user
+from core.revocation import migrate_legacy_blacklist, revocations
+from db.session import Base
+from db.models.users import User, ErgoAddress, JWTBlackList
+from db.crud.users import blacklist_token, edit_user, get_blacklisted_token_ids
+from db.schemas.users import UserEdit
+from cache.auth_cache import ainvalidate_user_principals, invalidate_principal
+from util.bloom import BloomFilter
+
+
+def make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[User.__table__, ErgoAddress.__table__, JWTBlackList.__table__],
+    )
+    session = sessionmaker(bind=engine)()
+    session.query_count = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_queries(*args):
+        session.query_count += 1
+
+    session.add(User(id=1, alias="9fpaideia", hashed_password="x"))
+    session.commit()
+    return session
+
+
+def make_token(alias="9fpaideia", minutes=5):
+    return security.create_access_token(
+        data={"sub": alias, "permissions": "user"},
+        expires_delta=datetime.timedelta(minutes=minutes),
+    )
+
+
+def token_payload(token):
+    return jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+
+
+@pytest.mark.asyncio
+async def test_current_user_is_cached_until_logout():
+    db = make_db()
+    token = make_token()
+    user = await get_current_user(db=db, token=token)
+    assert (user.id, user.alias) == (1, "9fpaideia")
+    db.query_count = 0
+    assert await get_current_user(db=db, token=token) == user
+    assert db.query_count == 0
+
+    payload = token_payload(token)
+    await revocations.revoke(db, payload["jti"], payload["exp"])
+    await invalidate_principal(token)
+    with pytest.raises(HTTPException):
+        await get_current_user(db=db, token=token)
+
+
+@pytest.mark.asyncio
+async def test_current_user_cache_follows_user_edits():
+    db = make_db()
+    token = make_token()
+    assert (await get_current_user(db=db, token=token)).is_superuser == False
+    edit_user(db, 1, UserEdit(alias="9fpaideia", is_superuser=True))
+    await ainvalidate_user_principals(1)
+    assert (await get_current_user(db=db, token=token)).is_superuser == True
+
+
+@pytest.mark.asyncio
+async def test_revocations_skip_storage_and_prune():
+    db = make_db()
+    other = make_token()
+    await get_current_user(db=db, token=other)
+    # revoked by another worker, known only to postgres
+    expired = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    blacklist_token(db, "expired", expired)
+    payload = token_payload(other)
+    blacklist_token(
+        db,
+        payload["jti"],
+        datetime.datetime.fromtimestamp(payload["exp"], tz=datetime.timezone.utc),
+    )
+    revocations.loaded = False
+
+    token = make_token()
+    db.query_count = 0
+    await get_current_user(db=db, token=token)
+    # loading the filter and the user, no revocation lookup for the token
+    assert db.query_count == 2
+    with pytest.raises(HTTPException):
+        await get_current_user(db=db, token=other)
+
+    assert revocations.prune(db) == 1
+    assert get_blacklisted_token_ids(db) == [payload["jti"]]
+    assert "expired" not in revocations.bloom
+
+
+def test_revocations_during_a_prune_are_kept(monkeypatch):
+    db = make_db()
+    revocations.rebuild([])
+
+    def snapshot(db):
+        jtis = get_blacklisted_token_ids(db)
+        # published by another worker after the snapshot was read
+        revocations.add("revoked_during_prune")
+        return jtis
+
+    monkeypatch.setattr("core.revocation.get_blacklisted_token_ids", snapshot)
+    revocations.prune(db)
+    assert "revoked_during_prune" in revocations.bloom
+    assert revocations._recorders == []
+
+
+@pytest.mark.asyncio
+async def test_failed_revocation_publish_is_retried(monkeypatch):
+    db = make_db()
+    published = []
+
+    async def publish(jti, exp):
+        if not published:
+            published.append(None)
+            raise RedisError("down")
+        published.append(jti)
+
+    monkeypatch.setattr("core.revocation.PUBLISH_RETRY_DELAYS", (0, 0))
+    monkeypatch.setattr(revocations, "_publish", publish)
+    payload = token_payload(make_token())
+    await revocations.revoke(db, payload["jti"], payload["exp"])
+    await asyncio.gather(*revocations._retries)
+    assert published == [None, payload["jti"]]
+
+
+def test_legacy_blacklist_is_migrated():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        # the table as it was before revocations were keyed by jti
+        conn.execute(
+            text(
+                "CREATE TABLE jwt_blacklist (id INTEGER PRIMARY KEY, token VARCHAR, "
+                "jti VARCHAR, expires_dtz DATETIME, timestamp DATETIME)"
+            )
+        )
+    db = sessionmaker(bind=engine)()
+    live, expired = make_token(), make_token(minutes=-5)
+    legacy = jwt.encode(
+        {"sub": "9fpaideia", "exp": token_payload(live)["exp"]},
+        security.SECRET_KEY,
+        algorithm=security.ALGORITHM,
+    )
+    for id, token in enumerate([live, expired, legacy, "garbage", live]):
+        db.execute(
+            text("INSERT INTO jwt_blacklist (id, token) VALUES (:id, :token)"),
+            {"id": id, "token": token},
+        )
+    db.commit()
+
+    assert migrate_legacy_blacklist(db) == {"migrated": 2, "dropped": 3}
+    assert sorted(get_blacklisted_token_ids(db)) == sorted(
+        [token_payload(live)["jti"], security.token_id({}, legacy)]
+    )
+    assert migrate_legacy_blacklist(db) == {"migrated": 0, "dropped": 0}
+
+
+def test_bloom_filter_error_rate():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"revoked_{i}")
+    assert all(f"revoked_{i}" in bloom for i in range(1000))
+    false_positives = sum(f"valid_{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+@pytest.mark.asyncio
+async def test_wallet_only_accounts_skip_bcrypt(mocker):
+    db = make_db()
+    hash_password = mocker.spy(security.pwd_context, "hash")
+    user = sign_up_new_user(
+        db, "9fwallet", security.ERGOAUTH_DEFAULT_PASSWORD, "9fwallet"
+    )
+    assert user.hashed_password == security.WALLET_ONLY_CREDENTIAL
+    assert hash_password.call_count == 0
+    assert await authenticate_user(db, "9fwallet", "__ergoauth_default") == False
+
+    hashed_password = await security.aget_password_hash("hunter2")
+    sign_up_new_user(db, "admin", "hunter2", hashed_password=hashed_password)
+    assert hash_password.call_count == 1
+    assert (await authenticate_user(db, "admin", "hunter2")).alias == "admin"
+    assert await authenticate_user(db, "admin", "hunter3") == False
@@ -0,0 +1,176 @@
+import datetime
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+import pytest
+
+from cache.cache import LocalCache, RedisCache, cache
+from cache.codec import CacheCodec, UnknownCodec
+
+
+def wait_for(condition, timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_local_cache_bounds():
+    local = LocalCache(max_entries=2, max_bytes=10, ttl=60)
+    local.set("a", 1, 4)
+    local.set("b", 2, 4)
+    local.get("a")
+    local.set("c", 3, 4)
+    # b is least recently used, and only two entries fit
+    assert (local.get("a"), local.get("b"), local.get("c")) == (1, None, 3)
+    local.set("d", 4, 9)
+    assert len(local) == 1 and local.bytes == 9
+    local.set("e", 5, 1, ttl=0)
+    time.sleep(0.01)
+    assert local.get("e") is None
+
+
+def test_two_tier_cache_is_coherent_across_workers():
+    server = fakeredis.FakeServer()
+    workers = [
+        RedisCache(local=LocalCache(), client=fakeredis.FakeRedis(server=server))
+        for _ in range(2)
+    ]
+    workers[0].set("dao_1", {"name": "paideia"})
+    assert workers[1].get("dao_1") == {"name": "paideia"}
+    assert workers[1].get("dao_1") == {"name": "paideia"}
+    assert workers[1].stats.snapshot()["local_hits"] == 1
+    assert wait_for(lambda: workers[1]._listener is not None)
+    time.sleep(0.1)
+
+    workers[0].set("dao_1", {"name": "renamed"})
+    assert wait_for(lambda: workers[1].local.get("dao_1") is None)
+    assert workers[1].get("dao_1") == {"name": "renamed"}
+
+    workers[0].invalidate("dao_1")
+    assert wait_for(lambda: workers[1].local.get("dao_1") is None)
+    assert workers[1].get("dao_1") is None
+
+
+def test_pipelined_mget_mset():
+    cache.mset({"a": 1, "b": [2]})
+    cache.local.clear()
+    assert cache.mget(["a", "missing", "b"]) == [1, None, [2]]
+    assert cache.mget(["b", "a"]) == [[2], 1]
+    assert cache.stats.snapshot()["local_hits"] >= 2
+
+
+
+def test_local_ttl_follows_redis_expiry(redis_client):
+    redis_client.set("short", json.dumps(1), px=500)
+    redis_client.set("forever", json.dumps(2))
+    cache.local.clear()
+    assert cache.mget(["short", "forever"]) == [1, 2]
+    # sub second entries are kept, keys without an expiry get the default ttl
+    now = time.monotonic()
+    assert 0 < cache.local._entries["short"][0] - now <= 1
+    assert cache.local._entries["forever"][0] - now > cache.local.ttl - 1
+
+
+def test_local_fill_skips_values_invalidated_during_the_read(redis_client):
+    redis_client.set("dao_1", json.dumps({"name": "old"}))
+    cache.local.clear()
+    results = redis_client.pipeline().get("dao_1").pttl("dao_1").execute()
+    values, missing, generation = cache._get_local(["dao_1"])
+    # another worker updates the key between our read and the fill
+    cache.local.invalidate("dao_1")
+    cache._store_fetched(values, missing, results, generation)
+    assert values["dao_1"] == {"name": "old"}
+    assert "dao_1" not in cache.local._entries
+
+
+def test_local_hits_are_copies():
+    cache.set("dao_2", {"tags": ["a"]})
+    cache.get("dao_2")["tags"].append("b")
+    assert cache.get("dao_2") == {"tags": ["a"]}
+
+@pytest.mark.asyncio
+async def test_async_api_shares_keys_with_sync_api():
+    await cache.aset("ergoauth_signing_request_1", {"address": "9f"})
+    assert cache.get("ergoauth_signing_request_1") == {"address": "9f"}
+    cache.local.clear()
+    assert await cache.aget("ergoauth_signing_request_1") == {"address": "9f"}
+    assert await cache.amget(["ergoauth_signing_request_1", "x"]) == [
+        {"address": "9f"},
+        None,
+    ]
+    assert await cache.ainvalidate("ergoauth_signing_request_1") == 1
+    assert await cache.aget("ergoauth_signing_request_1") is None
+    assert cache.get("ergoauth_signing_request_1") is None
+
+
+def test_codec_round_trip_and_compression():
+    codec = CacheCodec(codec="orjson", compression="zlib", compress_min_bytes=64)
+    small = {"date": datetime.datetime(2022, 7, 1), "ids": {1}}
+    assert codec.decode(codec.encode(small)) == {
+        "date": "2022-07-01T00:00:00",
+        "ids": [1],
+    }
+    large = {"comments": ["paideia " * 10] * 50}
+    encoded = codec.encode(large)
+    assert encoded[1] != 0 and len(encoded) < len(json.dumps(large))
+    assert codec.decode(encoded) == large
+    # values written before the codec layer are plain json
+    assert codec.decode(json.dumps(large).encode("utf-8")) == large
+    with pytest.raises(UnknownCodec):
+        codec.decode(bytes((0x1F, 0)) + b"{}")
+
+
+def test_unknown_codec_is_a_miss(redis_client):
+    redis_client.set("rolled", bytes((0x1F, 0)) + b"{}")
+    assert cache.get("rolled") is None
+    cache.set("rolled", [1])
+    assert cache.get("rolled") == [1]
+
+
+def test_get_or_compute_single_flight_across_workers():
+    server = fakeredis.FakeServer()
+    workers = [
+        RedisCache(local=LocalCache(), client=fakeredis.FakeRedis(server=server))
+        for _ in range(4)
+    ]
+    computes = []
+    lock = threading.Lock()
+
+    def compute():
+        with lock:
+            computes.append(1)
+            version = len(computes)
+        time.sleep(0.2)
+        return {"daos": version}
+
+    def load(i):
+        return workers[i % 4].get_or_compute(
+            "dao_list", compute, timeout=1, stale_ttl=30, beta=0
+        )
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(load, range(64)))
+    assert len(computes) == 1
+    assert results == [{"daos": 1}] * 64
+
+    # once expired every caller but one is served the stale value
+    time.sleep(1.1)
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(load, range(64)))
+    assert len(computes) == 2
+    assert results.count({"daos": 1}) >= 63
+    assert load(0) == {"daos": 2}
+
+
+def test_get_or_compute_refreshes_early():
+    computes = []
+    cache.get_or_compute("early", lambda: computes.append(1), timeout=60)
+    # a compute as slow as the ttl is always refreshed early
+    entry = cache.get("early")
+    cache.set("early", dict(entry, delta=1e9))
+    cache.get_or_compute("early", lambda: computes.append(1), timeout=60)
+    assert len(computes) == 2
@@ -0,0 +1,163 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from websocket.connection_manager import (
+    ConnectionManager,
+    ergoauth_topic,
+    notifications_topic,
+    proposal_comments_topic,
+)
+
+
+class FakeWebSocket:
+    def __init__(self, broken=False, blocked=False):
+        self.broken = broken
+        self.sent = []
+        self.closed = False
+        self.unblock = asyncio.Event()
+        if not blocked:
+            self.unblock.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        if self.broken:
+            raise RuntimeError("socket closed")
+        await self.unblock.wait()
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_publish_reaches_exact_topic_subscribers_only():
+    manager = ConnectionManager()
+    first, second, other, broken = (
+        FakeWebSocket(),
+        FakeWebSocket(),
+        FakeWebSocket(),
+        FakeWebSocket(broken=True),
+    )
+    await manager.connect(proposal_comments_topic(1), first)
+    await manager.connect(proposal_comments_topic(1), second)
+    await manager.connect(proposal_comments_topic(1), broken)
+    await manager.connect(proposal_comments_topic(12), other)
+
+    assert await manager.publish(proposal_comments_topic(1), {"id": 1}) == 3
+    await manager.drain()
+    assert first.sent == second.sent == ['{"id": 1}']
+    assert other.sent == []
+    # failed sockets are dropped
+    assert manager.subscribers(proposal_comments_topic(1)) == 2
+    assert manager.stats["send_errors"] == 1
+
+    manager.disconnect(proposal_comments_topic(1), first)
+    manager.disconnect(proposal_comments_topic(1), second)
+    assert proposal_comments_topic(1) not in manager.topics
+    assert await manager.publish(proposal_comments_topic(1), {"id": 2}) == 0
+    assert len(manager.connections) == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_does_not_hold_up_others():
+    manager = ConnectionManager(queue_size=2)
+    slow, fast = FakeWebSocket(blocked=True), FakeWebSocket()
+    await manager.connect(proposal_comments_topic(1), slow)
+    await manager.connect(proposal_comments_topic(1), fast)
+
+    for id in range(5):
+        await manager.publish(proposal_comments_topic(1), {"id": id})
+        await asyncio.sleep(0.001)
+    await asyncio.wait_for(manager.connections[fast].queue.join(), 1)
+    assert len(fast.sent) == 5
+    # the first message is stuck in send, the oldest queued ones were dropped
+    assert manager.snapshot()["queue_depth_max"] == 2
+    assert manager.stats["dropped"] == 2
+
+    slow.unblock.set()
+    await manager.drain()
+    assert slow.sent == ['{"id": 0}', '{"id": 3}', '{"id": 4}']
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_disconnect_policy():
+    manager = ConnectionManager(queue_size=1, slow_consumer_policy="disconnect")
+    slow = FakeWebSocket(blocked=True)
+    await manager.connect(notifications_topic(1), slow)
+
+    for id in range(3):
+        await manager.publish(notifications_topic(1), {"id": id})
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert slow.closed
+    assert manager.subscribers(notifications_topic(1)) == 0
+    assert manager.stats["slow_disconnects"] == 1
+    await manager.drain()
+
+async def _workers(count=2):
+    # one manager and broker per simulated worker, sharing a redis server
+    server = fakeredis.FakeServer()
+    managers = [
+        ConnectionManager(
+            broker_options={
+                "client": fakeredis.FakeAsyncRedis(server=server),
+                "flush_interval": 0.001,
+            }
+        )
+        for _ in range(count)
+    ]
+    for manager in managers:
+        await manager.broker.start()
+        await asyncio.wait_for(manager.broker.wait_subscribed(), 1)
+    return managers
+
+
+async def _settle(condition, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_broker_delivers_across_workers_once():
+    publisher, remote = await _workers()
+    local_socket, remote_socket = FakeWebSocket(), FakeWebSocket()
+    await publisher.connect(ergoauth_topic("abc"), local_socket)
+    await remote.connect(ergoauth_topic("abc"), remote_socket)
+
+    await publisher.publish(ergoauth_topic("abc"), "token")
+    await publisher.publish(ergoauth_topic("other"), "ignored")
+    await _settle(lambda: len(remote_socket.sent) > 0)
+    await asyncio.sleep(0.02)
+
+    # the publishing worker delivers locally and skips its own relay
+    assert local_socket.sent == ['"token"']
+    assert remote_socket.sent == ['"token"']
+    # both messages went out in one batch
+    assert publisher.broker.stats["batches"] == 1
+    assert remote.broker.stats["relayed"] == 1
+    for manager in (publisher, remote):
+        await manager.broker.stop()
+
+
+@pytest.mark.asyncio
+async def test_broker_coalesces_pending_messages():
+    publisher, remote = await _workers()
+    remote_socket = FakeWebSocket()
+    await remote.connect(notifications_topic(3), remote_socket)
+
+    for unread in range(5):
+        await publisher.publish(
+            notifications_topic(3), {"unread": unread}, coalesce=True
+        )
+    await _settle(lambda: len(remote_socket.sent) > 0)
+    await asyncio.sleep(0.02)
+
+    assert remote_socket.sent == ['{"unread": 4}']
+    assert publisher.broker.stats["coalesced"] == 4
+    for manager in (publisher, remote):
+        await manager.broker.stop()
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+from core.lazy import LazyRegistry, StartupTimings
+
+
+def test_clients_are_created_once_on_first_use():
+    created = []
+    registry = LazyRegistry(StartupTimings())
+    proxy = registry.register("client", lambda: created.append(1) or "client")
+    assert registry.loaded() == []
+    assert proxy.upper() == "CLIENT"
+    assert registry.get("client") == "client"
+    assert created == [1]
+    assert "init_client" in registry.timings.report()["phases_ms"]
+
+
+def test_importing_the_app_skips_heavy_clients():
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, main; print(sorted({'boto3', 'PIL'} & set(sys.modules)))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert loaded.strip() == "[]"
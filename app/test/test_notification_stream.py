@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from websocket.connection_manager import ConnectionManager, notifications_topic
+from websocket.notification_stream import NotificationStream
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+
+@pytest.mark.asyncio
+async def test_push_sends_single_deltas_in_sequence(redis_client):
+    from cache.cache import cache
+
+    manager = ConnectionManager()
+    stream = NotificationStream(manager, cache.aclient)
+    websocket = FakeWebSocket()
+    await manager.connect(notifications_topic(7), websocket)
+
+    assert await stream.push(7, {"id": 1}) == 1
+    assert await stream.push(7, {"id": 2}) == 2
+    # sequences are per user
+    assert await stream.push(8, {"id": 3}) == 1
+    await manager.drain()
+    assert websocket.sent == [
+        {"type": "notification", "seq": 1, "notification": {"id": 1}},
+        {"type": "notification", "seq": 2, "notification": {"id": 2}},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_missed_pushes(redis_client):
+    from cache.cache import cache
+
+    stream = NotificationStream(ConnectionManager(), cache.aclient, buffer_size=3)
+    for id in range(1, 6):
+        await stream.push(7, {"id": id})
+
+    assert [m["seq"] for m in await stream.resume(7, 3)] == [4, 5]
+    assert await stream.resume(7, 5) == []
+    # beyond the buffer, or a sequence this redis never issued
+    assert await stream.resume(7, 1) == [{"type": "resync", "seq": 5}]
+    assert await stream.resume(7, 9) == [{"type": "resync", "seq": 5}]
+    assert await stream.resume(8, 0) == []
+
+
+@pytest.mark.asyncio
+async def test_live_pushes_wait_for_the_replay(redis_client):
+    from cache.cache import cache
+
+    manager = ConnectionManager()
+    stream = NotificationStream(manager, cache.aclient)
+    await stream.push(7, {"id": 1})
+    websocket = FakeWebSocket()
+    await manager.connect(notifications_topic(7), websocket, hold=True)
+    # pushed between the subscription and the replay
+    await stream.push(7, {"id": 2})
+    for message in await stream.resume(7, 0):
+        manager.send(websocket, message)
+    manager.release(websocket)
+    await manager.drain()
+    assert [m["seq"] for m in websocket.sent] == [1, 2, 2]
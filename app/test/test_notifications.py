@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from api.notifications import notify
+from cache.notification_counters import (
+    adjust_unread_counter,
+    get_unread_counter,
+    rebuild_unread_counter,
+    unread_counter_key,
+)
+from db.crud.notifications import (
+    count_unread_notifications,
+    delete_notification,
+    edit_notification,
+    mark_notifications_read,
+)
+from db.models.notifications import Notification
+from db.schemas.notifications import CreateAndUpdateNotification
+
+
+def make_db():
+    engine = create_engine("sqlite://")
+    Notification.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    db.statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, *args):
+        db.statements.append(statement)
+
+    return db
+
+
+def create(db, user_details_id=1):
+    return notify(
+        db,
+        user_details_id,
+        CreateAndUpdateNotification(user_details_id=user_details_id, action="x"),
+    )
+
+
+@pytest.mark.asyncio
+async def test_unread_counter_follows_creates_and_reads(redis_client):
+    db = make_db()
+    # a missing counter is rebuilt from the table
+    assert count_unread_notifications(db, 1) == 0
+    notifications = [await create(db) for _ in range(4)]
+    await create(db, user_details_id=2)
+    assert get_unread_counter(1) == 4
+
+    edit_notification(
+        db,
+        notifications[0].id,
+        CreateAndUpdateNotification(user_details_id=1, is_read=True),
+    )
+    delete_notification(db, notifications[1].id)
+    assert get_unread_counter(1) == 2
+
+    db.statements.clear()
+    ret = mark_notifications_read(db, 1, [notifications[2].id, notifications[0].id])
+    assert ret == {"updated": 1, "unread": 1}
+    assert len([s for s in db.statements if s.startswith("UPDATE")]) == 1
+
+    assert mark_notifications_read(db, 1) == {"updated": 1, "unread": 0}
+    assert count_unread_notifications(db, 2) == 1
+
+
+@pytest.mark.asyncio
+async def test_drifted_counter_is_rebuilt(redis_client):
+    db = make_db()
+    await create(db)
+    redis_client.delete(unread_counter_key(1))
+    # an increment on a missing counter can't know the base, it's dropped
+    await create(db)
+    assert get_unread_counter(1) is None
+    assert count_unread_notifications(db, 1) == 2
+    assert get_unread_counter(1) == 2
+
+
+def test_adjusting_a_missing_counter_does_not_create_it(redis_client):
+    adjust_unread_counter(1, 1)
+    assert redis_client.exists(unread_counter_key(1)) == 0
+    redis_client.set(unread_counter_key(1), 2, ex=60)
+    adjust_unread_counter(1, 1)
+    assert get_unread_counter(1) == 3
+    assert redis_client.ttl(unread_counter_key(1)) > 0
+
+
+def test_rebuild_does_not_overwrite_a_concurrent_adjustment(redis_client):
+    def count():
+        # a notification committed after the count started
+        adjust_unread_counter(1, 1)
+        return 3
+
+    assert rebuild_unread_counter(1, count) == 3
+    assert get_unread_counter(1) is None
+    assert rebuild_unread_counter(1, lambda: 4) == 4
+    assert get_unread_counter(1) == 4
@@ -0,0 +1,262 @@
+import asyncio
+import datetime
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from db.crud.notifications import coalesce_notifications, count_unread_notifications
+from db.crud.outbox import (
+    activity_event,
+    add_outbox_events,
+    count_outbox_events,
+    notification_event,
+)
+from db.crud.proposals import add_addendum_by_proposal_id, set_followers_by_proposal_id
+from db.models.activity_log import Activity
+from db.models.notifications import Notification
+from db.models.outbox import OutboxEvent
+from db.models.proposals import (
+    Addendum,
+    Proposal,
+    ProposalCounter,
+    ProposalFollower,
+)
+from db.schemas.activity import CreateOrUpdateActivity
+from db.schemas.notifications import CreateAndUpdateNotification, NotificationActor
+from db.schemas.proposal import CreateOrUpdateAddendum
+from db.session import Base
+from outbox.relay import OutboxRelay
+from websocket.connection_manager import connection_manager, notifications_topic
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+
+def make_sessions(tmp_path):
+    # sync and async sessions on one database file
+    url = f"sqlite:///{tmp_path / 'outbox.db'}"
+    tables = [
+        Proposal.__table__,
+        ProposalCounter.__table__,
+        ProposalFollower.__table__,
+        Addendum.__table__,
+        OutboxEvent.__table__,
+        Activity.__table__,
+        Notification.__table__,
+    ]
+    Base.metadata.create_all(create_engine(url), tables=tables)
+    sync_session = sessionmaker(bind=create_engine(url))
+    async_session = sessionmaker(
+        bind=create_async_engine(url.replace("sqlite", "sqlite+aiosqlite")),
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+    return sync_session, async_session
+
+
+def follow_events():
+    activity = CreateOrUpdateActivity(
+        user_details_id=2, action="followed the discussion", value="p", category="P"
+    )
+    notification = CreateAndUpdateNotification(
+        user_details_id=1, action="paideia followed the discussion", proposal_id=1
+    )
+    return [activity_event(2, activity), notification_event(1, notification)]
+
+
+@pytest.mark.asyncio
+async def test_events_commit_with_the_mutation_and_are_relayed(tmp_path):
+    sync_session, async_session = make_sessions(tmp_path)
+    db = sync_session()
+    db.add(Proposal(id=1, name="p", dao_id=1, user_details_id=1))
+    db.commit()
+
+    # a rejected mutation leaves no side effects behind
+    set_followers_by_proposal_id(db, 1, 2, "subscribe", follow_events())
+    assert count_outbox_events(db) == 0
+    set_followers_by_proposal_id(db, 1, 2, "follow", follow_events())
+    assert count_outbox_events(db) == 2
+    assert db.query(Activity).count() == 0
+
+    websocket = FakeWebSocket()
+    await connection_manager.connect(notifications_topic(1), websocket)
+    relay = OutboxRelay(async_session, batch_size=10)
+    assert await relay.drain_once() == 2
+    assert await relay.drain_once() == 0
+    await connection_manager.drain()
+    connection_manager.disconnect(notifications_topic(1), websocket)
+
+    db.expire_all()
+    assert count_outbox_events(db) == 0
+    assert [a.action for a in db.query(Activity).all()] == ["followed the discussion"]
+    notification = db.query(Notification).one()
+    assert notification.user_details_id == 1
+    assert websocket.sent[0]["notification"]["id"] == notification.id
+    assert relay.stats["notifications"] == 1
+
+
+
+def test_addendum_activity_commits_with_the_addendum(tmp_path):
+    sync_session, _ = make_sessions(tmp_path)
+    db = sync_session()
+    db.add(Proposal(id=1, name="p", dao_id=1, user_details_id=1))
+    db.commit()
+    activity = CreateOrUpdateActivity(
+        user_details_id=1, action="added addendum", value="a", category="P"
+    )
+    addendum = CreateOrUpdateAddendum(name="a", content="c")
+
+    # not the author, nothing is written
+    add_addendum_by_proposal_id(db, 2, 1, addendum, [activity_event(2, activity)])
+    assert count_outbox_events(db) == 0
+    add_addendum_by_proposal_id(db, 1, 1, addendum, [activity_event(1, activity)])
+    assert count_outbox_events(db) == 1
+    assert db.query(Addendum).count() == 1
+def like_event(user_details_id, name):
+    notification = CreateAndUpdateNotification(
+        user_details_id=1,
+        action=f"{name} liked the discussion",
+        proposal_id=1,
+        group_key="liked the discussion",
+        actors=[NotificationActor(user_details_id=user_details_id, name=name)],
+    )
+    return notification_event(1, notification)
+
+
+@pytest.mark.asyncio
+async def test_likes_coalesce_into_one_notification(tmp_path, redis_client):
+    sync_session, async_session = make_sessions(tmp_path)
+    db = sync_session()
+    for user_details_id, name in [(2, "alice"), (3, "bob"), (2, "alice")]:
+        add_outbox_events(db, [like_event(user_details_id, name)])
+    db.commit()
+
+    websocket = FakeWebSocket()
+    await connection_manager.connect(notifications_topic(1), websocket)
+    relay = OutboxRelay(async_session, batch_size=20)
+    assert await relay.drain_once() == 3
+    for user_details_id in range(4, 16):
+        add_outbox_events(db, [like_event(user_details_id, f"user{user_details_id}")])
+        db.commit()
+    assert await relay.drain_once() == 12
+    await connection_manager.drain()
+    connection_manager.disconnect(notifications_topic(1), websocket)
+
+    db.expire_all()
+    notification = db.query(Notification).one()
+    assert notification.actor_count == 14
+    assert notification.action == "user15 and 13 others liked the discussion"
+    assert [actor["name"] for actor in notification.actors] == [
+        "user15",
+        "user14",
+        "user13",
+    ]
+    # one push per relayed batch, both for the same row
+    assert [m["notification"]["id"] for m in websocket.sent] == [notification.id] * 2
+    assert websocket.sent[0]["notification"]["action"] == (
+        "bob and alice liked the discussion"
+    )
+    assert relay.stats["coalesced"] == 14
+    assert count_unread_notifications(db, 1) == 1
+
+
+def test_read_or_expired_aggregates_are_not_reused(tmp_path):
+    sync_session, _ = make_sessions(tmp_path)
+    db = sync_session()
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    def like(user_details_id, date):
+        event = like_event(user_details_id, f"user{user_details_id}")
+        notification = CreateAndUpdateNotification(**event["payload"]["notification"])
+        return coalesce_notifications(db, [(notification, date)], window=3600)
+
+    created, _ = like(2, now - datetime.timedelta(hours=3))
+    db.commit()
+    # outside the window of the previous like
+    created, _ = like(3, now - datetime.timedelta(hours=1))
+    assert len(created) == 1
+    created[0].is_read = True
+    db.commit()
+    created, updated = like(4, now)
+    assert (len(created), len(updated)) == (1, 0)
+    db.commit()
+    created, updated = like(5, now)
+    assert (len(created), len(updated)) == (0, 1)
+    assert updated[0].action == "user5 and user4 liked the discussion"
+    assert db.query(Notification).count() == 3
+
+
+@pytest.mark.asyncio
+async def test_a_bad_event_is_set_aside_without_blocking_the_outbox(tmp_path):
+    sync_session, async_session = make_sessions(tmp_path)
+    db = sync_session()
+    bad = activity_event(2, CreateOrUpdateActivity(user_details_id=2, action="x"))
+    # written before a schema change, it no longer validates
+    bad["payload"]["activity"] = {"action": None}
+    add_outbox_events(db, [bad] + follow_events())
+    db.commit()
+
+    relay = OutboxRelay(async_session, batch_size=10, max_attempts=2)
+    assert await relay.drain_once() == 2
+    db.expire_all()
+    assert db.query(Activity).count() == 1
+    assert db.query(Notification).count() == 1
+    event = db.query(OutboxEvent).one()
+    assert (event.attempts, event.dead) == (1, False)
+    assert "validation error" in event.last_error
+
+    assert await relay.drain_once() == 0
+    assert await relay.drain_once() == 0
+    db.expire_all()
+    assert db.query(OutboxEvent).one().dead
+    assert count_outbox_events(db) == 0
+    assert count_outbox_events(db, dead=True) == 1
+    assert relay.stats["failed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_stop_relays_what_is_left(tmp_path):
+    sync_session, async_session = make_sessions(tmp_path)
+    relay = OutboxRelay(async_session, batch_size=1, poll_interval=60)
+    await relay.start()
+    await asyncio.sleep(0.05)
+    db = sync_session()
+    add_outbox_events(db, follow_events())
+    db.commit()
+    await relay.stop()
+    assert count_outbox_events(db) == 0
+    assert relay.stats["activities"] == relay.stats["notifications"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sync_routes_hand_side_effects_to_the_loop(tmp_path):
+    sync_session, async_session = make_sessions(tmp_path)
+    relay = OutboxRelay(async_session, batch_size=10, poll_interval=60)
+    await relay.start()
+    await asyncio.sleep(0.05)
+
+    def sync_route():
+        # a threadpool handler, no event loop of its own
+        db = sync_session()
+        add_outbox_events(db, follow_events())
+        db.commit()
+        relay.wake()
+
+    await asyncio.get_running_loop().run_in_executor(None, sync_route)
+    for _ in range(100):
+        if relay.stats["events"] == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert relay.stats["events"] == 2
+    await relay.stop()
@@ -0,0 +1,118 @@
+import datetime
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from db.crud.notifications import cleanup_notifications, get_notifications
+from db.models.notifications import Notification
+from db.partitions import (
+    PartitionManager,
+    add_months,
+    partition_name,
+    plan_partitions,
+)
+
+# the partitioning ddl only runs on postgres, point this at a scratch database
+# (its notifications table is dropped) to run those tests
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def month(year, number):
+    return datetime.datetime(year, number, 1, tzinfo=datetime.timezone.utc)
+
+
+def test_months_wrap_around_the_year():
+    assert add_months(month(2026, 11), 3) == month(2027, 2)
+    assert add_months(month(2026, 1), -1) == month(2025, 12)
+    assert partition_name("activity_log", month(2026, 3)) == "activity_log_2026_03"
+
+
+def test_plan_creates_ahead_and_drops_past_retention():
+    now = datetime.datetime(2026, 11, 17, tzinfo=datetime.timezone.utc)
+    existing = [month(2026, m) for m in range(8, 12)]
+    # notifications keep one month of data
+    create, drop = plan_partitions("notifications", existing, 2, now)
+    assert create == [month(2026, 12), month(2027, 1)]
+    assert drop == [month(2026, 8), month(2026, 9)]
+    # october still holds rows newer than the cutoff
+    assert month(2026, 10) not in drop
+
+
+def test_unpartitioned_cleanup_deletes_expired_rows():
+    engine = create_engine("sqlite://")
+    Notification.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for days in (1, 90):
+        db.add(Notification(user_details_id=1, date=now - datetime.timedelta(days)))
+    db.commit()
+
+    assert cleanup_notifications(db) == {"deleted_rows": 1, "dropped_partitions": []}
+    assert len(get_notifications(db, 1)) == 1
+
+
+@pytest.fixture
+def postgres_db():
+    if not POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    engine = create_engine(POSTGRES_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS notifications CASCADE"))
+    Notification.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS notifications CASCADE"))
+    engine.dispose()
+
+
+@pytest.mark.postgres
+def test_convert_and_maintain_a_populated_table(postgres_db):
+    db = postgres_db
+    now = datetime.datetime(2026, 11, 17, tzinfo=datetime.timezone.utc)
+    dates = [
+        datetime.datetime(2026, 9, 3, tzinfo=datetime.timezone.utc),
+        now,
+        datetime.datetime(2027, 1, 15, tzinfo=datetime.timezone.utc),
+        # past the partitions convert creates, lands in the default one
+        datetime.datetime(2027, 6, 1, tzinfo=datetime.timezone.utc),
+    ]
+    for date in dates:
+        db.add(Notification(user_details_id=1, date=date))
+    db.commit()
+
+    manager = PartitionManager({"notifications": 1}, months_ahead=2)
+    assert manager.convert(db, "notifications", now)
+    assert manager.is_partitioned(db, "notifications")
+    assert not manager.convert(db, "notifications", now)
+    assert sorted(manager.partition_months(db, "notifications")) == [
+        add_months(month(2026, 9), months) for months in range(5)
+    ]
+
+    def count(table):
+        return db.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+
+    assert count("notifications") == 4
+    assert count("notifications_default") == 1
+    # ids keep coming from the sequence the old table owned
+    db.add(Notification(user_details_id=1, date=now))
+    db.commit()
+    assert count("notifications_2026_11") == 2
+
+    # months later: june gets created with the default's row moved into it,
+    # and everything up to february is past retention
+    later = datetime.datetime(2027, 4, 20, tzinfo=datetime.timezone.utc)
+    ret = manager.maintain(db, later)
+    assert "error" not in ret["notifications"]
+    assert ret["notifications"]["created"] == [
+        "notifications_2027_04",
+        "notifications_2027_05",
+        "notifications_2027_06",
+    ]
+    assert "notifications_2026_09" in ret["notifications"]["dropped"]
+    assert count("notifications_default") == 0
+    assert count("notifications_2027_06") == 1
+    assert count("notifications") == 1
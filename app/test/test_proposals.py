@@ -0,0 +1,216 @@
+import datetime
+import pytest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from db.session import Base
+from db.models.users import UserDetails, UserFollower, UserDetailsCounter
+from db.models.proposals import (
+    Proposal,
+    ProposalReference,
+    ProposalLike,
+    ProposalFollower,
+    Comment,
+    Addendum,
+    ProposalCommentLike,
+    ProposalCounter,
+    ProposalCommentCounter,
+)
+from db.crud.counters import reconcile_counters
+from db.crud.proposals import (
+    get_proposal_by_id,
+    get_proposals_by_dao_id,
+    get_proposals_by_user_details_id,
+    get_proposal_summaries_by_dao_id,
+    set_likes_by_proposal_id,
+    set_likes_by_comment_id,
+    set_followers_by_proposal_id,
+    add_commment_by_proposal_id,
+    delete_proposal_by_id,
+)
+from db.schemas.proposal import CreateOrUpdateComment
+
+
+def make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            UserDetails.__table__,
+            UserFollower.__table__,
+            Proposal.__table__,
+            ProposalReference.__table__,
+            ProposalLike.__table__,
+            ProposalFollower.__table__,
+            Comment.__table__,
+            Addendum.__table__,
+            ProposalCommentLike.__table__,
+            ProposalCounter.__table__,
+            ProposalCommentCounter.__table__,
+            UserDetailsCounter.__table__,
+        ],
+    )
+    session = sessionmaker(bind=engine)()
+    session.query_count = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_queries(*args):
+        session.query_count += 1
+
+    return session
+
+
+@pytest.fixture
+def db():
+    session = make_db()
+    yield session
+    session.close()
+
+
+def seed(db, n_proposals: int, n_comments: int):
+    db.add_all(
+        [
+            UserDetails(id=1, user_id=1, dao_id=1, name="alice"),
+            UserDetails(id=2, user_id=2, dao_id=1, name="bob"),
+            UserFollower(follower_id=2, followee_id=1),
+        ]
+    )
+    for i in range(1, n_proposals + 1):
+        db.add(
+            Proposal(
+                id=i,
+                dao_id=1,
+                user_details_id=1 + i % 2,
+                name=f"proposal {i}",
+                image_url="",
+                date=datetime.datetime(2022, 7, 1),
+                actions={"actions_list": []},
+                tags={"tags_list": ["tag"]},
+                attachments={"attachments_list": []},
+                status="discussion",
+                is_proposal=False,
+            )
+        )
+        db.add(ProposalLike(proposal_id=i, user_details_id=1, liked=True))
+        db.add(ProposalLike(proposal_id=i, user_details_id=2, liked=False))
+        db.add(ProposalFollower(proposal_id=i, user_details_id=2))
+        db.add(Addendum(proposal_id=i, name="addendum", content=""))
+        if i > 1:
+            db.add(ProposalReference(referring_proposal_id=i, referred_proposal_id=i - 1))
+        for j in range(n_comments):
+            comment_id = (i - 1) * n_comments + j + 1
+            db.add(
+                Comment(
+                    id=comment_id,
+                    proposal_id=i,
+                    user_details_id=2,
+                    comment="hello",
+                )
+            )
+            db.add(
+                ProposalCommentLike(comment_id=comment_id, user_details_id=1, liked=True)
+            )
+    db.commit()
+    reconcile_counters(db)
+
+
+def test_get_proposal_by_id(db):
+    seed(db, 3, 2)
+    proposal = get_proposal_by_id(db, 2)
+    assert proposal.name == "proposal 2"
+    assert proposal.alias == "alice"
+    assert proposal.likes == [1]
+    assert proposal.dislikes == [2]
+    assert proposal.followers == [2]
+    assert proposal.references == [1]
+    assert proposal.references_meta[0].name == "proposal 1"
+    assert proposal.references_meta[0].likes == [1]
+    assert len(proposal.comments) == 2
+    assert proposal.comments[0].alias == "bob"
+    assert proposal.comments[0].likes == [1]
+    assert len(proposal.addendums) == 1
+    assert proposal.tags == ["tag"]
+    assert proposal.user_followers == [2]
+    assert proposal.created == 1
+    assert get_proposal_by_id(db, 42).status_code == 404
+
+
+def test_get_proposals_by_user_details_id(db):
+    seed(db, 4, 1)
+    proposals = get_proposals_by_user_details_id(db, 2)
+    assert sorted(map(lambda x: x.id, proposals)) == [1, 3]
+    assert all(map(lambda x: x.created == 2, proposals))
+
+
+def test_get_proposals_by_dao_id_query_count():
+    query_counts = []
+    for n_proposals, n_comments in ((2, 1), (25, 20)):
+        db = make_db()
+        seed(db, n_proposals, n_comments)
+        db.query_count = 0
+        assert len(get_proposals_by_dao_id(db, 1)) == n_proposals
+        query_counts.append(db.query_count)
+        db.close()
+    assert query_counts[0] == query_counts[1]
+
+
+def test_get_proposal_summaries_by_dao_id(db):
+    seed(db, 5, 3)
+    ids = []
+    cursor = None
+    for _ in range(5):
+        page = get_proposal_summaries_by_dao_id(db, 1, cursor, limit=2)
+        ids += list(map(lambda x: x.id, page["proposals"]))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    # all proposals share the same timestamp so the id breaks ties
+    assert ids == [5, 4, 3, 2, 1]
+    summary = get_proposal_summaries_by_dao_id(db, 1, limit=1)["proposals"][0]
+    assert (summary.likes, summary.dislikes) == (1, 1)
+    assert (summary.comments, summary.followers) == (3, 1)
+    assert summary.alias == "bob"
+    assert get_proposal_summaries_by_dao_id(db, 1, "garbage").status_code == 400
+
+
+def test_counters_follow_mutations(db):
+    seed(db, 1, 0)
+
+    def counter():
+        db.expire_all()
+        return db.query(ProposalCounter).filter(ProposalCounter.proposal_id == 1).one()
+
+    assert (counter().likes, counter().dislikes, counter().followers) == (1, 1, 1)
+    set_likes_by_proposal_id(db, 1, 1, "dislike")
+    assert (counter().likes, counter().dislikes) == (0, 2)
+    set_likes_by_proposal_id(db, 1, 2, "remove")
+    set_likes_by_proposal_id(db, 1, 3, "like")
+    assert (counter().likes, counter().dislikes) == (1, 1)
+    set_followers_by_proposal_id(db, 1, 2, "follow")
+    set_followers_by_proposal_id(db, 1, 1, "follow")
+    assert counter().followers == 2
+    set_followers_by_proposal_id(db, 1, 1, "unfollow")
+    set_followers_by_proposal_id(db, 1, 3, "unfollow")
+    assert counter().followers == 1
+    comment = add_commment_by_proposal_id(
+        db, 1, CreateOrUpdateComment(user_details_id=1, comment="hi")
+    )
+    assert counter().comments == 1
+    set_likes_by_comment_id(db, comment.id, 2, "like")
+    set_likes_by_comment_id(db, comment.id, 2, "like")
+    assert db.query(ProposalCommentCounter).one().likes == 1
+    set_likes_by_comment_id(db, comment.id, 2, "dislike")
+    db.expire_all()
+    comment_counter = db.query(ProposalCommentCounter).one()
+    assert (comment_counter.likes, comment_counter.dislikes) == (0, 1)
+    set_likes_by_comment_id(db, comment.id, 2, "like")
+
+    maintained = (counter().likes, counter().dislikes, counter().followers)
+    reconcile_counters(db)
+    assert (counter().likes, counter().dislikes, counter().followers) == maintained
+
+    delete_proposal_by_id(db, 1)
+    assert db.query(ProposalCounter).count() == 0
+    assert db.query(ProposalCommentCounter).count() == 0
+    assert db.query(ProposalCommentLike).count() == 0
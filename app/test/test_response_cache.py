@@ -0,0 +1,87 @@
+import typing as t
+
+import pytest
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+from cache.response_cache import (
+    ainvalidate_response_cache,
+    cached_response,
+    invalidate_response_cache,
+    response_cache_stats,
+)
+
+
+class Item(BaseModel):
+    id: int
+    name: t.Optional[str]
+
+    class Config:
+        orm_mode = True
+
+
+class ItemRow:
+    def __init__(self, id, name=None):
+        self.id = id
+        self.name = name
+
+
+calls = []
+
+
+@cached_response("items", t.List[Item], lambda params, items: ["items"])
+def list_items(dao_id: int, db=None):
+    calls.append(dao_id)
+    if dao_id == 0:
+        return JSONResponse(status_code=404, content="not found")
+    return [ItemRow(1, "one"), ItemRow(2)]
+
+
+def test_cached_response_hits_and_invalidates():
+    calls.clear()
+    first = list_items(dao_id=1, db=object())
+    second = list_items(dao_id=1, db=object())
+    assert first.body == second.body == b'[{"id":1,"name":"one"},{"id":2}]'
+    assert calls == [1]
+
+    list_items(dao_id=2, db=object())
+    assert calls == [1, 2]
+
+    assert invalidate_response_cache("items") == 3
+    list_items(dao_id=1, db=object())
+    assert calls == [1, 2, 1]
+    stats = response_cache_stats.snapshot()["routes"]["items"]
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+
+
+def test_cached_response_skips_errors():
+    calls.clear()
+    assert list_items(dao_id=0).status_code == 404
+    assert list_items(dao_id=0).status_code == 404
+    assert calls == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_async_invalidation(redis_client):
+    calls.clear()
+    list_items(dao_id=3, db=object())
+    assert await ainvalidate_response_cache("items") == 2
+    list_items(dao_id=3, db=object())
+    assert calls == [3, 3]
+
+
+def test_proposal_tags_cover_references_and_profiles():
+    from api.proposals import proposal_tags
+
+    proposal = {
+        "id": 1,
+        "user_details_id": 7,
+        "comments": [{"user_details_id": 8}, {"user_details_id": 7}],
+        "references_meta": [{"id": 2}],
+    }
+    assert proposal_tags(proposal) == [
+        "proposal_1",
+        "proposal_2",
+        "user_details_7",
+        "user_details_8",
+    ]
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from verifier import server
+from verifier.client import VerifierClient
+
+
+def slow_verify(address, message, signed_message, proof):
+    time.sleep(0.01)
+    return signed_message == f"{message}_signed_by_{address}"
+
+
+@pytest.fixture
+def verification_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        server,
+        "OPS",
+        {"verify": slow_verify, "sigma_boolean": lambda address: f"0008cd{address}"},
+    )
+    return server.VerificationServer(
+        str(tmp_path / "verifier.sock"),
+        processes=2,
+        executor=ThreadPoolExecutor(max_workers=2),
+    )
+
+
+@pytest.mark.asyncio
+async def test_verifications_are_batched_over_the_socket(verification_server):
+    await verification_server.start()
+    client = VerifierClient(verification_server.path)
+    try:
+        results = await asyncio.gather(
+            *[
+                client.verify_signed_message(
+                    f"9f{i}", "msg", f"msg_signed_by_9f{i if i % 2 else 0}", "proof"
+                )
+                for i in range(1, 41)
+            ]
+        )
+        assert results == [i % 2 == 1 for i in range(1, 41)]
+        assert await client.sigma_boolean("9f1") == "0008cd9f1"
+        with pytest.raises(Exception, match="unknown"):
+            await client.call("unknown")
+
+        stats = await client.stats()
+        assert stats["requests"] == 42
+        assert stats["avg_batch_size"] > 1
+        assert stats["queued"] == stats["in_flight"] == 0
+        # sync handlers use a blocking connection of their own
+        assert await asyncio.get_running_loop().run_in_executor(
+            None,
+            client.verify_signed_message_sync,
+            "9f1",
+            "msg",
+            "msg_signed_by_9f1",
+            "proof",
+        )
+    finally:
+        await verification_server.close()
+
+
+@pytest.mark.asyncio
+async def test_reconnects_once_the_server_is_up(verification_server):
+    client = VerifierClient(verification_server.path)
+    with pytest.raises(FileNotFoundError):
+        await client.sigma_boolean("9f1")
+    await verification_server.start()
+    try:
+        assert await client.sigma_boolean("9f1") == "0008cd9f1"
+    finally:
+        await verification_server.close()
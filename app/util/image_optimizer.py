@@ -1,7 +1,13 @@
+import importlib
 import re
-from PIL import Image
 from io import BytesIO
 
+from core.lazy import clients
+
+# PIL is imported on the first image upload
+Image = clients.register("pil", lambda: importlib.import_module("PIL.Image"))
+
+
 class ImageOptimizer:
     def __init__(self):
         self.name = "pillow_image_optimizer"
@@ -0,0 +1,148 @@
+import asyncio
+import itertools
+import json
+import socket
+import typing as t
+
+from config import Config, Network
+from core.lazy import clients
+
+CFG = Config[Network]
+
+
+class VerifierClient:
+    """
+    Client for verifier/server.py.
+
+    Async callers share one pipelined connection per event loop, sync
+    handlers open a short lived blocking connection per call. Without a
+    socket configured the calls run ErgoAppKit in this process instead.
+    """
+
+    def __init__(self, path: t.Optional[str], timeout: float = 10):
+        self.path = path
+        self.timeout = timeout
+        self._ids = itertools.count()
+        self._pending = {}
+        self._loop = None
+        self._writer = None
+        self._connecting = None
+
+    async def verify_signed_message(
+        self, address: str, message: str, signed_message: str, proof: str
+    ) -> bool:
+        return await self.call("verify", address, message, signed_message, proof)
+
+    async def sigma_boolean(self, address: str) -> str:
+        return await self.call("sigma_boolean", address)
+
+    async def stats(self):
+        return await self.call("stats")
+
+    def verify_signed_message_sync(
+        self, address: str, message: str, signed_message: str, proof: str
+    ) -> bool:
+        return self.call_sync("verify", address, message, signed_message, proof)
+
+    async def call(self, op: str, *args):
+        if self.path is None:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, _call_local, op, list(args)
+            )
+        await self._connect()
+        id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[id] = future
+        try:
+            self._writer.write(_encode(id, op, args))
+            await self._writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(id, None)
+
+    def call_sync(self, op: str, *args):
+        if self.path is None:
+            return _call_local(op, list(args))
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            sock.sendall(_encode(0, op, args))
+            with sock.makefile("rb") as reader:
+                return _result(json.loads(reader.readline()))
+
+    async def _connect(self):
+        loop = asyncio.get_running_loop()
+        if self._writer is not None and self._loop is loop:
+            return
+        if self._connecting is None or self._loop is not loop:
+            self._loop = loop
+            self._writer = None
+            self._connecting = loop.create_task(self._open())
+        connecting = self._connecting
+        try:
+            await asyncio.shield(connecting)
+        except Exception:
+            # e.g. the socket isn't up yet, the next call tries again
+            if self._connecting is connecting:
+                self._connecting = None
+                self._writer = None
+            raise
+
+    async def _open(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        self._writer = writer
+        asyncio.get_running_loop().create_task(self._read(reader, writer))
+
+    async def _read(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.get(response["id"])
+                if future is None or future.done():
+                    continue
+                try:
+                    future.set_result(_result(response))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            # connection lost, the next call reconnects
+            if self._writer is writer:
+                self._writer = None
+                self._connecting = None
+            for future in list(self._pending.values()):
+                if not future.done():
+                    future.set_exception(ConnectionError("verifier connection lost"))
+
+
+def _encode(id: int, op: str, args) -> bytes:
+    return json.dumps({"id": id, "op": op, "args": list(args)}).encode("utf-8") + b"\n"
+
+
+def _result(response: dict):
+    if "error" in response:
+        raise Exception(f"verifier: {response['error']}")
+    return response["result"]
+
+
+def _load_appkit():
+    # only used without a verifier socket, this starts a jvm in the worker
+    from verifier import server
+
+    server._init_process()
+    return server
+
+
+clients.register("ergo_appkit", _load_appkit)
+
+
+def _call_local(op: str, args: list):
+    result, error = clients.get("ergo_appkit")._run_batch([(op, args)])[0]
+    if error is not None:
+        raise Exception(f"verifier: {error}")
+    return result
+
+
+verifier = VerifierClient(CFG.ergo_verifier_socket, CFG.ergo_verifier_timeout)
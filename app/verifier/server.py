@@ -0,0 +1,217 @@
+"""
+Ergo signature verification service
+
+ErgoAppKit runs on a JVM, so loading it in every uvicorn worker costs memory
+and every call blocks the worker's event loop. This service owns a pool of
+verifier processes, each loading appkit once, and all api workers share it
+over a unix socket (see verifier/client.py). Requests queued while every
+process is busy are sent to the pool in batches.
+
+usage:
+    python -m verifier.server --socket /run/paideia/verifier.sock --processes 2
+
+the protocol is one json object per line in both directions:
+    {"id": 1, "op": "verify", "args": [address, message, signed, proof]}
+    {"id": 1, "result": true}  or  {"id": 1, "error": "..."}
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+import typing as t
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+logger = logging.getLogger("paideia")
+
+# op name -> function, filled in each verifier process by _init_process
+OPS = {}
+
+
+def _init_process():
+    from ergo_python_appkit.appkit import ErgoAppKit
+
+    OPS["verify"] = ErgoAppKit.verifyErgoAuthSignedMessage
+    OPS["sigma_boolean"] = ErgoAppKit.getSigmaBooleanFromAddress
+
+
+def _run_batch(batch: t.List[t.Tuple[str, list]]):
+    results = []
+    for op, args in batch:
+        try:
+            results.append((OPS[op](*args), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {str(e)}"))
+    return results
+
+
+class VerifierStats:
+    """Queue depth, batch sizes and latencies, latencies over a sliding window"""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.latencies = []
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+
+    def record_batch(self, latencies: t.List[float], errors: int):
+        self.requests += len(latencies)
+        self.batches += 1
+        self.errors += errors
+        self.latencies = (self.latencies + latencies)[-self.window :]
+
+    def snapshot(self, queued: int, in_flight: int, processes: int):
+        latencies = sorted(self.latencies)
+        return {
+            "pid": os.getpid(),
+            "processes": processes,
+            "queued": queued,
+            "in_flight": in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "batches": self.batches,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "latency_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            "latency_p99_ms": (
+                latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000
+                if latencies
+                else 0.0
+            ),
+        }
+
+
+class VerificationServer:
+    def __init__(
+        self,
+        path: str,
+        processes: int = 2,
+        batch_size: int = 32,
+        batch_wait: float = 0.002,
+        executor: Executor = None,
+    ):
+        self.path = path
+        self.processes = processes
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.executor = executor or ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_process
+        )
+        self.stats = VerifierStats()
+        self.in_flight = 0
+        self._queue = None
+        self._slots = None
+        self._server = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        # one batch per process at a time, the rest queue up into bigger batches
+        self._slots = asyncio.Semaphore(self.processes)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def close(self):
+        self._batcher.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _handle(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self._respond(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _respond(self, line: bytes, writer, write_lock):
+        request = json.loads(line)
+        response = {"id": request.get("id")}
+        try:
+            if request["op"] == "stats":
+                response["result"] = self.stats.snapshot(
+                    self._queue.qsize(), self.in_flight, self.processes
+                )
+            else:
+                response["result"] = await self.submit(request["op"], request["args"])
+        except Exception as e:
+            response["error"] = str(e)
+        async with write_lock:
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    async def submit(self, op: str, args: list):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, args, future, time.perf_counter()))
+        return await future
+
+    async def _batch_loop(self):
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(
+                        await asyncio.wait_for(
+                            self._queue.get(), max(deadline - time.monotonic(), 0)
+                        )
+                    )
+                except asyncio.TimeoutError:
+                    break
+            asyncio.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        self.in_flight += len(batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _run_batch, [(op, args) for op, args, _, _ in batch]
+            )
+        except Exception as e:
+            results = [(None, str(e))] * len(batch)
+        finally:
+            self.in_flight -= len(batch)
+            self._slots.release()
+        now = time.perf_counter()
+        errors = 0
+        for (_, _, future, queued_at), (result, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                errors += 1
+                future.set_exception(Exception(error))
+        self.stats.record_batch([now - queued_at for _, _, _, queued_at in batch], errors)
+
+
+async def serve(args):
+    server = VerificationServer(
+        args.socket, args.processes, args.batch_size, args.batch_wait_ms / 1000
+    )
+    await server.start()
+    logger.info(f"ergo verifier listening on {args.socket}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default="/run/paideia/verifier.sock")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--batch-wait-ms", type=float, default=2)
+    asyncio.run(serve(parser.parse_args()))
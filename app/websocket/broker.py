@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+import uuid
+
+from redis.exceptions import RedisError
+
+from cache.redis_client import asyncRedisClient
+
+logger = logging.getLogger("paideia")
+
+BROADCAST_CHANNEL = "ws_broadcast"
+
+
+class RedisBroker:
+    """
+    Relays topic messages between workers over redis pub/sub.
+
+    Outgoing messages are buffered for `flush_interval` seconds (or until
+    `max_batch` are waiting) and sent as one publish. A message published
+    with coalesce=True replaces an earlier one for the same topic that has
+    not been sent yet, for pushes where only the latest state matters.
+    Every worker relays received messages to its own subscribers and skips
+    the ones it published itself, those were delivered locally already.
+    """
+
+    def __init__(
+        self,
+        manager,
+        client=None,
+        channel: str = BROADCAST_CHANNEL,
+        flush_interval: float = 0.002,
+        max_batch: int = 500,
+    ):
+        self.manager = manager
+        self.client = client or asyncRedisClient
+        self.channel = channel
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.origin = uuid.uuid4().hex
+        self.stats = {
+            "forwarded": 0,
+            "coalesced": 0,
+            "batches": 0,
+            "relayed": 0,
+            "publish_errors": 0,
+            "reconnects": 0,
+        }
+        self._pending = []  # [topic, message]
+        self._coalesced = {}  # topic -> index in _pending
+        self._flush_task = None
+        self._listener = None
+        self._subscribed = asyncio.Event()
+
+    def forward(self, topic: str, message, coalesce: bool = False):
+        self.stats["forwarded"] += 1
+        if coalesce and topic in self._coalesced:
+            self._pending[self._coalesced[topic]][1] = message
+            self.stats["coalesced"] += 1
+            return
+        if coalesce:
+            self._coalesced[topic] = len(self._pending)
+        self._pending.append([topic, message])
+        if len(self._pending) >= self.max_batch:
+            asyncio.get_running_loop().create_task(self.flush())
+        elif self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(
+                self._flush_later()
+            )
+
+    async def flush(self):
+        if len(self._pending) == 0:
+            return
+        messages = self._pending
+        self._pending = []
+        self._coalesced = {}
+        try:
+            await self.client.publish(
+                self.channel,
+                json.dumps({"origin": self.origin, "messages": messages}),
+            )
+            self.stats["batches"] += 1
+        except RedisError as e:
+            # websocket pushes are best effort, clients refetch on reconnect
+            self.stats["publish_errors"] += 1
+            logger.warning(f"websocket broker publish failed: {str(e)}")
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def start(self):
+        if self._listener is None or self._listener.done():
+            self._subscribed = asyncio.Event()
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def wait_subscribed(self):
+        await self._subscribed.wait()
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self.flush()
+
+    async def _listen(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self._subscribed.set()
+                async for message in pubsub.listen():
+                    await self._relay(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["reconnects"] += 1
+                logger.warning(f"websocket broker listener: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                self._subscribed.clear()
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def _relay(self, data: dict):
+        if data["origin"] == self.origin:
+            return
+        for topic, message in data["messages"]:
+            if self.manager.subscribers(topic) > 0:
+                self.stats["relayed"] += 1
+                await self.manager.publish_local(topic, message)
@@ -1,28 +1,249 @@
-from fastapi import WebSocket
+import asyncio
+import json
+import os
+
+from fastapi import WebSocket, status
+
+from config import Config, Network
+from websocket.broker import RedisBroker
+
+CFG = Config[Network]
+
+
+def proposal_comments_topic(proposal_id) -> str:
+    return f"proposal_comments_{proposal_id}"
+
+
+def notifications_topic(user_details_id) -> str:
+    return f"notification_user_details_id_{user_details_id}"
+
+
+def ergoauth_topic(request_id) -> str:
+    return f"ergoauth_{request_id}"
+
+
+# what to do when a socket's send queue is full
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "disconnect")
+
+
+class _Connection:
+    """One websocket's bounded send queue and the task writing it out"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.topics = set()
+        self.queue = asyncio.Queue(queue_size)
+        self.writer = None
+        # publishes held back until release, None when not holding
+        self.held = None
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections = {}
+    """
+    Websockets indexed by topic.
 
-    async def connect(self, id: str, websocket: WebSocket):
+    A topic can have any number of sockets and a publish only touches the
+    sockets subscribed to that exact topic. With a broker attached, publishes
+    also reach the subscribers connected to the other workers.
+
+    A publish serializes the message once and puts it on each socket's
+    bounded queue without waiting, a writer task per socket does the sends.
+    When a queue is full the slow consumer either loses its oldest queued
+    message ("drop_oldest") or is closed ("disconnect").
+    """
+
+    def __init__(
+        self,
+        broker_options: dict = None,
+        queue_size: int = 64,
+        slow_consumer_policy: str = "drop_oldest",
+        send_timeout: float = 10.0,
+    ):
+        if slow_consumer_policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"unknown slow consumer policy {slow_consumer_policy}")
+        self.topics = {}  # topic -> set of websockets
+        self.connections = {}  # websocket -> _Connection
+        self.queue_size = queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.send_timeout = send_timeout
+        self.stats = {
+            "queued": 0,
+            "sent": 0,
+            "dropped": 0,
+            "slow_disconnects": 0,
+            "send_errors": 0,
+        }
+        self._closing = set()
+        self.broker = None
+        if broker_options is not None:
+            self.broker = RedisBroker(self, **broker_options)
+
+    async def connect(self, topic: str, websocket: WebSocket, hold: bool = False):
+        # with hold, publishes to the socket wait until `release` so whatever
+        # the caller sends first (a replay) goes out ahead of them
         await websocket.accept()
-        self.active_connections[id] = websocket
+        connection = self.connections.get(websocket)
+        if connection is None:
+            connection = _Connection(websocket, self.queue_size)
+            connection.writer = asyncio.create_task(self._write(connection))
+            self.connections[websocket] = connection
+        if hold and connection.held is None:
+            connection.held = []
+        connection.topics.add(topic)
+        self.topics.setdefault(topic, set()).add(websocket)
+
+    def disconnect(self, topic: str, websocket: WebSocket):
+        self._unsubscribe(topic, websocket)
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        connection.topics.discard(topic)
+        if len(connection.topics) == 0:
+            self._forget(connection)
+
+    async def publish(self, topic: str, message, coalesce: bool = False):
+        # returns the number of sockets queued in this worker
+        if self.broker is not None:
+            self.broker.forward(topic, message, coalesce)
+        return await self.publish_local(topic, message)
+
+    async def publish_local(self, topic: str, message):
+        # serialized once for all subscribers, never waits on a send
+        sockets = self.topics.get(topic)
+        if not sockets:
+            return 0
+        data = json.dumps(message)
+        queued = 0
+        for websocket in list(sockets):
+            connection = self.connections[websocket]
+            if connection.held is not None:
+                connection.held.append(data)
+                queued += 1
+            elif self._offer(connection, data):
+                queued += 1
+        return queued
+
+    def release(self, websocket: WebSocket):
+        # queues the publishes held since connect, in order
+        connection = self.connections.get(websocket)
+        if connection is None or connection.held is None:
+            return
+        held, connection.held = connection.held, None
+        for data in held:
+            if not self._offer(connection, data):
+                break
+
+    def send(self, websocket: WebSocket, message):
+        # queues a message for one connected socket, ahead of held publishes
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return False
+        return self._offer(connection, json.dumps(message))
+
+    def subscribers(self, topic: str):
+        return len(self.topics.get(topic, ()))
+
+    async def drain(self, topic: str = None):
+        # waits until the queued messages were written or dropped
+        if topic is None:
+            sockets = list(self.connections)
+        else:
+            sockets = list(self.topics.get(topic, ()))
+        await asyncio.gather(
+            *[
+                self.connections[websocket].queue.join()
+                for websocket in sockets
+                if websocket in self.connections
+            ]
+        )
+
+    def snapshot(self):
+        depths = [connection.queue.qsize() for connection in self.connections.values()]
+        return dict(
+            self.stats,
+            pid=os.getpid(),
+            connections=len(self.connections),
+            topics=len(self.topics),
+            queue_size=self.queue_size,
+            queue_depth_total=sum(depths),
+            queue_depth_max=max(depths, default=0),
+            slow_consumer_policy=self.slow_consumer_policy,
+            broker=None if self.broker is None else dict(self.broker.stats),
+        )
+
+    def _offer(self, connection: _Connection, data: str):
+        queue = connection.queue
+        if queue.full():
+            if self.slow_consumer_policy == "disconnect":
+                self.stats["slow_disconnects"] += 1
+                self._close(connection)
+                return False
+            queue.get_nowait()
+            queue.task_done()
+            self.stats["dropped"] += 1
+        queue.put_nowait(data)
+        self.stats["queued"] += 1
+        return True
+
+    async def _write(self, connection: _Connection):
+        while True:
+            data = await connection.queue.get()
+            try:
+                await asyncio.wait_for(
+                    connection.websocket.send_text(data), self.send_timeout
+                )
+                self.stats["sent"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # closed or stuck socket, the receive loop will also notice
+                self.stats["send_errors"] += 1
+                self._close(connection)
+                return
+            finally:
+                connection.queue.task_done()
+
+    def _unsubscribe(self, topic: str, websocket: WebSocket):
+        sockets = self.topics.get(topic)
+        if sockets is None:
+            return
+        sockets.discard(websocket)
+        if len(sockets) == 0:
+            del self.topics[topic]
 
-    def disconnect(self, id: str):
-        if id in self.active_connections:
-            del self.active_connections[id]
+    def _forget(self, connection: _Connection):
+        # removes the socket from every topic and stops its writer
+        for topic in connection.topics:
+            self._unsubscribe(topic, connection.websocket)
+        connection.topics.clear()
+        self.connections.pop(connection.websocket, None)
+        if connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        while not connection.queue.empty():
+            connection.queue.get_nowait()
+            connection.queue.task_done()
 
-    async def send_personal_message(self, id: str, message):
-        if id in self.active_connections:
-            await self.active_connections[id].send_json(message)
+    def _close(self, connection: _Connection):
+        self._forget(connection)
+        task = asyncio.get_running_loop().create_task(
+            self._close_socket(connection.websocket)
+        )
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
 
-    async def send_personal_message_by_substring_matcher(self, key: str, message):
-        # sends message to all matching web socket ids
-        for id in self.active_connections:
-            # if key is substring
-            if key in id:
-                await self.active_connections[id].send_json(message)
+    async def _close_socket(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        except Exception:
+            pass
 
 
-connection_manager = ConnectionManager()
+connection_manager = ConnectionManager(
+    broker_options={
+        "flush_interval": CFG.ws_broker_flush_ms / 1000,
+        "max_batch": CFG.ws_broker_max_batch,
+    },
+    queue_size=CFG.ws_send_queue_size,
+    slow_consumer_policy=CFG.ws_slow_consumer_policy,
+    send_timeout=CFG.ws_send_timeout,
+)
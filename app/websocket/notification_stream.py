@@ -0,0 +1,86 @@
+import json
+import logging
+
+from redis.exceptions import RedisError
+
+from cache.redis_client import asyncRedisClient
+from config import Config, Network
+from websocket.connection_manager import connection_manager, notifications_topic
+
+CFG = Config[Network]
+
+logger = logging.getLogger("paideia")
+
+
+def notification_seq_key(user_details_id) -> str:
+    return f"notification_seq_{user_details_id}"
+
+
+def notification_replay_key(user_details_id) -> str:
+    return f"notification_replay_{user_details_id}"
+
+
+class NotificationStream:
+    """
+    Notification pushes as single deltas with a per user sequence number.
+
+    The sequence is a redis counter and the last `buffer_size` pushes are
+    kept for `buffer_ttl` seconds in a sorted set scored by sequence, so a
+    reconnecting socket can ask for what it missed. The replay goes out
+    before any live push, live pushes may repeat the last replayed sequences
+    so clients ignore messages with a sequence they have already seen (at or
+    below the highest one is enough). When the buffer no longer reaches back to
+    the client's sequence it is told to resync from the REST endpoint.
+    """
+
+    def __init__(
+        self, manager, client=None, buffer_size: int = 50, buffer_ttl: int = 3600
+    ):
+        self.manager = manager
+        self.client = client or asyncRedisClient
+        self.buffer_size = buffer_size
+        self.buffer_ttl = buffer_ttl
+
+    async def push(self, user_details_id: int, notification: dict):
+        # returns the sequence number, None if redis was unavailable
+        message = {"type": "notification", "seq": None, "notification": notification}
+        try:
+            message["seq"] = await self.client.incr(
+                notification_seq_key(user_details_id)
+            )
+            replay_key = notification_replay_key(user_details_id)
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.zadd(replay_key, {json.dumps(message): message["seq"]})
+                pipe.zremrangebyrank(replay_key, 0, -self.buffer_size - 1)
+                pipe.expire(replay_key, self.buffer_ttl)
+                await pipe.execute()
+        except RedisError as e:
+            # still delivered live, without a sequence it can't be resumed
+            logger.warning(f"notification replay buffer failed: {str(e)}")
+        await self.manager.publish(notifications_topic(user_details_id), message)
+        return message["seq"]
+
+    async def resume(self, user_details_id: int, last_seq: int):
+        # the messages after last_seq, or a single resync message
+        try:
+            seq = await self.client.get(notification_seq_key(user_details_id))
+            seq = int(seq or 0)
+            if last_seq == seq:
+                return []
+            entries = []
+            if last_seq < seq:
+                entries = await self.client.zrangebyscore(
+                    notification_replay_key(user_details_id), last_seq + 1, "+inf"
+                )
+        except RedisError as e:
+            logger.warning(f"notification replay failed: {str(e)}")
+            return [{"type": "resync", "seq": None}]
+        messages = [json.loads(entry) for entry in entries]
+        if len(messages) == 0 or messages[0]["seq"] != last_seq + 1:
+            return [{"type": "resync", "seq": seq}]
+        return messages
+
+
+notification_stream = NotificationStream(
+    connection_manager, None, CFG.notification_replay_size, CFG.notification_replay_ttl
+)